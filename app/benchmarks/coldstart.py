@@ -0,0 +1,147 @@
+"""
+Cold start benchmark of the Lambda handlers.
+
+For every handler, a new Python process imports the handler module, like a
+new execution environment does, and then runs the pipeline on a few small
+input files. The first invocation of the handler is its cold invocation, the
+following ones are warm and reuse the cached configuration and clients. The
+benchmark also reports which of the heavy optional packages the import and
+the invocations loaded. The handlers create their boto3 clients on import,
+as in Lambda, so the import time includes them. The in-memory stand-ins only
+replace the clients before the first invocation.
+
+Usage:
+    python app/benchmarks/coldstart.py
+    python app/benchmarks/coldstart.py --handlers batchResultsProcessing --output-format .xlsx --repeat 10
+"""
+import argparse
+import importlib
+import json
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from harness import LocalPipeline, STAGE_ENVIRONMENTS, generate_records, write_input_file
+
+# Packages that are slow to import. All but boto3 are only needed for some formats
+OPTIONAL_PACKAGES = ["boto3", "numpy", "pandas", "openpyxl", "pyarrow"]
+INPUT_RECORDS = 500
+INPUT_FILES = 3
+
+
+def loaded_packages() -> List[str]:
+    """List the optional packages that are imported in this process."""
+    return [package for package in OPTIONAL_PACKAGES if package in sys.modules]
+
+
+def run_case(stage: str, output_format: str) -> Dict[str, Any]:
+    """
+    Import a handler and measure its cold and warm invocations.
+
+    Args:
+        stage (str): Name of the Lambda function package
+        output_format (str): Format of the result files, e.g. ".csv"
+    """
+    start = time.perf_counter()
+    importlib.import_module(stage)
+    import_seconds = time.perf_counter() - start
+    packages_after_import = loaded_packages()
+
+    # Without deduplication, the generated files are not answered from the result cache
+    pipeline = LocalPipeline({
+        "dataPreparation": {"DEDUPLICATION_ENABLED": "false"},
+        "batchResultsProcessing": {"OUTPUT_FORMAT": output_format}
+    })
+    for index in range(INPUT_FILES):
+        key = f"coldstart-{index}.csv"
+        pipeline.upload(key, write_input_file(generate_records(INPUT_RECORDS, seed=index), "csv"))
+        pipeline.run(key)
+
+    latencies = pipeline.latencies[stage]
+    return {
+        "handler": stage,
+        "import_ms": round(import_seconds * 1000, 1),
+        "first_invocation_ms": round(latencies[0] * 1000, 1),
+        "warm_invocation_ms": round(statistics.median(latencies[1:]) * 1000, 1),
+        "packages_after_import": packages_after_import,
+        "packages_after_invocations": loaded_packages()
+    }
+
+
+def run_isolated(stage: str, output_format: str) -> Dict[str, Any]:
+    """
+    Run a case in a new process and return its result.
+
+    Args:
+        stage (str): Name of the Lambda function package
+        output_format (str): Format of the result files, e.g. ".csv"
+    """
+    command = [sys.executable, __file__, "--case", stage, "--output-format", output_format]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Cold start of {stage} failed: {completed.stderr.strip().splitlines()[-1:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine the repetitions of a handler into their medians.
+
+    Args:
+        results: Results of the repetitions
+    """
+    summary = dict(results[-1])
+    for name in ["import_ms", "first_invocation_ms", "warm_invocation_ms"]:
+        summary[name] = round(statistics.median(result[name] for result in results), 1)
+    summary["repetitions"] = len(results)
+    return summary
+
+
+REPORT_HEADER = f"{'handler':<24}{'import ms':>11}{'first ms':>11}{'warm ms':>11}  packages after import / invocations"
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """
+    Format the summary of a handler as a report line.
+
+    Args:
+        result: Summary of the handler
+    """
+    return (
+        f"{result['handler']:<24}{result['import_ms']:>11.1f}{result['first_invocation_ms']:>11.1f}"
+        f"{result['warm_invocation_ms']:>11.1f}  {', '.join(result['packages_after_import']) or '-'}"
+        f" / {', '.join(result['packages_after_invocations']) or '-'}"
+    )
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--handlers", default=",".join(STAGE_ENVIRONMENTS), help="Comma separated handler packages")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of new processes per handler")
+    parser.add_argument("--output-format", default=".csv", help="Format of the result files, e.g. .xlsx")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case, args.output_format)))
+        return
+
+    print(REPORT_HEADER)
+    print("-" * len(REPORT_HEADER))
+
+    results = []
+    for stage in args.handlers.split(","):
+        results.append(summarize([run_isolated(stage, args.output_format) for _ in range(args.repeat)]))
+        print(format_result(results[-1]), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark of the conversion of records to Bedrock batch input lines.
+
+Runs the per-record step of dataPreparation, building the JSONL line with the
+model input and estimating its tokens, without reading or writing S3. The
+system prompt defaults to the prompt deployed by the CDK stacks, since its
+length dominates the size of every line.
+
+Usage:
+    python app/benchmarks/conversion.py --records 100000
+    python app/benchmarks/conversion.py --prompt-file my_prompt.txt --repeat 5
+"""
+import argparse
+import os
+import statistics
+import time
+
+from harness import COMMON_ENVIRONMENT, STAGE_ENVIRONMENTS, generate_records
+
+DEFAULT_PROMPT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "cdk", "lib", "constants", "prompts", "travel.ts"
+)
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=100000, help="Number of records")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs, the median is reported")
+    parser.add_argument("--prompt-file", default=DEFAULT_PROMPT_FILE, help="File holding the system prompt")
+    args = parser.parse_args()
+
+    with open(args.prompt_file, encoding="utf-8") as prompt_file:
+        prompt = prompt_file.read()
+
+    os.environ.update({**COMMON_ENVIRONMENT, **STAGE_ENVIRONMENTS["dataPreparation"], "PROMPT": prompt})
+    from dataPreparation.dataProcessor import DataProcessor
+    from dataPreparation.environmentConfig import EnvironmentConfig
+
+    processor = DataProcessor(EnvironmentConfig())
+    texts = [(record["conversation_id"], record["conversation"]) for record in generate_records(args.records)]
+
+    durations = []
+    output_bytes = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        output_bytes = sum(len(line) for line, _ in processor._iter_texts_as_jsonl(texts))
+        durations.append(time.perf_counter() - start)
+
+    seconds = statistics.median(durations)
+    print(
+        f"{args.records} records, prompt {len(prompt)} characters: {seconds:.3f} s, "
+        f"{args.records / seconds:,.0f} records/s, {output_bytes / seconds / 1024 / 1024:.1f} MB/s of JSONL"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Benchmark of the extraction of classes from model outputs.
+
+Generates model outputs in the shapes models produce in practice: mostly
+well-formed <class> tags, but also labels with a different case, markdown or
+a plural form, unclosed tags, JSON objects and plain sentences naming the
+category. Every output is parsed with the previous single regular expression
+and with the output extractor of batchResultsProcessing, and the cost per
+record and the number of records that end up as "Classification was not
+successful." are reported for both. The categories are read from the prompt
+deployed by the CDK stacks.
+
+Usage:
+    python app/benchmarks/extraction.py --records 1000000
+    python app/benchmarks/extraction.py --records 100000 --malformed-ratio 0.3 --mode json
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+from harness import LAMBDA_DIR
+
+sys.path.insert(0, LAMBDA_DIR)
+
+from batchResultsProcessing.outputExtractor import UNSUCCESSFUL_CLASS, OutputExtractor, parse_categories  # noqa: E402
+
+DEFAULT_PROMPT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "cdk", "lib", "constants", "prompts", "travel.ts"
+)
+STRING_LITERAL_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'")
+
+
+def load_prompt(prompt_file: str) -> str:
+    """
+    Read the prompt from a TypeScript constant made of concatenated string literals.
+
+    Args:
+        prompt_file (str): Path of the prompt file
+    """
+    with open(prompt_file, encoding="utf-8") as file:
+        source = file.read()
+    return "".join(STRING_LITERAL_PATTERN.findall(source)).replace("\\n", "\n").replace("\\'", "'")
+
+
+def legacy_extract(text: str) -> Tuple[str, str]:
+    """
+    Extract the class and rationale like results processing did before the output extractor.
+
+    Args:
+        text (str): Raw output text of the model
+    """
+    match = re.search(r"<class>(.*?)</class>\s*(.*)", text, re.DOTALL)
+    if match:
+        return match.group(1).strip(), match.group(2).strip()
+    return UNSUCCESSFUL_CLASS, "No rationale found."
+
+
+# Shapes of malformed outputs, each a function of the category and a rationale
+MALFORMED_SHAPES: List[Callable[[str, str], str]] = [
+    lambda category, rationale: f"<class>{category.lower()}</class>\n{rationale}",
+    lambda category, rationale: f"<class>**{category}**</class>\n{rationale}",
+    lambda category, rationale: f"<class>{category}s</class>\n{rationale}",
+    lambda category, rationale: f"<Class>{category}</Class>\n{rationale}",
+    lambda category, rationale: f"<class>{category}\n{rationale}",
+    lambda category, rationale: f'{{"class": "{category}", "rationale": "{rationale}"}}',
+    lambda category, rationale: f"```json\n{{\"category\": \"{category}\", \"confidence\": 0.9}}\n```",
+    lambda category, rationale: f"Category: {category}\n{rationale}",
+    lambda category, rationale: "I am not able to classify this conversation."
+]
+
+
+def generate_outputs(count: int, categories: List[str], malformed_ratio: float, seed: int = 0) -> List[str]:
+    """
+    Generate model outputs, a share of them malformed.
+
+    Args:
+        count (int): Number of outputs
+        categories (List[str]): Categories of the prompt
+        malformed_ratio (float): Share of outputs in one of the malformed shapes
+        seed (int): Seed of the random generator
+    """
+    rng = random.Random(seed)
+    outputs = []
+    for index in range(count):
+        category = categories[index % len(categories)]
+        rationale = f"The customer asks about their trip {index} and the agent answers the request."
+        if rng.random() < malformed_ratio:
+            outputs.append(rng.choice(MALFORMED_SHAPES)(category, rationale))
+        else:
+            outputs.append(f"<class>{category}</class>\n{rationale}")
+    return outputs
+
+
+def measure(extract: Callable[[str], str], outputs: List[str]) -> Tuple[float, Dict[str, int]]:
+    """
+    Extract the class of every output.
+
+    Args:
+        extract: Function returning the class of an output
+        outputs: Raw output texts
+
+    Returns:
+        Tuple[float, Dict[str, int]]: Seconds taken and number of records per class
+    """
+    classes: Dict[str, int] = {}
+    start = time.perf_counter()
+    for text in outputs:
+        class_content = extract(text)
+        classes[class_content] = classes.get(class_content, 0) + 1
+    return time.perf_counter() - start, classes
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1000000, help="Number of model outputs")
+    parser.add_argument("--malformed-ratio", type=float, default=0.1, help="Share of malformed outputs")
+    parser.add_argument("--mode", default="tags", help="Extraction mode, tags or json")
+    parser.add_argument("--prompt-file", default=DEFAULT_PROMPT_FILE, help="File holding the prompt")
+    args = parser.parse_args()
+
+    categories = parse_categories(load_prompt(args.prompt_file))
+    outputs = generate_outputs(args.records, categories, args.malformed_ratio)
+    extractor = OutputExtractor(args.mode, categories)
+
+    results = [
+        ("previous regex", measure(lambda text: legacy_extract(text)[0], outputs)),
+        ("output extractor", measure(lambda text: extractor.extract(text)[0]["class"], outputs))
+    ]
+
+    print(f"{args.records} outputs, {args.malformed_ratio:.0%} malformed, {len(categories)} categories")
+    print(f"{'parser':<18}{'us/record':>11}{'unsuccessful':>14}{'unknown labels':>16}")
+    for name, (seconds, classes) in results:
+        unknown = sum(count for label, count in classes.items() if label not in categories and label != UNSUCCESSFUL_CLASS)
+        print(f"{name:<18}{seconds / args.records * 1e6:>11.2f}{classes.get(UNSUCCESSFUL_CLASS, 0):>14}{unknown:>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+"""
+Runs the classification pipeline locally against in-memory AWS stand-ins.
+
+The three Lambda handlers are invoked in the order the deployed stack chains
+them: an upload to the customer bucket triggers dataPreparation, every batch
+file it writes to input_data/ triggers batchClassifier, and every .jsonl.out
+file Bedrock writes to output_data/ triggers batchResultsProcessing. S3 event
+notifications are emulated by listing new objects after each invocation and
+sending them in SQS-shaped events, up to the batch size of the deployed
+event sources per event. When no new objects arrive while jobs are still queued, the
+scheduled scheduler run is invoked instead.
+"""
+import csv
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+if LAMBDA_DIR not in sys.path:
+    sys.path.insert(0, LAMBDA_DIR)
+
+# The handlers create their boto3 clients on import, like in Lambda, which sets the region
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+from standins import InMemoryBedrock, InMemoryBedrockRuntime, InMemoryDynamoDB, InMemoryS3, InMemorySQS
+
+CUSTOMER_BUCKET = "customer-requests"
+INTERNAL_BUCKET = "internal-classifications"
+JOB_STATUS_TABLE = "job-processing-status"
+RESULT_CACHE_TABLE = "classification-cache"
+INPUT_FOLDER = "input_data"
+OUTPUT_FOLDER = "output_data"
+SHARD_QUEUE_URL = "https://sqs.us-east-1.amazonaws.com/123456789012/customer-requests"
+MODEL_ID = "anthropic.claude-3-haiku-20240307-v1:0"
+FILE_FORMATS = ["csv", "json", "xlsx"]
+
+# Module attributes holding the boto3 clients of the handlers, per service
+CLIENT_ATTRIBUTES = {
+    "s3": [("utils.s3", "s3_client")],
+    "dynamodb": [("utils.dynamodb", "dynamodb_client")],
+    "bedrock": [("batchClassifier.dataProcessor", "bedrock_client")],
+    "bedrock-runtime": [("dataPreparation.realtimeClassifier", "bedrock_runtime_client")],
+    "sqs": [("utils.sqs_batch", "sqs_client")]
+}
+
+CATEGORIES = [
+    "Booking Inquiry",
+    "Reservation Change",
+    "Cancellation Request",
+    "Refund Issues",
+    "Complaint",
+    "Technical Support",
+    "Other"
+]
+
+PROMPT = (
+    "Your task is to analyze travel-related conversations and classify them into one of these categories: "
+    + ", ".join(CATEGORIES)
+    + ". Output format must be: <class>Category Name</class>"
+)
+
+# Mirrors the environment variables set by the CDK stacks
+COMMON_ENVIRONMENT = {
+    "LOG_LEVEL": "WARNING",
+    "BEDROCK_MODEL_ID": MODEL_ID,
+    "JOB_STATUS_TABLE": JOB_STATUS_TABLE,
+    "RESULT_CACHE_TABLE": RESULT_CACHE_TABLE,
+    "DEDUP_FOLDER_NAME": "dedup_data"
+}
+
+STAGE_ENVIRONMENTS = {
+    "dataPreparation": {
+        "OUTPUT_BUCKET_ARN": f"arn:aws:s3:::{INTERNAL_BUCKET}",
+        "OUTPUT_FOLDER_NAME": INPUT_FOLDER,
+        "INPUT_MAPPING_TEXT_FIELD": "conversation",
+        "INPUT_MAPPING_ID_FIELD": "conversation_id",
+        "BATCH_SIZE": "200",
+        "MINIMUM_RECORDS_PER_BATCH": "100",
+        "PROMPT": PROMPT,
+        "RESULTS_FOLDER_NAME": OUTPUT_FOLDER,
+        "SHARD_QUEUE_URL": SHARD_QUEUE_URL,
+        "REALTIME_RECORD_THRESHOLD": "100"
+    },
+    "batchClassifier": {
+        "BEDROCK_ROLE": "arn:aws:iam::123456789012:role/bedrock-batch",
+        "BEDROCK_JOB_PREFIX": "genai-job",
+        "OUTPUT_FOLDER_NAME": OUTPUT_FOLDER,
+        "MAX_CONCURRENT_JOBS": "10"
+    },
+    "batchResultsProcessing": {
+        "OUTPUT_BUCKET_ARN": f"arn:aws:s3:::{CUSTOMER_BUCKET}",
+        "OUTPUT_FOLDER_NAME": OUTPUT_FOLDER,
+        "OUTPUT_FORMAT": ".csv",
+        "INTERNAL_PROCESSED_FOLDER": "processed_data",
+        "RESULT_CACHE_TTL_DAYS": "30",
+        # The prompt of the harness does not number its categories
+        "OUTPUT_CATEGORIES": json.dumps(CATEGORIES)
+    }
+}
+
+# S3 event notification filters of the deployed buckets, as (bucket, prefix, suffix)
+STAGE_TRIGGERS = {
+    "batchClassifier": (INTERNAL_BUCKET, f"{INPUT_FOLDER}/", ".jsonl"),
+    "batchResultsProcessing": (INTERNAL_BUCKET, f"{OUTPUT_FOLDER}/", ".jsonl.out")
+}
+
+# Messages per invocation of the deployed SQS event sources
+SQS_BATCH_SIZES = {
+    "dataPreparation": 1,
+    "batchClassifier": 10,
+    "batchResultsProcessing": 10
+}
+
+# Sequencers of the emulated S3 event notifications, one per created object
+SEQUENCER = itertools.count(1)
+
+TEXT_TEMPLATES = [
+    "Customer: I need to change my flight {n} to next Tuesday. Agent: Let me check the options for you.",
+    "Customer: My refund for booking {n} has not arrived yet. Agent: I am sorry, let me look into it.",
+    "Customer: Can I bring a wheelchair on trip {n}? Agent: Yes, we can arrange special assistance.",
+    "Customer: The app crashes when I open reservation {n}. Agent: Please try reinstalling the app.",
+    "Customer: I want to cancel hotel stay {n}. Agent: I can cancel it, a fee may apply.",
+    "Customer: How many points did I earn with order {n}? Agent: You earned 1200 loyalty points."
+]
+
+
+def generate_records(count: int, duplicate_ratio: float = 0.0, seed: int = 0) -> Iterator[Dict[str, str]]:
+    """
+    Generate synthetic conversation records.
+
+    Args:
+        count (int): Number of records
+        duplicate_ratio (float): Share of records repeating the text of an earlier record
+        seed (int): Seed of the random generator
+    """
+    generator = random.Random(seed)
+    for index in range(count):
+        n = index
+        if index and generator.random() < duplicate_ratio:
+            n = generator.randrange(index)
+        yield {
+            "conversation_id": f"conv-{index:08d}",
+            "conversation": TEXT_TEMPLATES[n % len(TEXT_TEMPLATES)].format(n=n)
+        }
+
+
+def write_input_file(records: Iterator[Dict[str, str]], file_format: str) -> bytes:
+    """
+    Serialize records in one of the supported input formats.
+
+    Args:
+        records: Records to write
+        file_format (str): "csv", "json" or "xlsx"
+    """
+    if file_format == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=["conversation_id", "conversation"])
+        writer.writeheader()
+        writer.writerows(records)
+        return buffer.getvalue().encode("utf-8")
+
+    if file_format == "json":
+        return json.dumps(list(records), ensure_ascii=False).encode("utf-8")
+
+    if file_format == "xlsx":
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet()
+        sheet.append(["conversation_id", "conversation"])
+        for record in records:
+            sheet.append([record["conversation_id"], record["conversation"]])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        return buffer.getvalue()
+
+    raise ValueError(f"Unsupported file format: {file_format}")
+
+
+def build_s3_event(bucket_name: str, keys: List[str]) -> Dict[str, Any]:
+    """
+    Build the SQS event delivered for S3 object created notifications, one message per object.
+
+    Args:
+        bucket_name (str): Name of the bucket
+        keys (List[str]): Keys of the created objects
+    """
+    records = []
+    for key in keys:
+        s3_object = {"key": key, "sequencer": f"{next(SEQUENCER):016X}"}
+        notification = {"Records": [{"s3": {"bucket": {"name": bucket_name}, "object": s3_object}}]}
+        records.append({"messageId": key, "body": json.dumps(notification)})
+    return {"Records": records}
+
+
+class LocalPipeline:
+    """
+    Wires the Lambda handlers to in-memory AWS stand-ins.
+
+    The stand-ins replace the boto3 clients the handler modules created on
+    import, so the handlers run unchanged. Invocation latencies are recorded per stage.
+    """
+
+    def __init__(self, environment: Optional[Dict[str, Dict[str, str]]] = None):
+        """
+        Initialize LocalPipeline.
+
+        Args:
+            environment: Environment variables per stage, overriding the defaults
+        """
+        self.stage_environments = {
+            stage: {**COMMON_ENVIRONMENT, **variables, **(environment or {}).get(stage, {})}
+            for stage, variables in STAGE_ENVIRONMENTS.items()
+        }
+        os.environ.update(COMMON_ENVIRONMENT)
+
+        from utils.dynamodb import BEDROCK_JOB_SHORT_ID_INDEX, JOB_STATUS_INDEX, PARENT_ID_INDEX
+
+        self.s3 = InMemoryS3()
+        self.dynamodb = InMemoryDynamoDB()
+        self.bedrock = InMemoryBedrock(self.s3, categories=CATEGORIES)
+        self.bedrock_runtime = InMemoryBedrockRuntime(categories=CATEGORIES)
+        self.sqs = InMemorySQS()
+
+        clients = {
+            "s3": self.s3,
+            "dynamodb": self.dynamodb,
+            "bedrock": self.bedrock,
+            "bedrock-runtime": self.bedrock_runtime,
+            "sqs": self.sqs
+        }
+        for service_name, attributes in CLIENT_ATTRIBUTES.items():
+            for module_name, attribute in attributes:
+                setattr(importlib.import_module(module_name), attribute, clients[service_name])
+
+        self.dynamodb.create_table(JOB_STATUS_TABLE, indexes={
+            PARENT_ID_INDEX: ("parent_id", None),
+            BEDROCK_JOB_SHORT_ID_INDEX: ("bedrock_job_short_id", None),
+            JOB_STATUS_INDEX: ("job_status", "created_date")
+        })
+        self.dynamodb.create_table(RESULT_CACHE_TABLE, key="content_hash")
+
+        self.handlers: Dict[str, Callable] = {}
+        for stage in STAGE_ENVIRONMENTS:
+            module = importlib.import_module(stage)
+            # The handlers keep their configuration for the lifetime of the
+            # execution environment, so every pipeline starts them cold
+            for cached in vars(module).values():
+                if hasattr(cached, "cache_clear"):
+                    cached.cache_clear()
+            self.handlers[stage] = module.lambda_handler
+        self.latencies: Dict[str, List[float]] = {stage: [] for stage in STAGE_ENVIRONMENTS}
+        self._notified: Set[Tuple[str, str]] = set()
+
+    def upload(self, key: str, body: bytes) -> None:
+        """
+        Put an input file into the customer bucket.
+
+        Args:
+            key (str): Key of the input file
+            body (bytes): Content of the input file
+        """
+        self.s3.objects[(CUSTOMER_BUCKET, key)] = body
+
+    def run(self, key: str) -> None:
+        """
+        Process an uploaded input file until no stage has work left.
+
+        Args:
+            key (str): Key of the input file in the customer bucket
+        """
+        response = self.invoke("dataPreparation", build_s3_event(CUSTOMER_BUCKET, [key]))
+        if response.get("batchItemFailures"):
+            raise RuntimeError(f"Data preparation failed for {key}")
+
+        while True:
+            # Shards of large input files are sent back to the queue of data preparation
+            shard_messages = self.sqs.receive_messages(SHARD_QUEUE_URL)
+            batch_size = SQS_BATCH_SIZES["dataPreparation"]
+            for start in range(0, len(shard_messages), batch_size):
+                response = self.invoke("dataPreparation", {"Records": shard_messages[start:start + batch_size]})
+                if response.get("batchItemFailures"):
+                    raise RuntimeError(f"Data preparation failed for {response['batchItemFailures']}")
+
+            pending = [(stage, self._collect_notifications(stage)) for stage in STAGE_TRIGGERS]
+            pending = [(stage, keys) for stage, keys in pending if keys]
+            for stage, created_keys in pending:
+                batch_size = SQS_BATCH_SIZES[stage]
+                for start in range(0, len(created_keys), batch_size):
+                    event = build_s3_event(STAGE_TRIGGERS[stage][0], created_keys[start:start + batch_size])
+                    response = self.invoke(stage, event)
+                    if response.get("batchItemFailures"):
+                        raise RuntimeError(f"{stage} failed for {response['batchItemFailures']}")
+
+            if pending or shard_messages:
+                continue
+
+            if not self.count_jobs("QUEUED"):
+                return
+
+            objects_before = len(self.s3.objects)
+            self.invoke("batchClassifier", {"source": "aws.events", "detail-type": "Scheduled Event"})
+            if len(self.s3.objects) == objects_before:
+                raise RuntimeError("Queued jobs could not be started")
+
+    def invoke(self, stage: str, event: Dict[str, Any]) -> Any:
+        """
+        Invoke the handler of a stage with its environment and record the latency.
+
+        Args:
+            stage (str): Name of the Lambda function package
+            event: Event passed to the handler
+        """
+        os.environ.update(self.stage_environments[stage])
+        start = time.perf_counter()
+        try:
+            return self.handlers[stage](event, None)
+        finally:
+            self.latencies[stage].append(time.perf_counter() - start)
+
+    def count_jobs(self, job_status: str) -> int:
+        """
+        Count the job status items in a status.
+
+        Args:
+            job_status (str): Job status to count
+        """
+        items = self.dynamodb.tables[JOB_STATUS_TABLE]["items"].values()
+        return sum(1 for item in items if item.get("job_status", {}).get("S") == job_status)
+
+    def list_objects(self, bucket_name: str, prefix: str = "") -> List[str]:
+        """
+        List the keys in a bucket.
+
+        Args:
+            bucket_name (str): Name of the bucket
+            prefix (str): Key prefix
+        """
+        return sorted(key for bucket, key in self.s3.objects if bucket == bucket_name and key.startswith(prefix))
+
+    def _collect_notifications(self, stage: str) -> List[str]:
+        """
+        Get the objects created since the last call that trigger a stage.
+
+        Args:
+            stage (str): Name of the Lambda function package
+        """
+        bucket_name, prefix, suffix = STAGE_TRIGGERS[stage]
+        created = []
+        for key in self.list_objects(bucket_name, prefix):
+            if key.endswith(suffix) and (bucket_name, key) not in self._notified:
+                self._notified.add((bucket_name, key))
+                created.append(key)
+        return created
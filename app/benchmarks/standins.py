@@ -0,0 +1,805 @@
+"""
+In-memory stand-ins for the AWS clients used by the Lambda functions.
+
+They implement the subset of the S3, DynamoDB, SQS and Bedrock APIs the functions
+call, including conditional writes, update expressions, secondary indexes and
+multipart uploads, so the pipeline can be run and measured without AWS.
+Errors carry a botocore-style "response" attribute with the error code.
+"""
+import base64
+import hashlib
+import io
+import json
+import re
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+
+class ClientError(Exception):
+    """Error raised by the stand-ins, shaped like botocore's ClientError."""
+
+    def __init__(self, code, message="", operation=""):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation: {message}")
+        self.response = {"Error": {"Code": code, "Message": message}}
+
+
+ERROR_CODES = [
+    "ConditionalCheckFailedException",
+    "EntityTooSmall",
+    "NoSuchKey",
+    "ProvisionedThroughputExceededException",
+    "ResourceNotFoundException",
+    "ServiceQuotaExceededException",
+    "ThrottlingException",
+    "ValidationException"
+]
+
+
+class _Exceptions:
+    """Modeled exception classes, available as client.exceptions.<code>."""
+
+    def __init__(self):
+        for name in ERROR_CODES:
+            setattr(self, name, type(name, (ClientError,), {"__init__": _make_init(name)}))
+
+
+def _make_init(code):
+    def __init__(self, message="", operation=""):
+        ClientError.__init__(self, code, message, operation)
+    return __init__
+
+
+class StreamingBody:
+    """Response body of GetObject and InvokeModel."""
+
+    def __init__(self, data: bytes):
+        self._stream = io.BytesIO(data)
+
+    def read(self, amt=None):
+        return self._stream.read() if amt is None else self._stream.read(amt)
+
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self._stream.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_lines(self, chunk_size=1024, keepends=False):
+        pending = b""
+        for chunk in self.iter_chunks(chunk_size):
+            lines = (pending + chunk).splitlines(True)
+            for line in lines[:-1]:
+                yield line if keepends else line.splitlines()[0]
+            pending = lines[-1]
+        if pending:
+            yield pending if keepends else pending.splitlines()[0]
+
+    def close(self):
+        pass
+
+
+def _sha256(data):
+    """Base64 encoded SHA-256 digest, as returned in S3 checksum fields."""
+    return base64.b64encode(hashlib.sha256(data).digest()).decode()
+
+
+class InMemoryS3:
+    """S3 client holding objects in a dict keyed by (bucket, key)."""
+
+    def __init__(self):
+        self.objects = {}
+        self.uploads = {}
+        self.exceptions = _Exceptions()
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _count(self, op):
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+
+    def _get(self, bucket, key):
+        try:
+            return self.objects[(bucket, key)]
+        except KeyError:
+            raise self.exceptions.NoSuchKey(f"{bucket}/{key}", "GetObject")
+
+    def put_object(self, Bucket, Key, Body=b"", **kwargs):
+        self._count("put_object")
+        if isinstance(Body, str):
+            Body = Body.encode()
+        elif hasattr(Body, "read"):
+            Body = Body.read()
+        self.objects[(Bucket, Key)] = bytes(Body)
+        response = {"ETag": f'"{uuid.uuid4().hex}"'}
+        if kwargs.get("ChecksumAlgorithm") == "SHA256":
+            response["ChecksumSHA256"] = _sha256(Body)
+        return response
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, **kwargs):
+        self._count("upload_fileobj")
+        self.objects[(Bucket, Key)] = Fileobj.read()
+
+    def download_fileobj(self, Bucket, Key, Fileobj, **kwargs):
+        self._count("download_fileobj")
+        Fileobj.write(self._get(Bucket, Key))
+
+    def get_object(self, Bucket, Key, Range=None, **kwargs):
+        self._count("get_object")
+        data = self._get(Bucket, Key)
+        if Range and re.match(r"bytes=-\d+$", Range):
+            data = data[int(Range[len("bytes="):]):]
+        elif Range:
+            match = re.match(r"bytes=(\d+)-(\d*)", Range)
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            data = data[start:end + 1]
+        return {"Body": StreamingBody(data), "ContentLength": len(data)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._count("head_object")
+        data = self._get(Bucket, Key)
+        return {"ContentLength": len(data), "ETag": '"etag"'}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self.objects.pop((Bucket, Key), None)
+
+    def delete_objects(self, Bucket, Delete, **kwargs):
+        self._count("delete_objects")
+        for obj in Delete["Objects"]:
+            self.objects.pop((Bucket, obj["Key"]), None)
+        return {"Deleted": Delete["Objects"]}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self.objects[(Bucket, Key)] = self._get(CopySource["Bucket"], CopySource["Key"])
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", ContinuationToken=None, MaxKeys=1000, **kwargs):
+        self._count("list_objects_v2")
+        keys = sorted(k for (b, k) in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken) if ContinuationToken else 0
+        page = keys[start:start + MaxKeys]
+        response = {
+            "Contents": [{"Key": k, "Size": len(self.objects[(Bucket, k)])} for k in page],
+            "KeyCount": len(page),
+            "IsTruncated": start + MaxKeys < len(keys),
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = str(start + MaxKeys)
+        return response
+
+    def get_paginator(self, name):
+        client = self
+
+        class _Paginator:
+            def paginate(self, **kwargs):
+                token = None
+                while True:
+                    if token:
+                        kwargs["ContinuationToken"] = token
+                    page = getattr(client, name)(**kwargs)
+                    yield page
+                    token = page.get("NextContinuationToken")
+                    if not token:
+                        return
+        return _Paginator()
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self._count("create_multipart_upload")
+        upload_id = uuid.uuid4().hex
+        self.uploads[upload_id] = {"bucket": Bucket, "key": Key, "parts": {}, "checksum": kwargs.get("ChecksumAlgorithm")}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        self._count("upload_part")
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        self.uploads[UploadId]["parts"][PartNumber] = data
+        return self._part_result(UploadId, PartNumber, data)
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange=None, **kwargs):
+        self._count("upload_part_copy")
+        data = self._get(CopySource["Bucket"], CopySource["Key"])
+        if CopySourceRange:
+            match = re.match(r"bytes=(\d+)-(\d+)", CopySourceRange)
+            data = data[int(match.group(1)):int(match.group(2)) + 1]
+        self.uploads[UploadId]["parts"][PartNumber] = data
+        return {"CopyPartResult": self._part_result(UploadId, PartNumber, data)}
+
+    def _part_result(self, upload_id, part_number, data):
+        result = {"ETag": f'"{part_number}"'}
+        if self.uploads[upload_id]["checksum"] == "SHA256":
+            result["ChecksumSHA256"] = _sha256(data)
+        return result
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload, **kwargs):
+        self._count("complete_multipart_upload")
+        upload = self.uploads.pop(UploadId)
+        numbers = [p["PartNumber"] for p in MultipartUpload["Parts"]]
+        if numbers != sorted(numbers):
+            raise self.exceptions.ValidationException("Parts must be in ascending order", "CompleteMultipartUpload")
+        for number in numbers[:-1]:
+            if len(upload["parts"][number]) < 5 * 1024 * 1024:
+                raise self.exceptions.EntityTooSmall(f"Part {number} is smaller than 5 MiB", "CompleteMultipartUpload")
+        self.objects[(Bucket, Key)] = b"".join(upload["parts"][n] for n in numbers)
+        response = {"ETag": '"multipart"'}
+        if upload["checksum"] == "SHA256":
+            # Composite checksum: the checksum of the binary part checksums
+            digests = b"".join(base64.b64decode(part["ChecksumSHA256"]) for part in MultipartUpload["Parts"])
+            response["ChecksumSHA256"] = f"{_sha256(digests)}-{len(numbers)}"
+        return response
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId, **kwargs):
+        self.uploads.pop(UploadId, None)
+
+
+_TOKEN = re.compile(r"\s*(#[\w]+|:[\w]+|<>|<=|>=|[=<>(),+\-]|[A-Za-z_][\w.]*)")
+
+
+def _tokenize(expression):
+    """Split a DynamoDB expression into names, values, operators and keywords."""
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Cannot tokenize {expression[position:]!r}")
+        tokens.append(match.group(1))
+        position = match.end()
+        while position < len(expression) and expression[position].isspace():
+            position += 1
+    return tokens
+
+
+def _to_python(value):
+    """Convert an attribute value to a comparable Python value."""
+    (kind, raw), = value.items()
+    if kind == "N":
+        return Decimal(raw)
+    if kind in ("SS", "NS"):
+        return set(raw) if kind == "SS" else {Decimal(x) for x in raw}
+    if kind == "NULL":
+        return None
+    return raw
+
+
+class _Parser:
+    """Recursive descent evaluator of condition and update expressions."""
+
+    def __init__(self, expression, names, values, item):
+        self.tokens = _tokenize(expression) if expression else []
+        self.i = 0
+        self.names = names or {}
+        self.values = values or {}
+        self.item = item
+
+    def peek(self):
+        return self.tokens[self.i] if self.i < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected and (token is None or token.upper() != expected.upper()):
+            raise ValueError(f"Expected {expected}, got {token}")
+        self.i += 1
+        return token
+
+    def name(self, token):
+        return self.names[token] if token.startswith("#") else token
+
+    def operand(self):
+        token = self.take()
+        if token.startswith(":"):
+            return self.values[token]
+        if token.lower() == "size":
+            self.take("(")
+            value = self.operand()
+            self.take(")")
+            if value is None:
+                return None
+            raw = _to_python(value)
+            return {"N": str(len(raw))}
+        if token.lower() == "if_not_exists":
+            self.take("(")
+            current = self.operand()
+            self.take(",")
+            default = self.value_expr()
+            self.take(")")
+            return current if current is not None else default
+        if token.lower() == "list_append":
+            self.take("(")
+            a = self.value_expr()
+            self.take(",")
+            b = self.value_expr()
+            self.take(")")
+            return {"L": (a or {"L": []})["L"] + (b or {"L": []})["L"]}
+        return self.item.get(self.name(token))
+
+    def value_expr(self):
+        left = self.operand()
+        while self.peek() in ("+", "-"):
+            op = self.take()
+            right = self.operand()
+            a, b = Decimal(left["N"]), Decimal(right["N"])
+            left = {"N": str(a + b if op == "+" else a - b)}
+        return left
+
+    def condition(self):
+        result = self.and_expr()
+        while self.peek() and self.peek().upper() == "OR":
+            self.take()
+            right = self.and_expr()
+            result = result or right
+        return result
+
+    def and_expr(self):
+        result = self.not_expr()
+        while self.peek() and self.peek().upper() == "AND":
+            self.take()
+            right = self.not_expr()
+            result = result and right
+        return result
+
+    def not_expr(self):
+        if self.peek() and self.peek().upper() == "NOT":
+            self.take()
+            return not self.not_expr()
+        return self.primary()
+
+    def primary(self):
+        token = self.peek()
+        if token == "(":
+            self.take()
+            result = self.condition()
+            self.take(")")
+            return result
+        lowered = token.lower()
+        if lowered in ("attribute_exists", "attribute_not_exists"):
+            self.take()
+            self.take("(")
+            name = self.name(self.take())
+            self.take(")")
+            exists = name in self.item
+            return exists if lowered == "attribute_exists" else not exists
+        if lowered in ("contains", "begins_with"):
+            self.take()
+            self.take("(")
+            container = self.operand()
+            self.take(",")
+            needle = self.operand()
+            self.take(")")
+            if container is None:
+                return False
+            c, n = _to_python(container), _to_python(needle)
+            if lowered == "begins_with":
+                return isinstance(c, str) and c.startswith(n)
+            if isinstance(container, dict) and "L" in container:
+                return needle in container["L"]
+            return n in c
+        left = self.operand()
+        op = self.take()
+        if op.upper() == "IN":
+            self.take("(")
+            options = [self.operand()]
+            while self.peek() == ",":
+                self.take()
+                options.append(self.operand())
+            self.take(")")
+            return left is not None and any(left == o for o in options)
+        if op.upper() == "BETWEEN":
+            low = self.operand()
+            self.take("AND")
+            high = self.operand()
+            return left is not None and _to_python(low) <= _to_python(left) <= _to_python(high)
+        right = self.operand()
+        if left is None or right is None:
+            return op == "<>" and (left is None) != (right is None)
+        a, b = _to_python(left), _to_python(right)
+        return {
+            "=": a == b, "<>": a != b, "<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b,
+        }[op]
+
+
+def evaluate_condition(expression, names, values, item):
+    """Evaluate a condition, filter or key condition expression against an item."""
+    if not expression:
+        return True
+    parser = _Parser(expression, names, values, item)
+    result = parser.condition()
+    if parser.peek() is not None:
+        raise ValueError(f"Trailing tokens in {expression!r}: {parser.tokens[parser.i:]}")
+    return result
+
+
+def apply_update(expression, names, values, item):
+    """Return a copy of an item with an update expression applied."""
+    parser = _Parser(expression, names, values, item)
+    new_item = dict(item)
+    parser.item = item
+    clause = None
+    while parser.peek() is not None:
+        token = parser.peek()
+        if token.upper() in ("SET", "ADD", "REMOVE", "DELETE"):
+            clause = parser.take().upper()
+            continue
+        if token == ",":
+            parser.take()
+            continue
+        name = parser.name(parser.take())
+        if clause == "SET":
+            parser.take("=")
+            new_item[name] = parser.value_expr()
+        elif clause == "ADD":
+            value = parser.operand()
+            current = new_item.get(name)
+            if "N" in value:
+                total = Decimal(current["N"]) if current else Decimal(0)
+                new_item[name] = {"N": str(total + Decimal(value["N"]))}
+            else:
+                (kind, raw), = value.items()
+                existing = set(current[kind]) if current else set()
+                new_item[name] = {kind: sorted(existing | set(raw))}
+        elif clause == "REMOVE":
+            new_item.pop(name, None)
+        elif clause == "DELETE":
+            value = parser.operand()
+            (kind, raw), = value.items()
+            if name in new_item:
+                remaining = set(new_item[name][kind]) - set(raw)
+                if remaining:
+                    new_item[name] = {kind: sorted(remaining)}
+                else:
+                    new_item.pop(name)
+        else:
+            raise ValueError(f"Unknown clause in {expression!r}")
+    return new_item
+
+
+def _partition_value(expression, partition_key, names, values):
+    """Get the value a key condition requires for the partition key, if it is a plain equality."""
+    first = expression.split(" AND ")[0].split("=")
+    if len(first) != 2:
+        return None
+    name, value = first[0].strip(), first[1].strip()
+    if (names or {}).get(name, name) != partition_key or not value.startswith(":"):
+        return None
+    return (values or {}).get(value)
+
+
+class InMemoryDynamoDB:
+    """
+    DynamoDB client with string partition keys and secondary indexes.
+
+    Set unprocessed_once to return every second request of the next
+    BatchWriteItem call as unprocessed.
+    """
+
+    def __init__(self):
+        self.tables = {}
+        self.exceptions = _Exceptions()
+        self.calls = {}
+        self.unprocessed_once = False
+        self._lock = threading.RLock()
+
+    def create_table(self, name, key="id", indexes=None):
+        """
+        Create a table.
+
+        Args:
+            name: Name of the table
+            key: Name of the string partition key
+            indexes: Secondary indexes as {index name: (partition key, sort key or None)}
+        """
+        self.tables[name] = {"key": key, "items": {}, "indexes": indexes or {}}
+
+    def _count(self, op):
+        self.calls[op] = self.calls.get(op, 0) + 1
+
+    def _table(self, name):
+        if name not in self.tables:
+            self.create_table(name)
+        return self.tables[name]
+
+    def _key(self, table, key):
+        return key[table["key"]]["S"]
+
+    def get_item(self, TableName, Key, **kwargs):
+        with self._lock:
+            self._count("get_item")
+            table = self._table(TableName)
+            item = table["items"].get(self._key(table, Key))
+            return {"Item": dict(item)} if item else {}
+
+    def put_item(self, TableName, Item, ConditionExpression=None, ExpressionAttributeNames=None,
+                 ExpressionAttributeValues=None, **kwargs):
+        with self._lock:
+            self._count("put_item")
+            table = self._table(TableName)
+            key = self._key(table, Item)
+            current = table["items"].get(key, {})
+            if not evaluate_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, current):
+                raise self.exceptions.ConditionalCheckFailedException("The conditional request failed", "PutItem")
+            table["items"][key] = dict(Item)
+            return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeValues=None,
+                    ExpressionAttributeNames=None, ConditionExpression=None, ReturnValues="NONE", **kwargs):
+        with self._lock:
+            self._count("update_item")
+            table = self._table(TableName)
+            key = self._key(table, Key)
+            current = table["items"].get(key, dict(Key))
+            if not evaluate_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                                      current if key in table["items"] else {}):
+                raise self.exceptions.ConditionalCheckFailedException("The conditional request failed", "UpdateItem")
+            new_item = apply_update(UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues, current)
+            new_item.update(Key)
+            table["items"][key] = new_item
+            if ReturnValues == "ALL_NEW":
+                return {"Attributes": dict(new_item)}
+            if ReturnValues == "UPDATED_NEW":
+                return {"Attributes": {k: v for k, v in new_item.items() if current.get(k) != v}}
+            if ReturnValues == "ALL_OLD":
+                return {"Attributes": dict(current)} if key in table["items"] else {}
+            return {}
+
+    def delete_item(self, TableName, Key, ConditionExpression=None, ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        with self._lock:
+            self._count("delete_item")
+            table = self._table(TableName)
+            current = table["items"].get(self._key(table, Key), {})
+            if not evaluate_condition(ConditionExpression, ExpressionAttributeNames, ExpressionAttributeValues, current):
+                raise self.exceptions.ConditionalCheckFailedException("The conditional request failed", "DeleteItem")
+            table["items"].pop(self._key(table, Key), None)
+            return {}
+
+    def _page(self, items, Limit, ExclusiveStartKey, table, sort_key=None):
+        start = 0
+        if ExclusiveStartKey:
+            keys = [self._key(table, i) for i in items]
+            start = keys.index(self._key(table, ExclusiveStartKey)) + 1
+        page = items[start:start + Limit] if Limit else items[start:]
+        last = None
+        if Limit and start + Limit < len(items):
+            last = {table["key"]: page[-1][table["key"]]}
+        return page, last
+
+    def scan(self, TableName, FilterExpression=None, ExpressionAttributeValues=None,
+             ExpressionAttributeNames=None, Limit=None, ExclusiveStartKey=None, **kwargs):
+        with self._lock:
+            self._count("scan")
+            table = self._table(TableName)
+            items = sorted(table["items"].values(), key=lambda i: self._key(table, i))
+            page, last = self._page(items, Limit, ExclusiveStartKey, table)
+            matched = [dict(i) for i in page
+                       if evaluate_condition(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues, i)]
+            response = {"Items": matched, "Count": len(matched), "ScannedCount": len(page)}
+            if last:
+                response["LastEvaluatedKey"] = last
+            return response
+
+    def query(self, TableName, KeyConditionExpression, IndexName=None, FilterExpression=None,
+              ExpressionAttributeValues=None, ExpressionAttributeNames=None, Limit=None,
+              ExclusiveStartKey=None, ScanIndexForward=True, Select=None, ConsistentRead=False, **kwargs):
+        with self._lock:
+            self._count("query")
+            table = self._table(TableName)
+            if IndexName:
+                if IndexName not in table["indexes"]:
+                    raise self.exceptions.ValidationException(f"Index {IndexName} not found", "Query")
+                partition_key, sort_key = table["indexes"][IndexName]
+                if ConsistentRead:
+                    raise self.exceptions.ValidationException("Consistent reads are not supported on GSI", "Query")
+            else:
+                partition_key, sort_key = table["key"], None
+            candidates = [i for i in table["items"].values() if partition_key in i
+                          and (sort_key is None or sort_key in i)]
+            # Equality on the partition key is checked directly, the expression
+            # parser is far too slow to run against every item of a large table
+            partition_value = _partition_value(KeyConditionExpression, partition_key,
+                                               ExpressionAttributeNames, ExpressionAttributeValues)
+            if partition_value is not None:
+                candidates = [i for i in candidates if i[partition_key] == partition_value]
+            matched = [i for i in candidates
+                       if evaluate_condition(KeyConditionExpression, ExpressionAttributeNames,
+                                             ExpressionAttributeValues, i)]
+            matched.sort(key=lambda i: (_to_python(i[sort_key]) if sort_key else "", self._key(table, i)),
+                         reverse=not ScanIndexForward)
+            page, last = self._page(matched, Limit, ExclusiveStartKey, table)
+            filtered = [dict(i) for i in page
+                        if evaluate_condition(FilterExpression, ExpressionAttributeNames, ExpressionAttributeValues, i)]
+            response = {"Count": len(filtered), "ScannedCount": len(page)}
+            if Select != "COUNT":
+                response["Items"] = filtered
+            if last:
+                response["LastEvaluatedKey"] = last
+            return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        with self._lock:
+            self._count("batch_write_item")
+            unprocessed = {}
+            for table_name, requests in RequestItems.items():
+                if len(requests) > 25:
+                    raise self.exceptions.ValidationException("Too many items requested", "BatchWriteItem")
+                table = self._table(table_name)
+                for n, request in enumerate(requests):
+                    if self.unprocessed_once and n % 2:
+                        unprocessed.setdefault(table_name, []).append(request)
+                        continue
+                    if "PutRequest" in request:
+                        item = request["PutRequest"]["Item"]
+                        table["items"][self._key(table, item)] = dict(item)
+                    else:
+                        table["items"].pop(self._key(table, request["DeleteRequest"]["Key"]), None)
+            self.unprocessed_once = False
+            return {"UnprocessedItems": unprocessed}
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        with self._lock:
+            self._count("batch_get_item")
+            responses = {}
+            for table_name, request in RequestItems.items():
+                if len(request["Keys"]) > 100:
+                    raise self.exceptions.ValidationException("Too many items requested", "BatchGetItem")
+                table = self._table(table_name)
+                found = [dict(table["items"][self._key(table, k)]) for k in request["Keys"]
+                         if self._key(table, k) in table["items"]]
+                responses[table_name] = found
+            return {"Responses": responses, "UnprocessedKeys": {}}
+
+
+class InMemoryBedrock:
+    """
+    Bedrock client for batch inference jobs.
+
+    Jobs complete as soon as they are created: a synthetic .out file with a
+    rotating category per record and a manifest.json.out are written next to
+    each other, like Bedrock does. Set auto_complete to False to complete jobs
+    with complete_job instead, and error_every to n to fail every n-th record
+    with a model error.
+    """
+
+    def __init__(self, s3, max_concurrent_jobs=None, categories=None, error_every=0):
+        self.s3 = s3
+        self.jobs = {}
+        self.exceptions = _Exceptions()
+        self.max_concurrent_jobs = max_concurrent_jobs
+        self.categories = categories or ["Booking Inquiry", "Complaint", "Other"]
+        self.auto_complete = True
+        self.error_every = error_every
+
+    def create_model_invocation_job(self, jobName, roleArn, modelId, inputDataConfig, outputDataConfig, **kwargs):
+        # A repeated request with the same token returns the job it created
+        token = kwargs.get("clientRequestToken")
+        for job in self.jobs.values():
+            if token and job.get("clientRequestToken") == token:
+                return {"jobArn": job["jobArn"]}
+        running = [j for j in self.jobs.values() if j["status"] in ("Submitted", "InProgress")]
+        if self.max_concurrent_jobs is not None and len(running) >= self.max_concurrent_jobs:
+            raise self.exceptions.ServiceQuotaExceededException("Too many jobs", "CreateModelInvocationJob")
+        if any(j["jobName"] == jobName for j in self.jobs.values()):
+            raise self.exceptions.ValidationException("Duplicate job name", "CreateModelInvocationJob")
+        short_id = uuid.uuid4().hex[:12]
+        arn = f"arn:aws:bedrock:us-east-1:123456789012:model-invocation-job/{short_id}"
+        job = {
+            "jobArn": arn, "jobName": jobName, "modelId": modelId, "status": "InProgress",
+            "inputDataConfig": inputDataConfig, "outputDataConfig": outputDataConfig,
+            "submitTime": time.time(), "lastModifiedTime": time.time(), "clientRequestToken": token,
+        }
+        self.jobs[arn] = job
+        if self.auto_complete:
+            self.complete_job(arn)
+        return {"jobArn": arn}
+
+    def complete_job(self, arn, status="Completed"):
+        """
+        Finish a job and write its output for successful statuses.
+
+        Returns:
+            Bucket and key of the .out file, or None
+        """
+        job = self.jobs[arn]
+        job["status"] = status
+        job["endTime"] = time.time()
+        if status not in ("Completed", "PartiallyCompleted"):
+            return None
+        input_uri = job["inputDataConfig"]["s3InputDataConfig"]["s3Uri"]
+        output_uri = job["outputDataConfig"]["s3OutputDataConfig"]["s3Uri"]
+        bucket, key = input_uri[5:].split("/", 1)
+        out_bucket, out_prefix = output_uri[5:].split("/", 1)
+        short_id = arn.split("/")[-1]
+        lines = []
+        count = errors = 0
+        for line in self.s3.objects[(bucket, key)].decode().splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            count += 1
+            if self.error_every and count % self.error_every == 0:
+                errors += 1
+                record["error"] = {"errorCode": 500, "errorMessage": "Internal server error"}
+                lines.append(json.dumps(record, ensure_ascii=False))
+                continue
+            category = self.categories[count % len(self.categories)]
+            record["modelOutput"] = {
+                "id": "msg", "type": "message", "role": "assistant",
+                "content": [{"type": "text", "text": f"<class>{category}</class>\nSynthetic rationale {count}."}],
+                "stop_reason": "end_turn", "usage": {"input_tokens": 10, "output_tokens": 10},
+            }
+            lines.append(json.dumps(record, ensure_ascii=False))
+        out_key = f"{out_prefix}{short_id}/{key.split('/')[-1]}.out"
+        self.s3.objects[(out_bucket, out_key)] = ("\n".join(lines) + "\n").encode()
+        manifest = {"totalRecordCount": count, "processedRecordCount": count,
+                    "successRecordCount": count - errors, "errorRecordCount": errors}
+        self.s3.objects[(out_bucket, f"{out_prefix}{short_id}/manifest.json.out")] = json.dumps(manifest).encode()
+        return out_bucket, out_key
+
+    def get_model_invocation_job(self, jobIdentifier, **kwargs):
+        for job in self.jobs.values():
+            if jobIdentifier in (job["jobArn"], job["jobArn"].split("/")[-1], job["jobName"]):
+                return dict(job)
+        raise self.exceptions.ResourceNotFoundException(jobIdentifier, "GetModelInvocationJob")
+
+    def list_model_invocation_jobs(self, maxResults=100, nextToken=None, nameContains=None,
+                                   statusEquals=None, submitTimeAfter=None, **kwargs):
+        jobs = [j for j in self.jobs.values()
+                if (not nameContains or nameContains in j["jobName"])
+                and (not statusEquals or j["status"] == statusEquals)]
+        start = int(nextToken or 0)
+        page = jobs[start:start + maxResults]
+        response = {"invocationJobSummaries": [dict(j) for j in page]}
+        if start + maxResults < len(jobs):
+            response["nextToken"] = str(start + maxResults)
+        return response
+
+
+class InMemoryBedrockRuntime:
+    """Bedrock runtime client answering InvokeModel, throttling every n-th call if set."""
+
+    def __init__(self, categories=None, throttle_every=0):
+        self.categories = categories or ["Booking Inquiry", "Complaint", "Other"]
+        self.exceptions = _Exceptions()
+        self.calls = 0
+        self.throttle_every = throttle_every
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body, **kwargs):
+        with self._lock:
+            self.calls += 1
+            calls = self.calls
+        if self.throttle_every and calls % self.throttle_every == 0:
+            raise self.exceptions.ThrottlingException("Rate exceeded", "InvokeModel")
+        request = json.loads(body)
+        category = self.categories[calls % len(self.categories)]
+        response = {
+            "id": "msg", "type": "message", "role": "assistant",
+            "content": [{"type": "text", "text": f"<class>{category}</class>\nRealtime rationale."}],
+            "stop_reason": "end_turn", "usage": {"input_tokens": 10, "output_tokens": 10},
+        }
+        return {"body": StreamingBody(json.dumps(response).encode()), "contentType": "application/json"}
+
+
+class InMemorySQS:
+    """SQS client keeping the sent messages per queue URL."""
+
+    def __init__(self):
+        self.messages = {}
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def send_message_batch(self, QueueUrl, Entries, **kwargs):
+        successful = []
+        with self._lock:
+            for entry in Entries:
+                self._next_id += 1
+                message_id = f"message-{self._next_id}"
+                self.messages.setdefault(QueueUrl, []).append({"messageId": message_id, "body": entry["MessageBody"]})
+                successful.append({"Id": entry["Id"], "MessageId": message_id})
+        return {"Successful": successful, "Failed": []}
+
+    def receive_messages(self, QueueUrl):
+        """Take all messages of a queue."""
+        with self._lock:
+            return self.messages.pop(QueueUrl, [])
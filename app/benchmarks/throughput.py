@@ -0,0 +1,148 @@
+"""
+End-to-end throughput benchmark of the classification pipeline.
+
+Every combination of input size and format runs in its own Python process,
+so the reported peak RSS belongs to that case alone. It includes the
+in-memory buckets holding the input, batch and result files, so it is an
+upper bound of what a single Lambda function needs.
+
+Usage:
+    python app/benchmarks/throughput.py --sizes 1000,10000 --formats csv,json
+    python app/benchmarks/throughput.py --sizes 1000000 --formats csv --output-format .xlsx
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+from harness import CUSTOMER_BUCKET, FILE_FORMATS, LocalPipeline, generate_records, write_input_file
+
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+
+
+def run_case(file_format: str, size: int, duplicate_ratio: float, output_format: str) -> Dict[str, Any]:
+    """
+    Run the pipeline on one generated input file.
+
+    Args:
+        file_format (str): Format of the input file
+        size (int): Number of records
+        duplicate_ratio (float): Share of records with a duplicate text
+        output_format (str): Format of the result files, e.g. ".csv"
+    """
+    body = write_input_file(generate_records(size, duplicate_ratio), file_format)
+    key = f"benchmark-{size}.{file_format}"
+
+    pipeline = LocalPipeline({"batchResultsProcessing": {"OUTPUT_FORMAT": output_format}})
+    pipeline.upload(key, body)
+
+    start = time.perf_counter()
+    pipeline.run(key)
+    elapsed = time.perf_counter() - start
+
+    stages = {}
+    for stage, latencies in pipeline.latencies.items():
+        ordered = sorted(latencies)
+        stages[stage] = {
+            "invocations": len(ordered),
+            "total_seconds": round(sum(ordered), 3),
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 1) if ordered else 0.0,
+            "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0
+        }
+
+    return {
+        "format": file_format,
+        "records": size,
+        "input_bytes": len(body),
+        "elapsed_seconds": round(elapsed, 3),
+        "records_per_second": round(size / elapsed, 1) if elapsed else 0.0,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "batch_jobs": len(pipeline.bedrock.jobs),
+        "result_files": len(pipeline.list_objects(CUSTOMER_BUCKET, "output_data/")),
+        "stages": stages
+    }
+
+
+def run_isolated(file_format: str, size: int, duplicate_ratio: float, output_format: str) -> Dict[str, Any]:
+    """
+    Run a case in a separate process and return its result.
+
+    Args:
+        file_format (str): Format of the input file
+        size (int): Number of records
+        duplicate_ratio (float): Share of records with a duplicate text
+        output_format (str): Format of the result files, e.g. ".csv"
+    """
+    command = [
+        sys.executable, __file__,
+        "--case", file_format, str(size),
+        "--duplicate-ratio", str(duplicate_ratio),
+        "--output-format", output_format
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"format": file_format, "records": size, "error": completed.stderr.strip().splitlines()[-1:]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+REPORT_HEADER = (
+    f"{'format':<7}{'records':>10}{'input MB':>10}{'seconds':>10}{'records/s':>12}{'peak MB':>10}"
+    "  stage latency p50/max ms x invocations"
+)
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    """
+    Format the result of a case as a report line.
+
+    Args:
+        result: Result of the case
+    """
+    if "error" in result:
+        return f"{result['format']:<7}{result['records']:>10}  failed: {result['error']}"
+
+    latencies = ", ".join(
+        f"{stage} {stats['p50_ms']}/{stats['max_ms']} x{stats['invocations']}"
+        for stage, stats in result["stages"].items()
+    )
+    return (
+        f"{result['format']:<7}{result['records']:>10}{result['input_bytes'] / 1024 / 1024:>10.1f}"
+        f"{result['elapsed_seconds']:>10.2f}{result['records_per_second']:>12.0f}"
+        f"{result['peak_rss_mb']:>10.1f}  {latencies}"
+    )
+
+
+def main() -> None:
+    """Parse the arguments and run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Comma separated record counts")
+    parser.add_argument("--formats", default=",".join(FILE_FORMATS), help="Comma separated input formats")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of records with a duplicate text")
+    parser.add_argument("--output-format", default=".csv", help="Format of the result files, e.g. .xlsx")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--case", nargs=2, metavar=("FORMAT", "SIZE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case:
+        print(json.dumps(run_case(args.case[0], int(args.case[1]), args.duplicate_ratio, args.output_format)))
+        return
+
+    print(REPORT_HEADER)
+    print("-" * len(REPORT_HEADER))
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for file_format in args.formats.split(","):
+            results.append(run_isolated(file_format, size, args.duplicate_ratio, args.output_format))
+            print(format_result(results[-1]), flush=True)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,12 @@ import json
 import logging
 from batchClassifier.environmentConfig import EnvironmentConfig
 from batchClassifier.dataProcessor import DataProcessor
+from batchClassifier.jobReconciler import JobReconciler
+from batchClassifier.jobScheduler import JobScheduler
+from utils.sqs_batch import process_sqs_records
 from utils.sqs_parser import extract_bucket_from_sqs_message
 import os
+from functools import lru_cache
 from typing import Dict, Any
 
 # Configure logging
@@ -12,10 +16,68 @@ log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
 
+@lru_cache(maxsize=1)
+def get_scheduler() -> JobScheduler:
+    """
+    Create the configuration, processor and scheduler on the first invocation.
+
+    They are reused by later invocations of the same execution environment.
+    """
+    config = EnvironmentConfig()
+    return JobScheduler(config, DataProcessor(config))
+
+
+@lru_cache(maxsize=1)
+def get_reconciler() -> JobReconciler:
+    """Create the reconciler of running jobs on the first scheduled invocation."""
+    scheduler = get_scheduler()
+    return JobReconciler(scheduler.config, scheduler.processor.bedrock_client)
+
+
+def process_record(record: Dict[str, Any]) -> None:
+    """
+    Queue the Bedrock batch inference job of the batch file in an SQS message.
+
+    Args:
+        record (Dict[str, Any]): SQS record containing S3 event information
+    """
+    logger.info(f"Processing record: {json.dumps(record)}")
+    scheduler = get_scheduler()
+
+    bucket = extract_bucket_from_sqs_message(record["body"])
+
+    if not bucket:
+        logger.error("Failed to extract bucket information")
+        return
+
+    input_bucket_name = bucket.get("input_bucket_name")
+    input_key_name = bucket.get("input_key_name")
+    base_filename = input_key_name.split("/")[-1].split(".", 1)[0]
+
+    if not input_key_name.endswith(".jsonl"):
+        logger.warning(f"Skipping non-JSONL file: {input_key_name}")
+        return
+
+    input_path = f"s3://{input_bucket_name}/{input_key_name}"
+    output_path = f"s3://{input_bucket_name}/{scheduler.config.get('output_folder_name')}/"
+
+    scheduler.enqueue(
+        base_filename,
+        input_path,
+        output_path,
+    )
+
+
 def lambda_handler(event: Dict, context: Any) -> Dict[str, Any]:
     """
     AWS Lambda handler function that processes SQS messages containing S3 event information
-    and creates Bedrock batch inference jobs for JSONL files.
+    and queues Bedrock batch inference jobs for JSONL files. Queued jobs are started by the
+    scheduler as the concurrency budget allows. Scheduled invocations without records
+    first reconcile the running jobs with Bedrock, so jobs that ended without output are
+    queued again, and then run the scheduler.
+
+    The messages of a batch are queued concurrently, and only the messages that
+    could not be queued are reported as failures to be delivered again.
     
     Args:
         event (dict): The AWS Lambda event object containing SQS records
@@ -25,47 +87,30 @@ def lambda_handler(event: Dict, context: Any) -> Dict[str, Any]:
     try:
         logger.info("Start data classification processing.")
 
-        # Initialize configuration
-        config = EnvironmentConfig()
-        processor = DataProcessor(config)
-
-        output_folder_name = config.get("output_folder_name")
-
-        for record in event["Records"]:
-            logger.info(f"Processing record: {json.dumps(record)}")
-            
-            bucket = extract_bucket_from_sqs_message(record["body"])
-
-            if not bucket:
-                logger.error("Failed to extract bucket information")
-                continue
+        scheduler = get_scheduler()
 
-            input_bucket_name = bucket.get("input_bucket_name")
-            input_key_name = bucket.get("input_key_name")
-            base_filename = input_key_name.split("/")[-1].split(".", 1)[0]
+        response = process_sqs_records(
+            event.get("Records", []),
+            process_record,
+            scheduler.config.get_int("record_concurrency", 4)
+        )
 
-            if not input_key_name.endswith(".jsonl"):
-                logger.warning(f"Skipping non-JSONL file: {input_key_name}")
-                continue
+        if not event.get("Records"):
+            try:
+                get_reconciler().run()
+            except Exception as e:
+                logger.error(f"Error reconciling running batch inference jobs: {str(e)}")
 
-            input_path = f"s3://{input_bucket_name}/{input_key_name}"
-            output_path = f"s3://{input_bucket_name}/{output_folder_name}/"
-            
-            processor.create_claude_batch_inference_job(
-                input_path,
-                output_path,
-                base_filename,
-            )
+        # Queued jobs are kept in the job status table, so a failed run is
+        # picked up by the next one instead of failing the queued messages
+        try:
+            scheduler.run()
+        except Exception as e:
+            logger.error(f"Error scheduling batch inference jobs: {str(e)}")
 
-        return {
-            "statusCode": 200,
-            "body": "Processing completed successfully"
-        }
+        return response
 
     except Exception as e:
         error_msg = f"Error processing event: {str(e)}"
         logger.error(error_msg)
-        return {
-            "statusCode": 500,
-            "body": error_msg
-        }
\ No newline at end of file
+        raise
\ No newline at end of file
@@ -1,14 +1,21 @@
 import os
 import logging
+import time
 from utils.dynamodb import update_or_create_job_status_record
 from batchClassifier.environmentConfig import EnvironmentConfig
 from boto3 import client
+from utils.aws_clients import CLIENT_CONFIG
 
 # Configure logging
 logger = logging.getLogger(__name__)
 log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
+bedrock_client = client("bedrock", config=CLIENT_CONFIG)
+
+STATUS_WRITE_ATTEMPTS = 3
+STATUS_WRITE_BACKOFF_SECONDS = 0.5
+
 
 class DataProcessor:
     """Handles data processing and AWS service interactions."""
@@ -22,7 +29,7 @@ class DataProcessor:
             bedrock_client: Boto3 Bedrock client
 
         """
-        self.bedrock_client = client("bedrock")
+        self.bedrock_client = bedrock_client
         self.config = config
 
     def create_claude_batch_inference_job(
@@ -30,15 +37,22 @@ class DataProcessor:
         input_data_s3_uri: str,
         output_data_s3_uri: str,
         base_filename: str,
-    ) -> None:
+        attempt: int = 1,
+    ) -> str:
         """
         Creates a Bedrock batch inference job.
-        
+
+        The request is idempotent per attempt, so an interrupted submission can
+        be repeated without starting a second job.
+
         Args:
             input_data_s3_uri: Input data S3 URI
             output_data_s3_uri: Output data S3 URI
             base_filename: Batch job name
+            attempt: Attempt number, starting at 1
 
+        Returns:
+            str: ARN of the Bedrock job
         """
         try:
             bedrock_job_prefix = self.config.get("bedrock_job_prefix")
@@ -58,27 +72,62 @@ class DataProcessor:
             }
 
             job_name = f"{bedrock_job_prefix}-{base_filename}"
+            if attempt > 1:
+                job_name = f"{job_name}-a{attempt}"
 
             bedrock_job = self.bedrock_client.create_model_invocation_job(
                 roleArn=role_arn,
                 modelId=model_id,
                 jobName=job_name,
+                clientRequestToken=f"{base_filename}-a{attempt}",
                 inputDataConfig=input_data_config,
                 outputDataConfig=output_data_config
             )
             bedrock_job_full_id = bedrock_job.get("jobArn")
             logger.info(f"Batch Inference Job {job_name} created successfully with {bedrock_job_full_id}")
 
-            update_or_create_job_status_record(
-                self.config.get("job_status_table"),
-                base_filename,
-                {
-                    "job_status": "RUNNING",
-                    "bedrock_job_full_id": bedrock_job_full_id,
-                    "bedrock_job_short_id": bedrock_job_full_id.split("/")[-1]
-                }
-            )
-
         except Exception as e:
             logger.error(f"Error creating batch inference job: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+        self._record_running_job(base_filename, bedrock_job_full_id)
+        return bedrock_job_full_id
+
+    def _record_running_job(self, base_filename: str, bedrock_job_full_id: str) -> bool:
+        """
+        Mark a batch RUNNING with the Bedrock job that was created for it.
+
+        Failed writes are retried. If the write still fails, the batch is left
+        SUBMITTING rather than FAILED, as its job is running: the scheduler
+        returns it to the queue once the submission times out, and the
+        repeated request with the same token returns the same Bedrock job.
+
+        Args:
+            base_filename: ID of the batch
+            bedrock_job_full_id: ARN of the Bedrock job
+
+        Returns:
+            bool: False if the batch could not be marked RUNNING
+        """
+        for attempt in range(1, STATUS_WRITE_ATTEMPTS + 1):
+            try:
+                update_or_create_job_status_record(
+                    self.config.get("job_status_table"),
+                    base_filename,
+                    {
+                        "job_status": "RUNNING",
+                        "bedrock_status": "Submitted",
+                        "bedrock_job_full_id": bedrock_job_full_id,
+                        "bedrock_job_short_id": bedrock_job_full_id.split("/")[-1]
+                    },
+                    forward_only=True
+                )
+                return True
+
+            except Exception as e:
+                logger.warning(f"Attempt {attempt} to mark job {base_filename} RUNNING failed: {e}")
+                if attempt < STATUS_WRITE_ATTEMPTS:
+                    time.sleep(STATUS_WRITE_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        logger.error(f"Job {base_filename} started as {bedrock_job_full_id} but stays SUBMITTING until it is requeued")
+        return False
\ No newline at end of file
@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -34,7 +34,18 @@ class EnvironmentConfig:
                 if not value:
                     raise ValueError(f"Missing required environment variable: {var}")
                 self._config[var.lower()] = value.strip()
-            
+
+            optional_vars = {
+                "MAX_CONCURRENT_JOBS": "10",
+                "SCHEDULER_QUEUE_READ_LIMIT": "1000",
+                "SUBMITTING_TIMEOUT_SECONDS": "900",
+                "RECORD_CONCURRENCY": "4",
+                "MAX_JOB_ATTEMPTS": "3"
+            }
+
+            for var, default in optional_vars.items():
+                self._config[var.lower()] = os.environ.get(var, default).strip()
+
             logger.info("Environment configuration loaded successfully")
 
         except Exception as e:
@@ -54,4 +65,19 @@ class EnvironmentConfig:
             return self._config.get(key.lower(), default)
         except Exception as e:
             logger.warning(f"Error retrieving config value for {key}: {str(e)}")
+            return default
+
+    def get_int(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        """
+        Get integer configuration value.
+
+        Args:
+            key (str): Configuration key
+            default (Optional[int]): Default value if key not found
+        """
+        try:
+            value = self.get(key, default)
+            return int(str(value)) if value is not None else default
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid integer value for {key}")
             return default
\ No newline at end of file
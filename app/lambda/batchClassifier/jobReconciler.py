@@ -0,0 +1,251 @@
+import json
+import os
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+from utils.batch_failures import report_failed_batch
+from utils.dynamodb import JOB_STATUS_INDEX, get_error_code, query_job_status_items, transition_job_status
+from utils.id_generator import get_current_timestamp
+from utils.s3 import list_s3_keys, read_s3_bytes
+from batchClassifier.environmentConfig import EnvironmentConfig
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+# Bedrock statuses of jobs that are still being worked on
+ACTIVE_BEDROCK_STATUSES = ["Submitted", "Validating", "Scheduled", "InProgress", "Stopping"]
+# Bedrock statuses of jobs whose output is processed by batchResultsProcessing
+COMPLETED_BEDROCK_STATUSES = ["Completed", "PartiallyCompleted"]
+# Bedrock statuses of jobs that ended without their output
+FAILED_BEDROCK_STATUSES = ["Failed", "Stopped", "Expired"]
+
+LIST_PAGE_SIZE = 1000
+# Margin for the clock of Bedrock when listing jobs submitted after a time
+SUBMIT_TIME_MARGIN = timedelta(hours=1)
+# Time after which the output of a completed job should have been processed
+OUTPUT_PROCESSING_GRACE = timedelta(minutes=30)
+MANIFEST_FILE_NAME = "manifest.json.out"
+MANIFEST_COUNTS = {
+    "totalRecordCount": "total_record_count",
+    "successRecordCount": "success_record_count",
+    "errorRecordCount": "error_record_count"
+}
+
+
+class JobReconciler:
+    """
+    Reconciles the RUNNING jobs of the job status table with their Bedrock jobs.
+
+    The output of a successful job is processed when its S3 notification
+    reaches batchResultsProcessing, but jobs that fail, are stopped or expire
+    write no output and would stay RUNNING, holding a slot of the concurrency
+    budget. Every run reads the RUNNING jobs through the status index and
+    looks up their Bedrock jobs with a few paginated ListModelInvocationJobs
+    calls instead of one call per job. The Bedrock status, the timings and the
+    record counts of the job manifest are stored on the items. Jobs that ended
+    without output are returned to the queue, so the scheduler starts them
+    again, until MAX_JOB_ATTEMPTS is reached; then they are marked FAILED and
+    counted as failed on their parent.
+    """
+
+    def __init__(self, config: EnvironmentConfig, bedrock_client: Any):
+        """
+        Initialize JobReconciler.
+
+        Args:
+            config (EnvironmentConfig): Environment configuration
+            bedrock_client: Bedrock client
+        """
+        self.config = config
+        self.bedrock_client = bedrock_client
+        self.job_status_table = config.get("job_status_table")
+        self.job_prefix = config.get("bedrock_job_prefix")
+        self.max_job_attempts = config.get_int("max_job_attempts", 3)
+
+    def run(self) -> Dict[str, int]:
+        """
+        Reconcile all RUNNING jobs.
+
+        Returns:
+            Dict[str, int]: Number of checked, updated, requeued, failed and missing jobs
+        """
+        stats = {"checked": 0, "updated": 0, "requeued": 0, "failed": 0, "missing": 0}
+
+        running = query_job_status_items(self.job_status_table, JOB_STATUS_INDEX, "job_status", "RUNNING") or []
+        # Cached and real-time results have no Bedrock job
+        running = [item for item in running if "bedrock_job_full_id" in item]
+        if not running:
+            return stats
+
+        jobs = self._find_jobs(running)
+        for item in running:
+            stats["checked"] += 1
+            job = jobs.get(item["bedrock_job_full_id"]["S"])
+            if job is None:
+                stats["missing"] += 1
+                logger.warning(f"Bedrock job of {item['id']['S']} was not found")
+                continue
+
+            outcome = self._reconcile(item, job)
+            if outcome:
+                stats[outcome] += 1
+
+        logger.info(f"Reconciled {len(running)} running jobs: {stats}")
+        return stats
+
+    def _find_jobs(self, items: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up the Bedrock jobs of job items.
+
+        Jobs are listed page by page, newest first, until all jobs are found.
+        Jobs the listing misses are looked up one by one.
+
+        Args:
+            items: Job items with a Bedrock job ARN
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Bedrock job per ARN
+        """
+        wanted = {item["bedrock_job_full_id"]["S"] for item in items}
+        jobs: Dict[str, Dict[str, Any]] = {}
+
+        params: Dict[str, Any] = {
+            "maxResults": LIST_PAGE_SIZE,
+            "nameContains": self.job_prefix,
+            "sortBy": "CreationTime",
+            "sortOrder": "Descending"
+        }
+        submitted_after = self._get_earliest_submission(items)
+        if submitted_after is not None:
+            params["submitTimeAfter"] = submitted_after
+
+        pages = 0
+        while True:
+            response = self.bedrock_client.list_model_invocation_jobs(**params)
+            pages += 1
+            for job in response.get("invocationJobSummaries", []):
+                if job["jobArn"] in wanted:
+                    jobs[job["jobArn"]] = job
+
+            params["nextToken"] = response.get("nextToken")
+            if not params["nextToken"] or len(jobs) == len(wanted):
+                break
+
+        for job_arn in wanted - set(jobs):
+            try:
+                jobs[job_arn] = self.bedrock_client.get_model_invocation_job(jobIdentifier=job_arn)
+            except Exception as e:
+                if get_error_code(e) != "ResourceNotFoundException":
+                    raise
+
+        logger.info(f"Found {len(jobs)} of {len(wanted)} Bedrock jobs in {pages} pages")
+        return jobs
+
+    def _reconcile(self, item: Dict[str, Any], job: Dict[str, Any]) -> Optional[str]:
+        """
+        Bring a RUNNING job item in line with its Bedrock job.
+
+        Args:
+            item: Job item
+            job: Bedrock job
+
+        Returns:
+            Optional[str]: "updated", "requeued" or "failed", or None if nothing changed
+        """
+        item_id = item["id"]["S"]
+        status = job["status"]
+        previous_status = item.get("bedrock_status", {}).get("S")
+
+        if status in COMPLETED_BEDROCK_STATUSES:
+            end_time = job.get("endTime")
+            if isinstance(end_time, datetime) and get_current_timestamp() - end_time > OUTPUT_PROCESSING_GRACE:
+                logger.warning(f"Bedrock job of {item_id} ended at {end_time} but its output was not processed yet")
+
+        if status == previous_status:
+            return None
+
+        updates: Dict[str, Any] = {"bedrock_status": status, **self._get_timings(job)}
+        if status not in ACTIVE_BEDROCK_STATUSES:
+            updates.update(self._read_manifest_counts(item))
+
+        if status not in FAILED_BEDROCK_STATUSES:
+            # The output is processed, and the job completed, by batchResultsProcessing
+            return "updated" if transition_job_status(self.job_status_table, item_id, "RUNNING", updates) else None
+
+        message = job.get("message") or f"Bedrock job ended with status {status}"
+        attempt = int(item.get("attempts", {}).get("N", "1"))
+        if attempt < self.max_job_attempts:
+            logger.warning(f"Bedrock job of {item_id} ended with status {status}, queueing attempt {attempt + 1}: {message}")
+            updates.update({
+                "job_status": "QUEUED",
+                "attempts": attempt + 1,
+                "queued_at": int(get_current_timestamp().timestamp()),
+                "error_message": message
+            })
+            return "requeued" if transition_job_status(self.job_status_table, item_id, "RUNNING", updates) else None
+
+        logger.error(f"Bedrock job of {item_id} ended with status {status} after {attempt} attempts: {message}")
+        updates.update({"job_status": "FAILED", "error_message": message})
+        if not transition_job_status(self.job_status_table, item_id, "RUNNING", updates):
+            return None
+
+        report_failed_batch(self.job_status_table, item["parent_id"]["S"], item_id, item["output_s3_uri"]["S"], message)
+        return "failed"
+
+    def _read_manifest_counts(self, item: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Read the record counts from the manifest Bedrock writes next to the output of a job.
+
+        Args:
+            item: Job item
+
+        Returns:
+            Dict[str, int]: Record counts, empty if the job has no manifest
+        """
+        output_s3_uri = item.get("output_s3_uri", {}).get("S")
+        if not output_s3_uri:
+            return {}
+
+        bucket_name, _, prefix = output_s3_uri[len("s3://"):].partition("/")
+        short_id = item["bedrock_job_full_id"]["S"].split("/")[-1]
+        manifest_key = f"{prefix}{short_id}/{MANIFEST_FILE_NAME}"
+        # Jobs that failed before processing any record have no manifest
+        if manifest_key not in list_s3_keys(bucket_name, manifest_key):
+            return {}
+
+        manifest = json.loads(read_s3_bytes(bucket_name, manifest_key))
+
+        return {name: int(manifest[key]) for key, name in MANIFEST_COUNTS.items() if key in manifest}
+
+    @staticmethod
+    def _get_timings(job: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Get the timings of a Bedrock job as ISO 8601 strings.
+
+        Args:
+            job: Bedrock job
+        """
+        timings = {}
+        for key, name in [("submitTime", "bedrock_submit_time"), ("endTime", "bedrock_end_time")]:
+            value = job.get(key)
+            if value is not None:
+                timings[name] = value.isoformat() if isinstance(value, datetime) else str(value)
+        return timings
+
+    @staticmethod
+    def _get_earliest_submission(items: List[Dict[str, Any]]) -> Optional[datetime]:
+        """
+        Get the time before which none of the jobs was submitted.
+
+        Args:
+            items: Job items
+
+        Returns:
+            Optional[datetime]: Time to list jobs from, or None if an item has no submission time
+        """
+        times = [int(item["submitting_since"]["N"]) for item in items if "submitting_since" in item]
+        if len(times) < len(items):
+            return None
+        return datetime.fromtimestamp(min(times), tz=timezone.utc) - SUBMIT_TIME_MARGIN
@@ -0,0 +1,249 @@
+import os
+import logging
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List
+from utils.batch_failures import report_failed_batch
+from utils.dynamodb import (
+    JOB_STATUS_INDEX,
+    acquire_lease,
+    count_job_status_items,
+    get_error_code,
+    query_job_status_items,
+    release_lease,
+    transition_job_status,
+    update_or_create_job_status_record
+)
+from utils.id_generator import get_current_timestamp
+from batchClassifier.dataProcessor import DataProcessor
+from batchClassifier.environmentConfig import EnvironmentConfig
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+SCHEDULER_LEASE_ID = "batch-classifier-scheduler"
+SCHEDULER_LEASE_SECONDS = 120
+DEFAULT_PRIORITY = 100
+
+# Error codes returned by Bedrock when no more jobs can be started right now
+RETRYABLE_ERROR_CODES = [
+    "ThrottlingException",
+    "ServiceQuotaExceededException",
+    "TooManyRequestsException",
+    "ServiceUnavailableException",
+    "InternalServerException"
+]
+
+
+class JobScheduler:
+    """
+    Starts Bedrock batch inference jobs within a concurrency budget.
+
+    Incoming batch files are queued in the job status table as QUEUED items.
+    Each run counts the jobs in flight (RUNNING and SUBMITTING), and starts
+    queued jobs while slots are free. Jobs with a lower priority value go
+    first; the priority is taken from the "priority" user metadata of the
+    input file and defaults to DEFAULT_PRIORITY. Within a priority, parents
+    take turns so a large file cannot starve smaller ones. A job is claimed
+    with a conditional QUEUED to SUBMITTING update, so concurrent runs never
+    start it twice. When Bedrock throttles or the quota is reached, the job
+    goes back to the queue and the run stops; the next run, triggered by a
+    new file or by the schedule, picks it up again.
+    """
+
+    def __init__(self, config: EnvironmentConfig, processor: DataProcessor):
+        """
+        Initialize JobScheduler.
+
+        Args:
+            config (EnvironmentConfig): Environment configuration
+            processor (DataProcessor): Creates the Bedrock jobs
+        """
+        self.config = config
+        self.processor = processor
+        self.job_status_table = config.get("job_status_table")
+        self.max_concurrent_jobs = config.get_int("max_concurrent_jobs", 10)
+        self.queue_read_limit = config.get_int("scheduler_queue_read_limit", 1000)
+        self.submitting_timeout = config.get_int("submitting_timeout_seconds", 900)
+
+    def enqueue(
+        self,
+        item_id: str,
+        input_data_s3_uri: str,
+        output_data_s3_uri: str
+    ) -> bool:
+        """
+        Queue a batch file for classification.
+
+        The priority of the job is kept from the DRAFT record of the batch,
+        where the data preparation stored the priority of the input file.
+
+        Args:
+            item_id (str): ID of the batch
+            input_data_s3_uri (str): Input data S3 URI
+            output_data_s3_uri (str): Output data S3 URI
+
+        Returns:
+            bool: False if the job was already queued or started
+        """
+        queued = update_or_create_job_status_record(
+            self.job_status_table,
+            item_id,
+            {
+                "job_status": "QUEUED",
+                "input_s3_uri": input_data_s3_uri,
+                "output_s3_uri": output_data_s3_uri,
+                "queued_at": self._now()
+            },
+            forward_only=True
+        )
+        if queued:
+            logger.info(f"Queued job {item_id}")
+        return queued
+
+    def run(self) -> Dict[str, int]:
+        """
+        Start queued jobs while the concurrency budget allows.
+
+        Returns:
+            Dict[str, int]: Number of started, requeued, failed and skipped jobs
+        """
+        stats = {"started": 0, "requeued": 0, "failed": 0, "skipped": 0}
+        owner = str(uuid.uuid4())
+
+        if not acquire_lease(self.job_status_table, SCHEDULER_LEASE_ID, owner, SCHEDULER_LEASE_SECONDS):
+            logger.info("Another scheduler run is in progress")
+            return stats
+
+        try:
+            self._requeue_stale_submissions()
+
+            free_slots = self.max_concurrent_jobs - self._count_in_flight()
+            if free_slots <= 0:
+                logger.info(f"No free job slots, {self.max_concurrent_jobs} jobs are in flight")
+                return stats
+
+            queued = query_job_status_items(
+                self.job_status_table,
+                JOB_STATUS_INDEX,
+                "job_status",
+                "QUEUED",
+                max_items=self.queue_read_limit
+            ) or []
+
+            for item in self._order_fairly(queued)[:free_slots]:
+                outcome = self._start(item)
+                stats[outcome] += 1
+                if outcome == "requeued":
+                    break
+
+            logger.info(f"Scheduler run finished: {stats}, {len(queued)} jobs were queued, {free_slots} slots were free")
+            return stats
+        finally:
+            release_lease(self.job_status_table, SCHEDULER_LEASE_ID, owner)
+
+    def _count_in_flight(self) -> int:
+        """Count the jobs that use a slot of the concurrency budget."""
+        # Only RUNNING items with a Bedrock job ARN are real Bedrock jobs
+        running = count_job_status_items(self.job_status_table, "RUNNING", "bedrock_job_full_id")
+        submitting = count_job_status_items(self.job_status_table, "SUBMITTING")
+        return running + submitting
+
+    def _order_fairly(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Order queued jobs by priority, taking turns between parents.
+
+        Args:
+            items: Queued job items, oldest first
+        """
+        by_priority: Dict[int, "OrderedDict[str, List[Dict[str, Any]]]"] = {}
+        for item in items:
+            priority = int(item.get("priority", {}).get("N", DEFAULT_PRIORITY))
+            parent_id = item.get("parent_id", {}).get("S", "")
+            by_priority.setdefault(priority, OrderedDict()).setdefault(parent_id, []).append(item)
+
+        ordered = []
+        for priority in sorted(by_priority):
+            parents = list(by_priority[priority].values())
+            for turn in range(max(len(jobs) for jobs in parents)):
+                ordered.extend(jobs[turn] for jobs in parents if turn < len(jobs))
+
+        return ordered
+
+    def _start(self, item: Dict[str, Any]) -> str:
+        """
+        Claim a queued job and create its Bedrock job.
+
+        Args:
+            item: Queued job item
+
+        Returns:
+            str: "started", "requeued", "failed", or "skipped" if the job was claimed by another run
+        """
+        item_id = item["id"]["S"]
+        attempt = int(item.get("attempts", {}).get("N", "1"))
+
+        claimed = transition_job_status(
+            self.job_status_table,
+            item_id,
+            "QUEUED",
+            {"job_status": "SUBMITTING", "submitting_since": self._now()}
+        )
+        if not claimed:
+            return "skipped"
+
+        try:
+            self.processor.create_claude_batch_inference_job(
+                item["input_s3_uri"]["S"],
+                item["output_s3_uri"]["S"],
+                item_id,
+                attempt
+            )
+            return "started"
+
+        except Exception as e:
+            error_code = get_error_code(e)
+            if error_code in RETRYABLE_ERROR_CODES:
+                logger.warning(f"Bedrock did not accept job {item_id} ({error_code}), returning it to the queue")
+                transition_job_status(self.job_status_table, item_id, "SUBMITTING", {"job_status": "QUEUED"})
+                return "requeued"
+
+            logger.error(f"Job {item_id} could not be created: {e}")
+            failed = transition_job_status(
+                self.job_status_table,
+                item_id,
+                "SUBMITTING",
+                {"job_status": "FAILED", "error_message": str(e)}
+            )
+            if failed:
+                report_failed_batch(
+                    self.job_status_table,
+                    item["parent_id"]["S"],
+                    item_id,
+                    item["output_s3_uri"]["S"],
+                    str(e)
+                )
+            return "failed"
+
+    def _requeue_stale_submissions(self) -> None:
+        """Return jobs to the queue whose submission was interrupted."""
+        submitting = query_job_status_items(
+            self.job_status_table,
+            JOB_STATUS_INDEX,
+            "job_status",
+            "SUBMITTING"
+        ) or []
+        deadline = self._now() - self.submitting_timeout
+
+        for item in submitting:
+            since = int(item.get("submitting_since", {}).get("N", "0"))
+            if since < deadline:
+                logger.warning(f"Submission of job {item['id']['S']} timed out, returning it to the queue")
+                transition_job_status(self.job_status_table, item["id"]["S"], "SUBMITTING", {"job_status": "QUEUED"})
+
+    @staticmethod
+    def _now() -> int:
+        """Current time as epoch seconds."""
+        return int(get_current_timestamp().timestamp())
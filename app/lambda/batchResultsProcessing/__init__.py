@@ -1,10 +1,15 @@
 import os
 import logging
-from utils.dynamodb import get_job_status_items
+from functools import lru_cache
+from typing import Any, Dict
+from utils.dynamodb import BEDROCK_JOB_SHORT_ID_INDEX, query_job_status_items
+from utils.batch_failures import FAILED_BATCHES_FOLDER
 from batchResultsProcessing.dataProcessor import DataProcessor
 from batchResultsProcessing.environmentConfig import EnvironmentConfig
+from utils.sqs_batch import process_sqs_records
 from utils.sqs_parser import extract_bucket_from_sqs_message
-from utils.s3 import read_s3_file
+from utils.s3 import iter_s3_file_chunks
+from utils.stream_reader import iter_lines
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -12,10 +17,88 @@ log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
 
+@lru_cache(maxsize=1)
+def get_processor() -> DataProcessor:
+    """
+    Create the configuration and processor on the first invocation.
+
+    They are reused by later invocations of the same execution environment.
+    """
+    return DataProcessor(EnvironmentConfig())
+
+
+def process_record(record: Dict[str, Any]) -> None:
+    """
+    Process the Bedrock output file in an SQS message.
+
+    Args:
+        record (Dict[str, Any]): SQS record containing S3 event information
+    """
+    processor = get_processor()
+
+    bucket = extract_bucket_from_sqs_message(record["body"])
+
+    if not bucket:
+        logger.error("Failed to extract bucket information")
+        return
+
+    input_bucket_name = bucket.get("input_bucket_name")
+    input_key_name = bucket.get("input_key_name")
+    key_parts = input_key_name.split("/")
+
+    # A batch that failed for good reports itself when it was the last batch of its parent to end
+    if len(key_parts) > 2 and key_parts[-3] == FAILED_BATCHES_FOLDER:
+        logger.info(f"Batch {key_parts[-1].split('.')[0]} of parent {key_parts[-2]} failed")
+        processor.finalize_failed_parent(key_parts[-2], input_bucket_name)
+        return
+
+    bedrock_job_short_id = key_parts[-2]
+
+    # Find the record in the DynamoDB
+    response = query_job_status_items(
+        processor.config.get("job_status_table"),
+        BEDROCK_JOB_SHORT_ID_INDEX,
+        "bedrock_job_short_id",
+        bedrock_job_short_id,
+        scan_if_empty=True
+    )
+
+    if not response:
+        logger.error(f"No job found for {bedrock_job_short_id} in job status table.")
+        return
+
+    # Output files are named after the batch file, so the item is found even
+    # when several batches were written under the same folder
+    output_file_name = input_key_name.split("/")[-1].split(".")[0]
+    job = next((item for item in response if item["id"]["S"] == output_file_name), response[0])
+    file_name = job["id"]["S"]
+    parent_job_id = job["parent_id"]["S"]
+    logger.info(f"Found a job with id '{file_name}' for Bedorck job '{bedrock_job_short_id}'")
+
+    # Stream the output file line by line into all result files
+    aliases = processor.load_aliases(input_bucket_name, parent_job_id, file_name)
+    errors = processor.create_error_collector(
+        input_bucket_name,
+        parent_job_id,
+        file_name,
+        job.get("input_s3_uri", {}).get("S")
+    )
+    lines = iter_lines(iter_s3_file_chunks(input_bucket_name, input_key_name))
+    records = processor.process_results(lines, aliases, errors)
+    record_count = processor.save_results(input_bucket_name, parent_job_id, file_name, records, errors)
+    # The result files were discarded, so the message can be delivered again
+    if record_count is None:
+        raise RuntimeError(f"Failed to save the results of job {file_name}")
+    processor.update_job_status(parent_job_id, file_name, input_bucket_name, record_count)
+
+
 def lambda_handler(event, context):
     """
     AWS Lambda handler for processing batch classification results.
 
+    The output files of a batch are processed concurrently, and only the
+    messages of the files that failed are reported to be delivered again.
+
     Args:
         event: Lambda event object
         context: Lambda context object
@@ -23,48 +106,11 @@ def lambda_handler(event, context):
     try:
         logger.info("Start data batch results processing.")
 
-        # Initialize configuration
-        config = EnvironmentConfig()
-        processor = DataProcessor(config)
-
-        for record in event["Records"]:
-            bucket = extract_bucket_from_sqs_message(record["body"])
-
-            if not bucket:
-                logger.error("Failed to extract bucket information")
-                continue
-
-            input_bucket_name = bucket.get("input_bucket_name")
-            input_key_name = bucket.get("input_key_name")
-            bedrock_job_short_id = input_key_name.split("/")[-2]
-
-            # Find the record in the DynamoDB
-            response = get_job_status_items(
-                config.get("job_status_table"),
-                {"bedrock_job_short_id": bedrock_job_short_id},
-                page_size=25,
-                consistent_read=True
-            )
-
-            if response:
-                job = response[0]
-                file_name = job["id"]["S"]
-                parent_job_id = job["parent_id"]["S"]
-                logger.info(f"Found a job with id '{file_name}' for Bedorck job '{bedrock_job_short_id}'")
-
-                # Read input file
-                content = read_s3_file(input_bucket_name, input_key_name)
-                if not content:
-                    continue
-
-                # Process and save results
-                records = processor.process_results(content.splitlines())
-                if records:
-                    processor.save_results_externally(parent_job_id, file_name, records)
-                    processor.save_results_internally(input_bucket_name, parent_job_id, file_name, records)
-                    processor.update_job_status(parent_job_id, file_name)
-            else:
-                logger.error(f"No job found for {bedrock_job_short_id} in job status table.")
+        return process_sqs_records(
+            event["Records"],
+            process_record,
+            get_processor().config.get_int("record_concurrency", 4)
+        )
 
     except Exception as e:
         logger.error(f"Error in lambda handler: {e}")
@@ -1,21 +1,104 @@
 import json
 import os
 import logging
-import io, csv
-import re
-from typing import Dict, List, Optional, Tuple
-from typing import Dict, List, Optional
-from utils.dynamodb import get_job_status_items, update_or_create_job_status_record
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.compression import get_compression_extension, strip_compression_extension
+from utils.content_hash import compute_content_hash
+from utils.dynamodb import (
+    PARENT_ID_INDEX,
+    TERMINAL_JOB_STATUSES,
+    claim_parent_retry_round,
+    complete_parent_batch,
+    confirm_parent_retry_round,
+    get_job_status_record,
+    get_parent_counts,
+    mark_parent_finalized,
+    put_cached_results,
+    query_job_status_items,
+    release_parent_retry_round,
+    take_over_parent_retry_round,
+    update_or_create_job_status_record
+)
 from utils.id_generator import get_current_date_short_str
-from utils.s3 import save_file_to_s3
+from utils.s3 import (
+    S3StreamWriter,
+    delete_s3_objects,
+    iter_s3_file_chunks,
+    list_s3_keys,
+    list_s3_objects
+)
+from utils.sharding import get_alias_file_name, get_shard_index, get_shard_item_id
+from utils.stream_reader import iter_lines
 from batchResultsProcessing.environmentConfig import EnvironmentConfig
-from openpyxl import Workbook
+from batchResultsProcessing.recordErrors import (
+    INVALID_JSON,
+    INVALID_RECORD,
+    MISSING_OUTPUT,
+    RecordErrorCollector,
+    extract_record_id
+)
+from batchResultsProcessing.outputExtractor import (
+    EXTRACTION_MODE_TAGS,
+    UNSUCCESSFUL_CLASS,
+    OutputExtractor,
+    get_output_extractor,
+    parse_list
+)
+from batchResultsProcessing.resultCompactor import ResultCompactor
+from batchResultsProcessing.resultMerger import ResultMerger, get_batch_order
+from batchResultsProcessing.resultSinks import (
+    PartitionedParquetResultSink,
+    ResultSink,
+    create_result_sink,
+    write_to_sinks
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
+CACHE_WRITE_BATCH_SIZE = 500
+# Parents and shards whose alias sidecars are kept in memory
+ALIAS_CACHE_SIZE = 8
+
+
+@lru_cache(maxsize=ALIAS_CACHE_SIZE)
+def load_alias_sidecars(
+    bucket_name: str,
+    prefix: str,
+    alias_file_name: Optional[str] = None
+) -> Dict[str, List[str]]:
+    """
+    Read the alias sidecars under a prefix, once per execution environment.
+
+    The sidecars are complete before the batches of their parent are
+    classified, so the batches of a parent processed later reuse them.
+
+    Args:
+        bucket_name (str): Bucket holding the alias sidecars
+        prefix (str): Folder of the parent in the dedup folder
+        alias_file_name (Optional[str]): Sidecar of one shard, or None for all sidecars
+
+    Returns:
+        Dict[str, List[str]]: Duplicate record IDs per content hash
+    """
+    aliases: Dict[str, List[str]] = {}
+    for key in list_s3_keys(bucket_name, prefix):
+        if alias_file_name and strip_compression_extension(key.rsplit("/", 1)[-1]) != alias_file_name:
+            continue
+
+        # Read errors are raised, so that an incomplete read is not cached
+        for line in iter_lines(iter_s3_file_chunks(bucket_name, key)):
+            if not line.strip():
+                continue
+            alias = json.loads(line)
+            aliases.setdefault(alias["content_hash"], []).append(alias["recordId"])
+
+    return aliases
+
 
 class DataProcessor:
     """Processes classification results from the batch classifier."""
@@ -28,59 +111,232 @@ class DataProcessor:
             config: Environment configuration
         """
         self.config = config
+        self._output_categories = tuple(parse_list(config.get("output_categories", "")))
+        self._output_fields = tuple(parse_list(config.get("output_extra_fields", "")))
 
-    def process_results(self, content: List[str]) -> Optional[List[Dict]]:
+    def get_output_extractor(self, prompt: Optional[str]) -> OutputExtractor:
         """
-        Process batch classification results.
+        Get the extractor for the outputs of a prompt.
+
+        The categories are read from the numbered list of the prompt, unless
+        OUTPUT_CATEGORIES lists them.
+
+        Args:
+            prompt (Optional[str]): System prompt the outputs were generated with
+        """
+        return get_output_extractor(
+            prompt or "",
+            self.config.get("output_extraction_mode", EXTRACTION_MODE_TAGS).lower(),
+            self._output_categories,
+            self.config.get("output_class_tag", "class"),
+            self._output_fields
+        )
+
+    def load_aliases(
+        self,
+        bucket_name: str,
+        parent_job_id: str,
+        file_name: Optional[str] = None
+    ) -> Dict[str, List[str]]:
+        """
+        Load the records that were collapsed into another record during data preparation.
+
+        Duplicates are collapsed within each shard of a sharded input file, so
+        a batch of a shard only loads the sidecar of its shard. Batches of
+        re-submitted records load the sidecars of all shards.
 
         Args:
-            content: List of JSONL content strings
+            bucket_name (str): Bucket holding the alias sidecars
+            parent_job_id (str): Parent ID that groups batches together
+            file_name (Optional[str]): ID of the batch whose results are processed
 
+        Returns:
+            Dict[str, List[str]]: Duplicate record IDs per content hash
         """
+        aliases: Dict[str, List[str]] = {}
         try:
-            records = []
-            for line in content:
-                data = json.loads(line.strip())
-                record_id = data["recordId"]
-                input_text = data["modelInput"]["messages"][0]["content"][0]["text"]
-                output_result = data["modelOutput"]["content"][0]["text"]
-
-                class_content, rationale_content = self._extract_class_and_rationale(output_result)
-
-                records.append({
-                    "id": record_id,
-                    "input_text": input_text,
-                    "class": class_content,
-                    "rationale": rationale_content
-                })
-
-            logger.info(f"Processed {len(records)} classification records")
-            return records
+            dedup_folder_name = self.config.get("dedup_folder_name")
+            shard_index = get_shard_index(file_name) if file_name else None
+            alias_file_name = None if shard_index is None else get_alias_file_name(shard_index)
+
+            aliases = load_alias_sidecars(bucket_name, f"{dedup_folder_name}/{parent_job_id}/", alias_file_name)
+            if aliases:
+                logger.info(f"Loaded {sum(len(ids) for ids in aliases.values())} duplicate records for parent {parent_job_id}")
         except Exception as e:
-            logger.error(f"Error processing results: {e}")
-            return None
+            logger.error(f"Error loading duplicate records: {e}")
+
+        return aliases
+
+    def process_results(
+        self,
+        lines: Iterable[str],
+        aliases: Optional[Dict[str, List[str]]] = None,
+        errors: Optional[RecordErrorCollector] = None
+    ) -> Iterator[Dict]:
+        """
+        Process batch classification results, one line at a time.
+
+        The class and rationale are extracted by the output extractor of the
+        prompt the records were classified with, and the number of records per
+        extraction outcome is logged. Results of texts that occurred several
+        times in the input are copied to their duplicates, and successful
+        results are stored in the result cache.
+        Lines without a usable model output are skipped and reported to the
+        error collector, so one bad record does not discard the batch.
+
+        Args:
+            lines: Lines of the Bedrock output file
+            aliases: Duplicate record IDs per content hash
+            errors: Collects the records that failed
+
+        """
+        cache_entries: Dict[str, str] = {}
+        # A text sent by several shards is re-submitted once per shard, its
+        # duplicates are copied only once
+        aliased_hashes = set()
+        model_id = self.config.get("bedrock_model_id")
+        cache_table = self.config.get("result_cache_table")
+        hashing_enabled = bool(aliases) or bool(cache_table)
+        outcomes: Dict[str, int] = {}
+
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+
+            result = self._parse_result_line(line, errors)
+            if result is None:
+                continue
+
+            record_id, model_input, input_text, output_result = result
+
+            fields, outcome = self.get_output_extractor(model_input.get("system")).extract(output_result)
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+            class_content = fields["class"]
+
+            record = {
+                "id": record_id,
+                "input_text": input_text,
+                **fields
+            }
+            yield record
+
+            if not hashing_enabled:
+                continue
+
+            content_hash = compute_content_hash(input_text, model_input.get("system"), model_id)
+            if aliases and content_hash not in aliased_hashes:
+                aliased_hashes.add(content_hash)
+                for alias_id in aliases.get(content_hash, []):
+                    yield {**record, "id": alias_id}
+
+            if cache_table and class_content != UNSUCCESSFUL_CLASS:
+                cache_entries[content_hash] = output_result
+                if len(cache_entries) >= CACHE_WRITE_BATCH_SIZE:
+                    self._save_cached_results(cache_entries)
+                    cache_entries = {}
+
+        if cache_entries:
+            self._save_cached_results(cache_entries)
+
+        if outcomes:
+            logger.info(f"Output extraction outcomes: {json.dumps(outcomes)}")
+
+    @staticmethod
+    def _parse_result_line(
+        line: str,
+        errors: Optional[RecordErrorCollector]
+    ) -> Optional[Tuple[str, Dict, str, str]]:
+        """
+        Parse a line of a Bedrock output file.
+
+        Args:
+            line: Line of the Bedrock output file
+            errors: Collects the records that failed
+
+        Returns:
+            Optional[Tuple[str, Dict, str, str]]: Record ID, model input, input text and
+                raw model output text, or None if the record failed
+        """
+        record_id, model_input = None, None
+        try:
+            data = json.loads(line)
+            record_id = data.get("recordId")
+            model_input = data.get("modelInput")
+
+            if "error" in data:
+                error = data["error"] if isinstance(data["error"], dict) else {"errorMessage": str(data["error"])}
+                error_code = str(error.get("errorCode", "ModelError"))
+                error_message = str(error.get("errorMessage", ""))
+            elif "modelOutput" not in data:
+                error_code, error_message = MISSING_OUTPUT, "The record has no model output"
+            else:
+                return (
+                    data["recordId"],
+                    model_input,
+                    model_input["messages"][0]["content"][0]["text"],
+                    data["modelOutput"]["content"][0]["text"]
+                )
+
+        except ValueError as e:
+            record_id = extract_record_id(line)
+            error_code, error_message = INVALID_JSON, str(e)
+        except (KeyError, IndexError, TypeError) as e:
+            error_code, error_message = INVALID_RECORD, f"Unexpected record format: {e!r}"
+
+        if errors is None:
+            logger.warning(f"Skipping record {record_id}: {error_code} {error_message}")
+        else:
+            errors.add(record_id, error_code, error_message, model_input if isinstance(model_input, dict) else None)
+        return None
+
+    def _save_cached_results(self, cache_entries: Dict[str, str]) -> None:
+        """
+        Store raw model outputs in the result cache.
+
+        Args:
+            cache_entries: Raw model output text per content hash
+        """
+        put_cached_results(
+            self.config.get("result_cache_table"),
+            cache_entries,
+            int(self.config.get("result_cache_ttl_days"))
+        )
 
-    def check_if_all_jobs_completed(self, parent_id) -> bool:
+    def check_if_all_jobs_completed(self, parent_id, completed_item_id: Optional[str] = None) -> bool:
         """
         Check if all jobs are completed.
 
+        The counts of the parent aggregate record are read with a single GetItem.
+        Parents created before the aggregate record existed are checked batch by batch.
+
         Args:
             parent_id (str): The parent ID to check
+            completed_item_id (Optional[str]): Item just marked as completed, whose
+                update may not be visible on the index yet
         """
         try:
             job_status_table = self.config.get("job_status_table")
 
-            response = get_job_status_items(
+            counts = get_parent_counts(job_status_table, parent_id)
+            if counts is not None:
+                logger.info(
+                    f"Parent {parent_id} has {counts['completed_count']} of {counts['total_count']} batches "
+                    f"completed and {counts['failed_count']} failed"
+                )
+                return counts["completed_count"] + counts["failed_count"] >= counts["total_count"]
+
+            response = query_job_status_items(
                 job_status_table,
-                {"parent_id": parent_id},
-                page_size=25,
-                consistent_read=True
+                PARENT_ID_INDEX,
+                "parent_id",
+                parent_id
             )
             if response:
                 for item in response:
                     job_status = item["job_status"]["S"]
                     job_id = item["id"]["S"]
-                    if job_status != "COMPLETED":
+                    if job_status not in TERMINAL_JOB_STATUSES and job_id != completed_item_id:
                         logger.info(f"Job {job_id} is still running and has Bedrock status: {job_status}")
                         return False
                     else:
@@ -92,198 +348,446 @@ class DataProcessor:
             logger.error(f"Error checking if all jobs are completed: {e}")
             return False
 
-    def save_results_externally(self, parent_job_id: str, base_filename: str, records: List[Dict]) -> None:
+    def save_results(
+        self,
+        internal_bucket_name: str,
+        parent_job_id: str,
+        item_id: str,
+        records: Iterable[Dict],
+        errors: Optional[RecordErrorCollector] = None
+    ) -> Optional[int]:
         """
-        Save processed results to external S3.
+        Save processed results to external and internal S3 in a single pass.
+
+        Every record is rendered once per output file and streamed to S3, so
+        memory use does not depend on the number of records.
 
         Args:
+            internal_bucket_name (str): the bucket name that will be used for saving the processed records
             parent_job_id (str): parent id that groups batches together
-            base_filename (sr): item_id or the name of the output file
-            records (List[Dict]): List of processed records
+            item_id (str): item_id or the name of the output file
+            records (Iterable[Dict]): Processed records
+            errors (Optional[RecordErrorCollector]): Collector the records were processed with
 
+        Returns:
+            Optional[int]: Number of saved records, or None if saving failed
         """
         try:
-            current_date = get_current_date_short_str()
-            output_bucket_name = self.config.get("output_bucket_name")
-            output_format = self.config.get("output_format")
-            output_folder_name = self.config.get("output_folder_name")
-            
-            # Generate output paths
-            output_key = f"{output_folder_name}/{current_date}/{parent_job_id}/{base_filename}{output_format}"
-
-            # Convert and save results
-            file_content = self._convert_to_json(records)
-            if not file_content:
-                return False
+            sinks = self._create_sinks(internal_bucket_name, parent_job_id, item_id)
+            try:
+                record_count = write_to_sinks(records, sinks)
+                if errors is not None:
+                    errors.close()
+            except Exception:
+                if errors is not None:
+                    errors.abort()
+                raise
+
+            logger.info(f"Processed {record_count} classification records")
+            return record_count
+        except Exception as e:
+            logger.error(f"Error saving results: {e}")
+            return None
 
-            if output_format == ".csv":
-                csv_content = self._convert_to_csv(records)
-                if not csv_content:
-                    return False
-                save_file_to_s3(csv_content, output_bucket_name, output_key)
-            elif output_format == ".json":
-                save_file_to_s3(file_content, output_bucket_name, output_key)
-            elif output_format == ".xlsx":
-                excel_content = self._convert_to_excel(records)
-                if excel_content is None:
-                    logger.error("Failed to convert records to Excel format")
-                    return False
-                
-                save_file_to_s3(excel_content, output_bucket_name, output_key)
+    def create_error_collector(
+        self,
+        internal_bucket_name: str,
+        parent_job_id: str,
+        item_id: str,
+        input_s3_uri: Optional[str] = None
+    ) -> RecordErrorCollector:
+        """
+        Create the collector of the records of a batch that fail.
 
-        except Exception as e:
-            logger.error(f"Error saving external results: {e}")
-    
-    def save_results_internally(self, internal_bucket_name: str, parent_job_id: str, item_id: str, records: List[Dict]) -> None:
+        Args:
+            internal_bucket_name (str): Bucket for the error sidecar and the retry file
+            parent_job_id (str): Parent ID that groups batches together
+            item_id (str): ID of the batch
+            input_s3_uri (Optional[str]): S3 URI of the batch input file, if known
+        """
+        extension = get_compression_extension(self.config.get("internal_compression"))
+        return RecordErrorCollector(
+            internal_bucket_name,
+            f"{self.config.get('errors_folder_name')}/{parent_job_id}/{item_id}.jsonl{extension}",
+            f"{self.config.get('retry_folder_name')}/{parent_job_id}/{item_id}.jsonl{extension}",
+            input_s3_uri
+        )
+
+    def _create_sinks(self, internal_bucket_name: str, parent_job_id: str, item_id: str) -> List[ResultSink]:
         """
-        Save processed results to internal S3.
+        Create the result files of a batch.
 
         Args:
             internal_bucket_name (str): the bucket name that will be used for saving the processed records
             parent_job_id (str): parent id that groups batches together
-            base_filename (sr): item_id or the name of the output file
-            records (List[Dict]): List of processed records
-
+            item_id (str): item_id or the name of the output file
         """
-        try:
-            current_date = get_current_date_short_str()
-            internal_processed_folder = self.config.get("internal_processed_folder")
-            
-            # Generate output paths
-            internal_key = f"{internal_processed_folder}/{current_date}/{parent_job_id}/{item_id}.json"
-
-            # Convert and save results
-            file_content = self._convert_to_json(records)
-            if not file_content:
-                return False
-
-            # Save internal copy
-            save_file_to_s3(file_content, internal_bucket_name, internal_key)
-
-        except Exception as e:
-            logger.error(f"Error saving results internally: {e}")
-
-    def update_job_status(self, parent_job_id: str, item_id: str) -> None:
+        current_date = get_current_date_short_str()
+        output_format = self.config.get("output_format")
+
+        # Generate output paths
+        output_key = f"{self.config.get('output_folder_name')}/{current_date}/{parent_job_id}/{item_id}{output_format}"
+
+        return [
+            create_result_sink(output_format, self.config.get("output_bucket_name"), output_key),
+            PartitionedParquetResultSink(
+                internal_bucket_name,
+                self.config.get("internal_processed_folder"),
+                current_date,
+                item_id
+            )
+        ]
+
+    def update_job_status(
+        self,
+        parent_job_id: str,
+        item_id: str,
+        internal_bucket_name: Optional[str] = None,
+        record_count: Optional[int] = None
+    ) -> None:
         """
         Update job status in DynamoDB.
 
         Args:
             parent_job_id(str): Parent ID that groups batches together
             item_id (str): The DynamoDB item ID to update
+            internal_bucket_name (Optional[str]): Bucket holding the records to resubmit
+            record_count (Optional[int]): Number of records in the output file of the batch
         """
         try:
             job_status_table = self.config.get("job_status_table")
 
+            updates = {"job_status": "COMPLETED"}
+            if record_count is not None:
+                updates["record_count"] = record_count
             update_or_create_job_status_record(
                 job_status_table,
                 item_id,
-                {"job_status": "COMPLETED"}
+                updates,
+                forward_only=True
             )
 
-            if self.check_if_all_jobs_completed(parent_job_id):
-                logger.info(f"All jobs for parent {parent_job_id} are completed")
+            counts = complete_parent_batch(job_status_table, parent_job_id, item_id)
+            if counts is not None:
+                logger.info(
+                    f"Batch {item_id} completed, {counts['completed_count']} of "
+                    f"{counts['total_count']} batches of parent {parent_job_id} are done"
+                )
+                if counts["completed_count"] + counts["failed_count"] == counts["total_count"]:
+                    self.finalize_parent(parent_job_id, internal_bucket_name)
+
+                return
+
+            # The batch was counted before, e.g. by an invocation that failed before
+            # finalizing, its shard is pending, or the parent predates the aggregate record
+            counts = get_parent_counts(job_status_table, parent_job_id)
+            shard_index = get_shard_index(item_id)
+            if counts is None:
+                if self.check_if_all_jobs_completed(parent_job_id, item_id):
+                    self.finalize_parent(parent_job_id, internal_bucket_name)
+            elif shard_index is not None and get_shard_item_id(parent_job_id, shard_index) in counts["pending_shards"]:
+                # A batch of a failed attempt at preparing the shard is counted once the retry registered it
+                raise RuntimeError(f"Shard {shard_index} of parent {parent_job_id} is still being prepared")
+            elif counts["completed_count"] + counts["failed_count"] >= counts["total_count"] and not counts["finalized"]:
+                logger.info(f"Parent {parent_job_id} is completed but not finalized yet")
+                self.finalize_parent(parent_job_id, internal_bucket_name)
+            elif counts["retry_claimed"] and internal_bucket_name:
+                self.recover_retry_round(internal_bucket_name, parent_job_id)
 
         except Exception as e:
             logger.error(f"Error updating job status: {e}")
+            raise
 
-    @staticmethod
-    def _extract_class_and_rationale(text: str) -> Tuple[str, str]:
+    def finalize_failed_parent(self, parent_job_id: str, internal_bucket_name: Optional[str] = None) -> None:
         """
-        Extract classification and rationale from model output.
+        Finalize a parent whose last batch to end failed.
 
-        Args:
-            text: Raw model output text
+        Called for the report of the failed batch, as the batch wrote no
+        output file whose processing would finalize the parent.
 
+        Args:
+            parent_job_id (str): Parent ID that groups batches together
+            internal_bucket_name (Optional[str]): Bucket holding the records to resubmit
         """
-        pattern = r"<class>(.*?)</class>\s*(.*)"
-        match = re.search(pattern, text, re.DOTALL)
-        
-        if match:
-            class_content = match.group(1).strip()
-            rationale_content = match.group(2).strip()
-        else:
-            class_content = "Classification was not successful."
-            rationale_content = "No rationale found."
+        counts = get_parent_counts(self.config.get("job_status_table"), parent_job_id)
+        if counts is None:
+            raise RuntimeError(f"Could not read the batch counts of parent {parent_job_id}")
 
-        return class_content, rationale_content
+        if counts["finalized"]:
+            logger.info(f"Parent {parent_job_id} is already finalized")
+        elif counts["completed_count"] + counts["failed_count"] >= counts["total_count"]:
+            self.finalize_parent(parent_job_id, internal_bucket_name)
 
-    @staticmethod
-    def _convert_to_csv(records: List[Dict]) -> Optional[str]:
+    def finalize_parent(self, parent_job_id: str, internal_bucket_name: Optional[str] = None) -> None:
         """
-        Convert records to CSV format.
+        Run the steps that need all batches of a parent to be completed.
+
+        Called by the invocation that completes the last batch. It can run again
+        when that invocation is retried, so every step must be idempotent.
+        When failed records are resubmitted, the parent stays open until their
+        batch is completed too. Otherwise the processed records of the parent
+        are compacted, and its output files merged if enabled, before the
+        parent is marked as finalized. A failed merge is raised before that, so
+        the parent is finalized by the retry of the message. Batches that failed
+        for good count as ended, and are logged and listed in the manifest.
 
         Args:
-            records: List of processed records
+            parent_job_id (str): Parent ID that groups batches together
+            internal_bucket_name (Optional[str]): Bucket holding the records to resubmit
+        """
+        logger.info(f"All jobs for parent {parent_job_id} are completed")
+
+        counts = get_parent_counts(self.config.get("job_status_table"), parent_job_id)
+        if counts and counts["failed_batches"]:
+            logger.error(
+                f"Parent {parent_job_id} ended with {counts['failed_count']} failed batches: "
+                f"{', '.join(sorted(counts['failed_batches']))}"
+            )
+
+        if internal_bucket_name and self.resubmit_failed_records(internal_bucket_name, parent_job_id):
+            return
+
+        if internal_bucket_name:
+            self.compact_processed_results(internal_bucket_name, parent_job_id)
+
+        if self.config.get("merge_output_files", "false").lower() == "true":
+            self.merge_output_files(parent_job_id)
+
+        mark_parent_finalized(self.config.get("job_status_table"), parent_job_id)
 
+    def compact_processed_results(self, internal_bucket_name: str, parent_job_id: str) -> None:
         """
+        Merge the per-batch files of a parent in the processed folder into a few large files.
+
+        A failed compaction leaves the batch files in place, so it does not stop
+        the parent from being finalized.
+
+        Args:
+            internal_bucket_name (str): Bucket holding the processed records
+            parent_job_id (str): Parent ID that groups batches together
+        """
+        target_size_mb = self.config.get_int("compaction_target_size_mb", 64)
+        if not target_size_mb or target_size_mb <= 0:
+            return
+
         try:
-            csv_buffer = io.StringIO()
-            fieldnames = records[0].keys() if records else []
-            writer = csv.DictWriter(csv_buffer, fieldnames=fieldnames)
-            writer.writeheader()
-            for record in records:
-                writer.writerow(record)
-            return csv_buffer.getvalue()
+            compactor = ResultCompactor(
+                internal_bucket_name,
+                self.config.get("internal_processed_folder"),
+                target_size_mb * 1024 * 1024
+            )
+            compactor.compact_parent(parent_job_id, self._get_parent_dates(parent_job_id))
         except Exception as e:
-            logger.error(f"Error converting to CSV: {e}")
-            return None
+            logger.error(f"Error compacting the processed records of parent {parent_job_id}: {e}")
 
-    @staticmethod
-    def _convert_to_excel(records: List[Dict]) -> Optional[io.BytesIO]:
+    def merge_output_files(self, parent_job_id: str) -> None:
         """
-        Convert records to Excel format.
-        
+        Merge the output files of all batches of a parent into one file with a manifest.
+
+        The merged file and the manifest are written next to the folder of the
+        parent, e.g. <output folder>/<date>/<parent>.csv and
+        <output folder>/<date>/<parent>.manifest.json. The batch files are kept.
+        Errors are raised, so that the parent is not marked as finalized and the
+        message is retried.
+
         Args:
-            records: List of dictionaries containing the data
-        Returns:
-            BytesIO: Excel file content as a BytesIO object, or None if conversion fails
+            parent_job_id (str): Parent ID that groups batches together
         """
         try:
-            # Create a new workbook
-            wb = Workbook()
-            ws = wb.active
-            
-            # Write headers if records exist
-            if records:
-                headers = list(records[0].keys())
-                for col, header in enumerate(headers, start=1):
-                    ws.cell(row=1, column=col, value=str(header))
-            
-                # Write data rows
-                for row_idx, record in enumerate(records, start=2):
-                    for col_idx, (key, value) in enumerate(record.items(), start=1):
-                        # Handle None values and convert all values to string
-                        cell_value = str(value) if value is not None else ""
-                        ws.cell(row=row_idx, column=col_idx, value=cell_value)
-
-            # Save to bytes buffer
-            excel_buffer = io.BytesIO()
-            wb.save(excel_buffer)
-            
-            # Reset buffer position
-            excel_buffer.seek(0)
-            return excel_buffer
-            
+            output_bucket_name = self.config.get("output_bucket_name")
+            output_folder_name = self.config.get("output_folder_name")
+            output_format = self.config.get("output_format")
+
+            items = query_job_status_items(
+                self.config.get("job_status_table"),
+                PARENT_ID_INDEX,
+                "parent_id",
+                parent_job_id
+            )
+            if items is None:
+                raise RuntimeError(f"Could not read the batches of parent {parent_job_id}")
+            record_counts = {
+                item["id"]["S"]: int(item["record_count"]["N"])
+                for item in items
+                if "record_count" in item
+            }
+            failed_batches = [
+                {"batch": item["id"]["S"], "error_message": item.get("error_message", {}).get("S")}
+                for item in items
+                if item.get("job_status", {}).get("S") == "FAILED"
+            ]
+
+            # A batch processed again on a later day keeps its latest file
+            parts: Dict[str, Dict] = {}
+            for date in self._get_parent_dates(parent_job_id):
+                for obj in list_s3_objects(output_bucket_name, f"{output_folder_name}/{date}/{parent_job_id}/"):
+                    file_name = obj["Key"].rsplit("/", 1)[-1]
+                    if not file_name.endswith(output_format):
+                        continue
+                    item_id = file_name[:-len(output_format)]
+                    parts[item_id] = {
+                        "batch": item_id,
+                        "key": obj["Key"],
+                        "size_bytes": obj["Size"],
+                        "etag": obj.get("ETag", "").strip('"'),
+                        "record_count": record_counts.get(item_id)
+                    }
+
+            if not parts:
+                logger.info(f"Parent {parent_job_id} has no output files to merge")
+                return
+
+            folder = f"{output_folder_name}/{get_current_date_short_str()}"
+            ResultMerger(output_bucket_name, output_format).merge(
+                parent_job_id,
+                sorted(parts.values(), key=lambda part: get_batch_order(part["batch"])),
+                f"{folder}/{parent_job_id}{output_format}",
+                f"{folder}/{parent_job_id}.manifest.json",
+                sorted(failed_batches, key=lambda batch: get_batch_order(batch["batch"]))
+            )
         except Exception as e:
-            logger.error(f"Error converting to Excel: {str(e)}")
-            return None
+            logger.error(f"Error merging the output files of parent {parent_job_id}: {e}")
+            raise
+
+    def _get_parent_dates(self, parent_job_id: str) -> List[str]:
+        """
+        List the dates the batches of a parent may have been processed on.
 
+        Args:
+            parent_job_id (str): Parent ID that groups batches together
 
-    @staticmethod
-    def _convert_to_json(records: List[Dict]) -> Optional[str]:
+        Returns:
+            List[str]: Dates from the creation of the parent until today, YYYY-MM-DD
         """
-        Convert records to JSONL format.
+        today = get_current_date_short_str()
+        response = get_job_status_record(self.config.get("job_status_table"), parent_job_id)
+        created_date = ((response or {}).get("Item", {}).get("created_date", {}).get("S") or today)[:10]
+
+        date = datetime.strptime(min(created_date, today), "%Y-%m-%d")
+        dates = []
+        while date.strftime("%Y-%m-%d") <= today:
+            dates.append(date.strftime("%Y-%m-%d"))
+            date += timedelta(days=1)
+        return dates
+
+    def resubmit_failed_records(self, internal_bucket_name: str, parent_job_id: str) -> bool:
+        """
+        Combine the retry files of a parent into a new batch for Bedrock.
+
+        The batch is written to the input folder, so it is classified like any
+        other batch. Bedrock needs a minimum number of records per job, so fewer
+        failed records are not resubmitted and stay listed in the retry folder.
 
         Args:
-            records: List of processed records
+            internal_bucket_name (str): Bucket holding the retry files
+            parent_job_id (str): Parent ID that groups batches together
 
+        Returns:
+            bool: True if a batch was created
         """
+        job_status_table = self.config.get("job_status_table")
+        retry_keys = list(list_s3_keys(internal_bucket_name, f"{self.config.get('retry_folder_name')}/{parent_job_id}/"))
+        if not retry_keys:
+            return False
+
+        record_count = sum(
+            1
+            for key in retry_keys
+            for line in iter_lines(iter_s3_file_chunks(internal_bucket_name, key))
+            if line.strip()
+        )
+        minimum_records = self.config.get_int("minimum_records_per_batch", 100)
+        if record_count < minimum_records:
+            logger.warning(
+                f"{record_count} failed records of parent {parent_job_id} are not resubmitted, "
+                f"Bedrock needs at least {minimum_records} records per batch"
+            )
+            return False
+
+        retry_round = claim_parent_retry_round(
+            job_status_table,
+            parent_job_id,
+            self.config.get_int("max_retry_rounds", 1)
+        )
+        if retry_round is None:
+            return False
+
         try:
-            if not records:
-                logger.info("No records to convert")
-                return None
+            item_id = self._write_retry_batch(internal_bucket_name, parent_job_id, retry_round, retry_keys)
+        except Exception:
+            release_parent_retry_round(job_status_table, parent_job_id)
+            raise
 
-            return "\n".join(json.dumps(record, ensure_ascii=False) for record in records)
-        except Exception as e:
-            logger.error(f"Error converting to JSON: {e}")
-            return None
\ No newline at end of file
+        confirm_parent_retry_round(job_status_table, parent_job_id)
+        logger.info(f"Resubmitted {record_count} failed records of parent {parent_job_id} as batch {item_id}")
+        return True
+
+    def recover_retry_round(self, internal_bucket_name: str, parent_job_id: str) -> None:
+        """
+        Create the batch of a re-submission round that was claimed but never confirmed.
+
+        This happens when the invocation that claimed the round timed out or
+        crashed. The claim is only taken over once it is older than the
+        function timeout; until then an error is raised, so the message is
+        delivered again later. The retry files are deleted only after the
+        batch is written, so if none are left, the batch exists already.
+
+        Args:
+            internal_bucket_name (str): Bucket holding the retry files
+            parent_job_id (str): Parent ID that groups batches together
+        """
+        job_status_table = self.config.get("job_status_table")
+        retry_round = take_over_parent_retry_round(
+            job_status_table,
+            parent_job_id,
+            self.config.get_int("retry_claim_timeout_seconds", 900)
+        )
+        if retry_round is None:
+            raise RuntimeError(f"Re-submission round of parent {parent_job_id} is claimed by another invocation")
+
+        retry_keys = list(list_s3_keys(internal_bucket_name, f"{self.config.get('retry_folder_name')}/{parent_job_id}/"))
+        if retry_keys:
+            item_id = self._write_retry_batch(internal_bucket_name, parent_job_id, retry_round, retry_keys)
+            logger.warning(f"Took over re-submission round {retry_round} of parent {parent_job_id} as batch {item_id}")
+
+        confirm_parent_retry_round(job_status_table, parent_job_id)
+
+    def _write_retry_batch(
+        self,
+        internal_bucket_name: str,
+        parent_job_id: str,
+        retry_round: int,
+        retry_keys: List[str]
+    ) -> str:
+        """
+        Write the retry files of a parent as the batch of a re-submission round.
+
+        Args:
+            internal_bucket_name (str): Bucket holding the retry files
+            parent_job_id (str): Parent ID that groups batches together
+            retry_round (int): Number of the claimed round
+            retry_keys (List[str]): Keys of the retry files
+
+        Returns:
+            str: ID of the batch
+        """
+        item_id = f"{parent_job_id}-batch-retry{retry_round}"
+        batch_key = (
+            f"{self.config.get('input_folder_name')}/{get_current_date_short_str()}/"
+            f"{parent_job_id}/{item_id}.jsonl"
+        )
+        # A batch written before by an invocation that was taken over keeps its status
+        update_or_create_job_status_record(
+            self.config.get("job_status_table"),
+            item_id,
+            {"job_status": "DRAFT"},
+            forward_only=True
+        )
+
+        with S3StreamWriter(internal_bucket_name, batch_key) as writer:
+            for key in retry_keys:
+                for chunk in iter_s3_file_chunks(internal_bucket_name, key):
+                    writer.write(chunk.encode("utf-8"))
+
+        delete_s3_objects(internal_bucket_name, retry_keys)
+        return item_id
@@ -1,6 +1,6 @@
 import os
 import logging
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -32,6 +32,30 @@ class EnvironmentConfig:
                     raise ValueError(f"Missing required environment variable: {var}")
                 self.config[var.lower()] = value.strip()
 
+            optional_vars = {
+                "BEDROCK_MODEL_ID": "",
+                "DEDUP_FOLDER_NAME": "dedup_data",
+                "RESULT_CACHE_TABLE": "",
+                "RESULT_CACHE_TTL_DAYS": "30",
+                "INPUT_FOLDER_NAME": "input_data",
+                "ERRORS_FOLDER_NAME": "errors_data",
+                "RETRY_FOLDER_NAME": "retry_data",
+                "MINIMUM_RECORDS_PER_BATCH": "100",
+                "MAX_RETRY_ROUNDS": "1",
+                "RETRY_CLAIM_TIMEOUT_SECONDS": "900",
+                "COMPACTION_TARGET_SIZE_MB": "64",
+                "MERGE_OUTPUT_FILES": "false",
+                "RECORD_CONCURRENCY": "4",
+                "INTERNAL_COMPRESSION": "gzip",
+                "OUTPUT_EXTRACTION_MODE": "tags",
+                "OUTPUT_CLASS_TAG": "class",
+                "OUTPUT_CATEGORIES": "",
+                "OUTPUT_EXTRA_FIELDS": ""
+            }
+
+            for var, default in optional_vars.items():
+                self.config[var.lower()] = os.environ.get(var, default).strip()
+
             self._validate_bucket_arn()
             logger.info("Environment configuration loaded successfully")
 
@@ -63,3 +87,18 @@ class EnvironmentConfig:
         except Exception as e:
             logger.warning(f"Error retrieving config value for {key}: {str(e)}")
             return default
+
+    def get_int(self, key: str, default: Optional[int] = None) -> Optional[int]:
+        """
+        Get integer configuration value.
+
+        Args:
+            key (str): Configuration key
+            default (Optional[int]): Default value if key not found
+        """
+        try:
+            value = self.get(key, default)
+            return int(str(value)) if value is not None else default
+        except (ValueError, TypeError):
+            logger.warning(f"Invalid integer value for {key}")
+            return default
@@ -0,0 +1,381 @@
+import difflib
+import json
+import os
+import logging
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+UNSUCCESSFUL_CLASS = "Classification was not successful."
+NO_RATIONALE = "No rationale found."
+
+EXTRACTION_MODE_TAGS = "tags"
+EXTRACTION_MODE_JSON = "json"
+# Fields that can be extracted besides the class and the rationale
+FIELD_LABELS = "labels"
+FIELD_CONFIDENCE = "confidence"
+LABEL_SEPARATOR = "; "
+
+# Outcomes of an extraction, counted per output file
+OUTCOME_MATCHED = "matched"
+OUTCOME_NORMALIZED = "normalized"
+OUTCOME_UNKNOWN = "unknown_label"
+OUTCOME_INFERRED = "inferred"
+OUTCOME_UNSUCCESSFUL = "unsuccessful"
+
+# Numbered list items of a prompt, e.g. "3. Cancellation Request"
+PROMPT_CATEGORY_PATTERN = re.compile(r"^\s*\d+[.)]\s+(.+?)\s*$", re.MULTILINE)
+# Markdown, quotes, numbering and "Category:" prefixes around a label
+LABEL_NOISE_PATTERN = re.compile(
+    r"^[\s\"'`*_\[(#-]*(?:(?:category|class|label)\s*[:=-]\s*)?(?:\d+\s*[.)]\s*)?|[\s\"'`*_\]).,:;!-]+$",
+    re.IGNORECASE
+)
+CONFIDENCE_PATTERN = re.compile(r"<confidence>\s*([0-9]*\.?[0-9]+)\s*(%?)\s*</confidence>", re.IGNORECASE)
+RATIONALE_PATTERN = re.compile(r"<rationale>\s*(.*?)\s*</rationale>", re.IGNORECASE | re.DOTALL)
+LABEL_SPLIT_PATTERN = re.compile(r"\s*[,;|]\s*")
+# Similarity a label needs to be mapped to a category
+LABEL_MATCH_CUTOFF = 0.8
+LABEL_CACHE_SIZE = 10000
+
+JSON_CLASS_KEYS = ["class", "category", "label", "classification", "labels", "classes", "categories"]
+JSON_RATIONALE_KEYS = ["rationale", "reason", "reasoning", "explanation"]
+JSON_CONFIDENCE_KEYS = ["confidence", "score", "probability"]
+
+
+def parse_categories(prompt: str) -> List[str]:
+    """
+    Read the categories a prompt lists as a numbered list.
+
+    Args:
+        prompt (str): System prompt of the classification
+    """
+    return PROMPT_CATEGORY_PATTERN.findall(prompt or "")
+
+
+def parse_list(value: str) -> List[str]:
+    """
+    Parse a list setting, given as a JSON array or as comma separated values.
+
+    Args:
+        value (str): Value of the setting
+    """
+    value = (value or "").strip()
+    if value.startswith("["):
+        return [str(item).strip() for item in json.loads(value) if str(item).strip()]
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def normalize_label(label: str) -> str:
+    """
+    Reduce a label to a comparable key, e.g. "**3. booking  inquiry.**" becomes "booking inquiry".
+
+    Args:
+        label (str): Label written by the model
+    """
+    return " ".join(LABEL_NOISE_PATTERN.sub("", label).lower().split())
+
+
+class OutputExtractor:
+    """
+    Extracts the class and rationale from the raw output text of the model.
+
+    The expected format is configured per prompt: the class in a tag, e.g.
+    <class>Complaint</class> followed by the rationale, or a JSON object with
+    class and rationale keys. The other format is tried as a fallback, and an
+    output without either is classified if it names exactly one category.
+    Optionally all labels of multi-label outputs and a confidence are
+    extracted as well.
+
+    Labels are validated against the categories of the prompt. Near misses,
+    such as a different case, markdown or numbering, plural forms and small
+    typos, are mapped to the category. Labels that match no category are kept
+    as the model wrote them. The patterns are compiled once per extractor and
+    resolved labels are cached, as outputs repeat the same few labels.
+    """
+
+    def __init__(
+        self,
+        mode: str = EXTRACTION_MODE_TAGS,
+        categories: Sequence[str] = (),
+        class_tag: str = "class",
+        fields: Sequence[str] = ()
+    ):
+        """
+        Initialize OutputExtractor.
+
+        Args:
+            mode (str): "tags" or "json", the format the prompt asks for
+            categories (Sequence[str]): Valid class labels, labels are not validated if empty
+            class_tag (str): Name of the tag holding the class
+            fields (Sequence[str]): Extra fields to extract, "labels" and/or "confidence"
+        """
+        if mode not in [EXTRACTION_MODE_TAGS, EXTRACTION_MODE_JSON]:
+            raise ValueError(f"Unsupported extraction mode: {mode}")
+        unknown_fields = set(fields) - {FIELD_LABELS, FIELD_CONFIDENCE}
+        if unknown_fields:
+            raise ValueError(f"Unsupported extraction fields: {sorted(unknown_fields)}")
+
+        self.mode = mode
+        self.categories = list(categories)
+        self.fields = list(fields)
+        self._open_tag = f"<{class_tag}>"
+        self._close_tag = f"</{class_tag}>"
+
+        tag = re.escape(class_tag)
+        self._tag_pattern = re.compile(rf"<{tag}>\s*(.*?)\s*</{tag}>", re.IGNORECASE | re.DOTALL)
+        self._open_tag_pattern = re.compile(rf"<{tag}>[ \t]*([^\n<]+)", re.IGNORECASE)
+
+        self._category_keys = {normalize_label(category): category for category in self.categories}
+        self._category_pattern = None
+        if self.categories:
+            names = sorted(self.categories, key=len, reverse=True)
+            # Case sensitive, so that e.g. "other" in a sentence is not taken for the category Other
+            self._category_pattern = re.compile(r"\b(?:" + "|".join(re.escape(name) for name in names) + r")\b")
+        self._labels: Dict[str, Tuple[str, str]] = {}
+        self._fast_path = mode == EXTRACTION_MODE_TAGS and not self.fields
+
+    def extract(self, text: Any) -> Tuple[Dict[str, Any], str]:
+        """
+        Extract the fields of a record from a model output.
+
+        Args:
+            text (Any): Raw output text of the model
+
+        Returns:
+            Tuple[Dict[str, Any], str]: Class, rationale and the configured extra fields,
+                and the outcome of the extraction, e.g. "matched" or "unsuccessful"
+        """
+        text = text if isinstance(text, str) else str(text or "")
+
+        # Fast path for the common case: one well-formed tag with a label seen before
+        if self._fast_path:
+            start = text.find(self._open_tag)
+            end = text.find(self._close_tag, start) if start >= 0 else -1
+            if end >= 0:
+                resolved = self._labels.get(text[start + len(self._open_tag):end].strip())
+                rationale = text[end + len(self._close_tag):]
+                if resolved is not None and "<" not in rationale:
+                    return {"class": resolved[0], "rationale": rationale.strip()}, resolved[1]
+
+        if self.mode == EXTRACTION_MODE_JSON:
+            result = self._extract_json(text) or self._extract_tags(text)
+        else:
+            result = self._extract_tags(text) or ("{" in text and self._extract_json(text)) or None
+
+        outcome = None
+        if result is None:
+            result = self._infer_from_mentions(text)
+            outcome = OUTCOME_INFERRED
+        if result is None:
+            return self._build_fields(UNSUCCESSFUL_CLASS, NO_RATIONALE, [], None), OUTCOME_UNSUCCESSFUL
+
+        raw_labels, rationale, confidence = result
+        labels = []
+        for raw_label in raw_labels:
+            label, label_outcome = self._resolve_label(raw_label)
+            if label not in labels:
+                labels.append(label)
+            # The outcome of the primary label is reported
+            outcome = outcome or label_outcome
+
+        return self._build_fields(labels[0], rationale, labels, confidence), outcome
+
+    def _build_fields(self, class_content: str, rationale: str, labels: List[str], confidence: Optional[float]) -> Dict[str, Any]:
+        """
+        Assemble the extracted fields in a fixed order.
+
+        Args:
+            class_content: Primary class
+            rationale: Rationale of the model
+            labels: All labels, for multi-label outputs
+            confidence: Confidence between 0 and 1, if the model stated one
+        """
+        fields = {"class": class_content, "rationale": rationale}
+        if FIELD_LABELS in self.fields:
+            fields[FIELD_LABELS] = LABEL_SEPARATOR.join(labels) or None
+        if FIELD_CONFIDENCE in self.fields:
+            fields[FIELD_CONFIDENCE] = None if confidence is None else f"{confidence:g}"
+        return fields
+
+    def _extract_tags(self, text: str) -> Optional[Tuple[List[str], str, Optional[float]]]:
+        """
+        Extract the class from a tag, with the rest of the output as rationale.
+
+        Args:
+            text: Raw output text of the model
+        """
+        # Well-formed outputs are cut with str.find, the patterns handle the rest
+        start = text.find(self._open_tag)
+        end = text.find(self._close_tag, start) if start >= 0 else -1
+        if end >= 0:
+            label = text[start + len(self._open_tag):end].strip()
+            rest = text[end + len(self._close_tag):]
+        else:
+            match = self._tag_pattern.search(text) or self._open_tag_pattern.search(text)
+            if not match:
+                return None
+            label = match.group(1).strip()
+            rest = text[match.end():]
+
+        if not label:
+            return None
+
+        labels = [label]
+        if FIELD_LABELS in self.fields:
+            labels = self._split_labels([label] + [other.strip() for other in self._tag_pattern.findall(rest)])
+
+        confidence = None
+        if FIELD_CONFIDENCE in self.fields or "<" in rest:
+            confidence_match = CONFIDENCE_PATTERN.search(rest)
+            if confidence_match:
+                confidence = _to_confidence(confidence_match.group(1), confidence_match.group(2))
+                rest = rest[:confidence_match.start()] + rest[confidence_match.end():]
+
+        rationale_match = RATIONALE_PATTERN.search(rest) if "<" in rest else None
+        rationale = rationale_match.group(1) if rationale_match else rest.strip()
+        return labels, rationale, confidence
+
+    def _extract_json(self, text: str) -> Optional[Tuple[List[str], str, Optional[float]]]:
+        """
+        Extract the class from a JSON object, which may be wrapped in text or a code fence.
+
+        Args:
+            text: Raw output text of the model
+        """
+        start, end = text.find("{"), text.rfind("}")
+        if start < 0 or end <= start:
+            return None
+
+        try:
+            data = json.loads(text[start:end + 1])
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+
+        values = {str(key).lower(): value for key, value in data.items()}
+        value = next((values[key] for key in JSON_CLASS_KEYS if values.get(key)), None)
+        if value is None:
+            return None
+
+        labels = [str(label).strip() for label in (value if isinstance(value, list) else [value]) if str(label).strip()]
+        if not labels:
+            return None
+        if FIELD_LABELS in self.fields:
+            labels = self._split_labels(labels)
+        else:
+            labels = labels[:1]
+
+        rationale = next((str(values[key]).strip() for key in JSON_RATIONALE_KEYS if values.get(key)), NO_RATIONALE)
+        confidence = next((_to_confidence(values[key]) for key in JSON_CONFIDENCE_KEYS if values.get(key) is not None), None)
+        return labels, rationale, confidence
+
+    def _infer_from_mentions(self, text: str) -> Optional[Tuple[List[str], str, Optional[float]]]:
+        """
+        Classify an output without a tag or JSON object by the single category it names.
+
+        Args:
+            text: Raw output text of the model
+        """
+        if self._category_pattern is None:
+            return None
+
+        mentioned = {normalize_label(match) for match in self._category_pattern.findall(text)}
+        if len(mentioned) != 1:
+            return None
+
+        return [self._category_keys[mentioned.pop()]], text.strip(), None
+
+    def _split_labels(self, labels: List[str]) -> List[str]:
+        """
+        Split labels that list several categories, e.g. "Complaint, Refund Issues".
+
+        A label is only split when every part is a known category.
+
+        Args:
+            labels: Labels written by the model
+        """
+        result = []
+        for label in labels:
+            parts = LABEL_SPLIT_PATTERN.split(label)
+            if len(parts) > 1 and all(self._resolve_label(part)[1] != OUTCOME_UNKNOWN for part in parts):
+                result.extend(parts)
+            else:
+                result.append(label)
+        return result
+
+    def _resolve_label(self, label: str) -> Tuple[str, str]:
+        """
+        Map a label to its category.
+
+        Args:
+            label: Label written by the model
+
+        Returns:
+            Tuple[str, str]: Category, or the label itself if it matches none, and the outcome
+        """
+        resolved = self._labels.get(label)
+        if resolved is not None:
+            return resolved
+
+        if not self.categories or label in self.categories:
+            resolved = (label, OUTCOME_MATCHED)
+        else:
+            key = normalize_label(label)
+            category = self._category_keys.get(key)
+            if category is None:
+                close = difflib.get_close_matches(key, list(self._category_keys), n=1, cutoff=LABEL_MATCH_CUTOFF)
+                category = self._category_keys[close[0]] if close else None
+            resolved = (category, OUTCOME_NORMALIZED) if category else (label, OUTCOME_UNKNOWN)
+
+        if len(self._labels) < LABEL_CACHE_SIZE:
+            self._labels[label] = resolved
+        return resolved
+
+
+def _to_confidence(value: Any, percent: str = "") -> Optional[float]:
+    """
+    Convert a stated confidence to a number between 0 and 1.
+
+    Args:
+        value: Confidence, e.g. 0.85, "85" or "85%"
+        percent: "%" if the value was followed by a percent sign
+    """
+    try:
+        if isinstance(value, str) and value.strip().endswith("%"):
+            value, percent = value.strip()[:-1], "%"
+        confidence = float(value)
+    except (TypeError, ValueError):
+        return None
+
+    if percent or confidence > 1:
+        confidence /= 100
+    return confidence if 0 <= confidence <= 1 else None
+
+
+@lru_cache(maxsize=8)
+def get_output_extractor(
+    prompt: str,
+    mode: str = EXTRACTION_MODE_TAGS,
+    categories: Tuple[str, ...] = (),
+    class_tag: str = "class",
+    fields: Tuple[str, ...] = ()
+) -> OutputExtractor:
+    """
+    Get the extractor for the outputs of a prompt, created once per prompt and configuration.
+
+    Args:
+        prompt (str): System prompt the outputs were generated with
+        mode (str): "tags" or "json"
+        categories (Tuple[str, ...]): Valid class labels, read from the numbered list of the prompt if empty
+        class_tag (str): Name of the tag holding the class
+        fields (Tuple[str, ...]): Extra fields to extract
+    """
+    categories = categories or tuple(parse_categories(prompt))
+    logger.info(f"Created output extractor in {mode} mode for {len(categories)} categories")
+    return OutputExtractor(mode, categories, class_tag, fields)
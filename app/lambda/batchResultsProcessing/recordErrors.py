@@ -0,0 +1,176 @@
+import json
+import os
+import logging
+import re
+from typing import Any, Dict, Optional, Set
+from utils.compression import get_compression
+from utils.s3 import S3StreamWriter, iter_s3_file_chunks
+from utils.stream_reader import iter_lines
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+# Error codes of records that failed before the model answered
+MISSING_OUTPUT = "MissingOutput"
+INVALID_JSON = "InvalidJson"
+INVALID_RECORD = "InvalidRecord"
+
+# Bedrock error codes worth a second attempt, besides server errors
+RETRYABLE_MODEL_ERROR_CODES = ["408", "429"]
+
+RECORD_ID_PATTERN = re.compile(r'"recordId"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+def is_retryable(error_code: str) -> bool:
+    """
+    Check whether a failed record can succeed when it is sent again.
+
+    Args:
+        error_code (str): Error code of the record
+    """
+    if error_code in [MISSING_OUTPUT, INVALID_JSON, INVALID_RECORD]:
+        return True
+    return error_code in RETRYABLE_MODEL_ERROR_CODES or error_code.startswith("5")
+
+
+def extract_record_id(line: str) -> Optional[str]:
+    """
+    Find the record ID in a line that is not valid JSON, e.g. a truncated one.
+
+    Args:
+        line (str): Line of the Bedrock output file
+    """
+    match = RECORD_ID_PATTERN.search(line)
+    if not match:
+        return None
+
+    try:
+        return json.loads(f'"{match.group(1)}"')
+    except ValueError:
+        return None
+
+
+class RecordErrorCollector:
+    """
+    Collects the records of a Bedrock output file that could not be processed.
+
+    Every failure is written as one compact line (record ID, error code and
+    message) to an error sidecar. Failures that can succeed on a second attempt
+    are also written in the Bedrock input format to a retry file, which is
+    resubmitted once all batches of the parent are processed. Records whose
+    output line is unreadable are looked up by ID in the input file of the
+    batch. Only the IDs of those records are kept in memory.
+    """
+
+    def __init__(self, bucket_name: str, error_key: str, retry_key: str, input_s3_uri: Optional[str] = None):
+        """
+        Initialize RecordErrorCollector.
+
+        Args:
+            bucket_name (str): Bucket for the error sidecar and the retry file
+            error_key (str): Key of the error sidecar, compressed if it ends in .gz or .zst
+            retry_key (str): Key of the retry file, compressed like the error sidecar
+            input_s3_uri (Optional[str]): S3 URI of the batch input file, if known
+        """
+        self.bucket_name = bucket_name
+        self.error_key = error_key
+        self.retry_key = retry_key
+        self.input_s3_uri = input_s3_uri
+        self.error_count = 0
+        self.retry_count = 0
+        self._missing_inputs: Set[str] = set()
+        self._error_writer: Optional[S3StreamWriter] = None
+        self._retry_writer: Optional[S3StreamWriter] = None
+
+    def add(
+        self,
+        record_id: Optional[str],
+        error_code: str,
+        error_message: str,
+        model_input: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Record a failed record.
+
+        Args:
+            record_id (Optional[str]): ID of the record, if it could be read
+            error_code (str): Bedrock error code or one of the codes of this module
+            error_message (str): Description of the failure
+            model_input (Optional[Dict[str, Any]]): Model input of the record, if it could be read
+        """
+        if self._error_writer is None:
+            self._error_writer = S3StreamWriter(self.bucket_name, self.error_key, compression=get_compression(self.error_key))
+
+        line = json.dumps({
+            "recordId": record_id,
+            "errorCode": error_code,
+            "errorMessage": error_message[:500]
+        }, ensure_ascii=False)
+        self._error_writer.write(f"{line}\n".encode("utf-8"))
+        self.error_count += 1
+
+        if record_id is None or not is_retryable(error_code):
+            return
+
+        if model_input is None:
+            self._missing_inputs.add(record_id)
+        else:
+            self._write_retry(record_id, model_input)
+
+    def close(self) -> None:
+        """Recover the missing model inputs and complete the files."""
+        if self._missing_inputs:
+            self._recover_inputs()
+
+        for writer in [self._error_writer, self._retry_writer]:
+            if writer is not None:
+                writer.close()
+
+        if self.error_count:
+            logger.warning(
+                f"{self.error_count} records failed, {self.retry_count} of them will be resubmitted, "
+                f"see s3://{self.bucket_name}/{self.error_key}"
+            )
+
+    def abort(self) -> None:
+        """Discard the files."""
+        for writer in [self._error_writer, self._retry_writer]:
+            if writer is not None:
+                writer.abort()
+
+    def _write_retry(self, record_id: str, model_input: Dict[str, Any]) -> None:
+        """
+        Write a record to the retry file in the Bedrock input format.
+
+        Args:
+            record_id: ID of the record
+            model_input: Model input of the record
+        """
+        if self._retry_writer is None:
+            self._retry_writer = S3StreamWriter(self.bucket_name, self.retry_key, compression=get_compression(self.retry_key))
+
+        line = json.dumps({"recordId": record_id, "modelInput": model_input}, ensure_ascii=False)
+        self._retry_writer.write(f"{line}\n".encode("utf-8"))
+        self.retry_count += 1
+
+    def _recover_inputs(self) -> None:
+        """Copy the input lines of records with unreadable output lines to the retry file."""
+        if not self.input_s3_uri:
+            logger.warning(f"{len(self._missing_inputs)} failed records cannot be resubmitted, the input file is unknown")
+            return
+
+        bucket_name, _, file_key = self.input_s3_uri.replace("s3://", "", 1).partition("/")
+        for line in iter_lines(iter_s3_file_chunks(bucket_name, file_key)):
+            if not line.strip():
+                continue
+
+            data = json.loads(line)
+            if data.get("recordId") in self._missing_inputs:
+                self._missing_inputs.discard(data["recordId"])
+                self._write_retry(data["recordId"], data["modelInput"])
+                if not self._missing_inputs:
+                    return
+
+        logger.warning(f"{len(self._missing_inputs)} failed records were not found in {self.input_s3_uri}")
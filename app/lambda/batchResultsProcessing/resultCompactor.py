@@ -0,0 +1,189 @@
+import json
+import os
+import logging
+from typing import Dict, List, Set
+from utils.s3 import S3StreamWriter, delete_s3_objects, list_s3_keys, read_s3_bytes
+from batchResultsProcessing.resultSinks import PARQUET_ROW_GROUP_SIZE
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+COMPACTION_COMPRESSION = "zstd"
+COMPACTION_SORT_COLUMN = "id"
+# Parquet footer entry listing the batch files a compacted file was built from
+SOURCE_FILES_METADATA_KEY = b"compacted_from"
+# Bytes read from the end of a compacted file, enough for the footer in most cases
+FOOTER_READ_SIZE = 64 * 1024
+PARQUET_MAGIC = b"PAR1"
+
+
+class ResultCompactor:
+    """
+    Merges the per-batch Parquet files of a parent into a few large files.
+
+    Every batch writes one small file per dt/class partition, so a large parent
+    leaves thousands of objects for Glue and Athena to list. Within each
+    partition, the batch files of the parent are combined into files of about
+    the target size, sorted by record ID and compressed with zstd.
+
+    A compacted file is only visible once its upload is complete, and the batch
+    files it replaces are deleted afterwards. The names of those batch files are
+    stored in the footer of the compacted file, so a swap that was interrupted
+    is completed on the next run instead of being compacted a second time.
+    """
+
+    def __init__(self, bucket_name: str, folder_name: str, target_size_bytes: int):
+        """
+        Initialize ResultCompactor.
+
+        Args:
+            bucket_name (str): Bucket holding the processed records
+            folder_name (str): Folder holding the dt/class partitions
+            target_size_bytes (int): Size of the batch files combined into one compacted file
+        """
+        self.bucket_name = bucket_name
+        self.folder_name = folder_name
+        self.target_size_bytes = target_size_bytes
+
+    def compact_parent(self, parent_job_id: str, dates: List[str]) -> int:
+        """
+        Compact the batch files of a parent in all partitions of the given dates.
+
+        Args:
+            parent_job_id (str): Parent ID that groups batches together
+            dates (List[str]): Values of the dt partitions the batches were written to
+
+        Returns:
+            int: Number of batch files that were replaced
+        """
+        replaced_count = 0
+        for date in dates:
+            partitions: Dict[str, List[str]] = {}
+            for key in list_s3_keys(self.bucket_name, f"{self.folder_name}/dt={date}/"):
+                partition, _, file_name = key.rpartition("/")
+                if file_name.startswith((f"{parent_job_id}-batch", f"{parent_job_id}-compacted-")):
+                    partitions.setdefault(partition, []).append(file_name)
+
+            for partition, file_names in partitions.items():
+                replaced_count += self._compact_partition(partition, parent_job_id, sorted(file_names))
+
+        logger.info(f"Replaced {replaced_count} batch files of parent {parent_job_id} with compacted files")
+        return replaced_count
+
+    def _compact_partition(self, partition: str, parent_job_id: str, file_names: List[str]) -> int:
+        """
+        Compact the batch files of a parent in one partition.
+
+        Args:
+            partition (str): Key prefix of the partition, without trailing slash
+            parent_job_id (str): Parent ID that groups batches together
+            file_names (List[str]): Names of the files of the parent in the partition
+
+        Returns:
+            int: Number of batch files that were replaced
+        """
+        compacted_names = [name for name in file_names if name.startswith(f"{parent_job_id}-compacted-")]
+        batch_names = [name for name in file_names if name not in compacted_names]
+
+        # Finish the swaps of an earlier run that stopped before deleting the batch files
+        covered: Set[str] = set()
+        for name in compacted_names:
+            covered.update(self._read_source_names(f"{partition}/{name}"))
+        replaced = [name for name in batch_names if name in covered]
+        if replaced:
+            delete_s3_objects(self.bucket_name, [f"{partition}/{name}" for name in replaced])
+
+        pending = [name for name in batch_names if name not in covered]
+        if len(pending) < 2:
+            return len(replaced)
+
+        file_index = len(compacted_names)
+        group: List[str] = []
+        tables = []
+        group_size = 0
+        for name in pending:
+            body = read_s3_bytes(self.bucket_name, f"{partition}/{name}")
+            tables.append(self._read_table(body))
+            group.append(name)
+            group_size += len(body)
+
+            if group_size >= self.target_size_bytes:
+                self._replace_files(partition, f"{parent_job_id}-compacted-{file_index:04d}.parquet", group, tables)
+                replaced.extend(group)
+                file_index += 1
+                group, tables, group_size = [], [], 0
+
+        # A single leftover file is not worth rewriting
+        if len(group) > 1:
+            self._replace_files(partition, f"{parent_job_id}-compacted-{file_index:04d}.parquet", group, tables)
+            replaced.extend(group)
+
+        return len(replaced)
+
+    def _replace_files(self, partition: str, file_name: str, source_names: List[str], tables: List) -> None:
+        """
+        Write one compacted file and delete the batch files it was built from.
+
+        Args:
+            partition (str): Key prefix of the partition, without trailing slash
+            file_name (str): Name of the compacted file
+            source_names (List[str]): Names of the batch files
+            tables (List[pyarrow.Table]): Content of the batch files
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.concat_tables(tables, promote_options="default")
+        if COMPACTION_SORT_COLUMN in table.column_names:
+            table = table.sort_by(COMPACTION_SORT_COLUMN)
+        table = table.replace_schema_metadata({SOURCE_FILES_METADATA_KEY: json.dumps(source_names)})
+
+        with S3StreamWriter(self.bucket_name, f"{partition}/{file_name}") as writer:
+            pq.write_table(
+                table,
+                writer,
+                compression=COMPACTION_COMPRESSION,
+                row_group_size=PARQUET_ROW_GROUP_SIZE
+            )
+
+        delete_s3_objects(self.bucket_name, [f"{partition}/{name}" for name in source_names])
+        logger.info(f"Compacted {len(source_names)} files with {table.num_rows} records into {partition}/{file_name}")
+
+    def _read_source_names(self, file_key: str) -> List[str]:
+        """
+        Read the names of the batch files a compacted file was built from.
+
+        Args:
+            file_key (str): Key of the compacted file
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # A Parquet file ends with its footer, the footer length and the magic bytes
+        tail = read_s3_bytes(self.bucket_name, file_key, -FOOTER_READ_SIZE)
+        footer_size = int.from_bytes(tail[-8:-4], "little") + 8
+        if footer_size > len(tail):
+            tail = read_s3_bytes(self.bucket_name, file_key, -footer_size)
+
+        # Framed by the leading magic bytes, the footer alone reads as a file without data
+        footer = PARQUET_MAGIC + tail[-footer_size:]
+        metadata = pq.read_metadata(pa.BufferReader(footer)).metadata or {}
+        return json.loads(metadata.get(SOURCE_FILES_METADATA_KEY, b"[]"))
+
+    @staticmethod
+    def _read_table(body: bytes):
+        """
+        Read a Parquet file into a table.
+
+        Args:
+            body (bytes): Content of the Parquet file
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # ParquetFile avoids pyarrow.dataset, which imports pandas. The body is
+        # read in this thread, as an Arrow pool thread releasing the last view
+        # of the Python bytes while the interpreter exits aborts the process
+        return pq.ParquetFile(pa.BufferReader(body)).read(use_threads=False)
@@ -0,0 +1,193 @@
+import io
+import json
+import os
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from utils.id_generator import get_current_date_full_str
+from utils.s3 import S3StreamWriter, read_s3_bytes, save_file_to_s3
+from batchResultsProcessing.resultSinks import PARQUET_COMPRESSION, StreamingWorkbook
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+CHECKSUM_ALGORITHM = "SHA256"
+# Bytes read from the start of a CSV file to find the end of its header
+HEADER_PROBE_SIZE = 64 * 1024
+
+
+def get_batch_order(item_id: str) -> Tuple[int, int]:
+    """
+    Sort key placing the batches of a parent in the order they were cut.
+
+    Cached and real-time results come first and re-submitted records last, so
+    the merged rows are grouped by batch rather than in input order.
+
+    Args:
+        item_id (str): ID of the batch, e.g. <parent>-batch3 or <parent>-batch-retry1
+    """
+    suffix = item_id.partition("-batch")[2]
+    if suffix.startswith("-retry"):
+        return 1, int(suffix[len("-retry"):] or 0)
+    return 0, int(suffix or 0)
+
+
+class ResultMerger:
+    """
+    Combines the output files of all batches of a parent into one deliverable.
+
+    CSV and JSON Lines files are concatenated with UploadPartCopy, so S3
+    copies them server side and only small files and the CSV headers are
+    downloaded. Excel and Parquet files are rewritten row by row and row group
+    by row group. S3 computes a SHA-256 checksum of the merged file, which is
+    written to a manifest together with the record counts of the batches.
+    The manifest is written last, so its presence means the deliverable is
+    complete.
+    """
+
+    def __init__(self, bucket_name: str, output_format: str):
+        """
+        Initialize ResultMerger.
+
+        Args:
+            bucket_name (str): Bucket holding the output files
+            output_format (str): File extension of the output files, e.g. ".csv"
+        """
+        self.bucket_name = bucket_name
+        self.output_format = output_format
+
+    def merge(
+        self,
+        parent_job_id: str,
+        parts: List[Dict[str, Any]],
+        merged_key: str,
+        manifest_key: str,
+        failed_batches: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Merge the output files of a parent and write its manifest.
+
+        Args:
+            parent_job_id (str): Parent ID that groups batches together
+            parts (List[Dict[str, Any]]): Output files in merge order, with batch, key,
+                size_bytes, etag and record_count
+            merged_key (str): Key of the merged file
+            manifest_key (str): Key of the manifest
+            failed_batches (Optional[List[Dict[str, Any]]]): Batches without output file,
+                with batch and error_message
+
+        Returns:
+            Dict[str, Any]: Content of the manifest
+        """
+        merge_methods = {
+            ".csv": self._merge_csv,
+            ".json": self._merge_json_lines,
+            ".xlsx": self._merge_excel,
+            ".parquet": self._merge_parquet
+        }
+        if self.output_format not in merge_methods:
+            raise ValueError(f"Unsupported output format: {self.output_format}")
+
+        with S3StreamWriter(self.bucket_name, merged_key, extra_args={"ChecksumAlgorithm": CHECKSUM_ALGORITHM}) as writer:
+            merge_methods[self.output_format](parts, writer)
+
+        record_counts = [part.get("record_count") for part in parts]
+        manifest = {
+            "parent_id": parent_job_id,
+            "format": self.output_format,
+            "file": f"s3://{self.bucket_name}/{merged_key}",
+            "size_bytes": writer.bytes_written,
+            "checksum_algorithm": CHECKSUM_ALGORITHM,
+            "checksum": writer.checksum,
+            # S3 reports the checksum of the part checksums for multipart uploads, suffixed with -<part count>
+            "checksum_type": "COMPOSITE" if "-" in (writer.checksum or "") else "FULL_OBJECT",
+            "record_count": None if None in record_counts else sum(record_counts),
+            "created_date": get_current_date_full_str(),
+            "parts": parts,
+            "failed_batches": failed_batches or []
+        }
+        save_file_to_s3(json.dumps(manifest, indent=2), self.bucket_name, manifest_key)
+
+        logger.info(f"Merged {len(parts)} output files of parent {parent_job_id} into s3://{self.bucket_name}/{merged_key}")
+        return manifest
+
+    def _merge_csv(self, parts: List[Dict[str, Any]], writer: S3StreamWriter) -> None:
+        """
+        Concatenate CSV files, keeping only the header of the first one.
+
+        Args:
+            parts: Output files in merge order
+            writer: Stream of the merged file
+        """
+        for index, part in enumerate(parts):
+            start = 0
+            if index:
+                head = read_s3_bytes(self.bucket_name, part["key"], 0, min(part["size_bytes"], HEADER_PROBE_SIZE))
+                start = head.find(b"\n") + 1
+                if not start:
+                    raise ValueError(f"No header found in {part['key']}")
+            writer.copy_from(self.bucket_name, part["key"], start, part["size_bytes"])
+
+    def _merge_json_lines(self, parts: List[Dict[str, Any]], writer: S3StreamWriter) -> None:
+        """
+        Concatenate JSON Lines files, which end without a line break.
+
+        Args:
+            parts: Output files in merge order
+            writer: Stream of the merged file
+        """
+        for index, part in enumerate(parts):
+            if index:
+                writer.write(b"\n")
+            writer.copy_from(self.bucket_name, part["key"], 0, part["size_bytes"])
+
+    def _merge_excel(self, parts: List[Dict[str, Any]], writer: S3StreamWriter) -> None:
+        """
+        Copy the rows of all sheets of Excel files into one workbook, without their header rows.
+
+        Args:
+            parts: Output files in merge order
+            writer: Stream of the merged file
+        """
+        from openpyxl import load_workbook
+
+        workbook: Optional[StreamingWorkbook] = None
+        for part in parts:
+            source = load_workbook(io.BytesIO(read_s3_bytes(self.bucket_name, part["key"])), read_only=True)
+            for sheet in source.worksheets:
+                rows = sheet.iter_rows(values_only=True)
+                header = next(rows, None)
+                if header is None:
+                    continue
+                if workbook is None:
+                    workbook = StreamingWorkbook(["" if value is None else value for value in header])
+                for row in rows:
+                    workbook.append(["" if value is None else value for value in row])
+            source.close()
+
+        if workbook is not None:
+            workbook.save(writer)
+
+    def _merge_parquet(self, parts: List[Dict[str, Any]], writer: S3StreamWriter) -> None:
+        """
+        Copy the row groups of Parquet files into one file.
+
+        Args:
+            parts: Output files in merge order
+            writer: Stream of the merged file
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        parquet_writer: Optional[pq.ParquetWriter] = None
+        for part in parts:
+            # Read in this thread, like the files of the compactor
+            source = pq.ParquetFile(pa.BufferReader(read_s3_bytes(self.bucket_name, part["key"])))
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(writer, source.schema_arrow, compression=PARQUET_COMPRESSION)
+            for row_group in range(source.num_row_groups):
+                parquet_writer.write_table(source.read_row_group(row_group, use_threads=False))
+
+        if parquet_writer is not None:
+            parquet_writer.close()
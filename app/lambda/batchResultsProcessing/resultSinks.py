@@ -0,0 +1,439 @@
+import csv
+import hashlib
+import io
+import json
+import os
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+from utils.s3 import S3StreamWriter
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+TEXT_FLUSH_SIZE = 256 * 1024
+# Rows per Excel sheet, including the header row
+EXCEL_MAX_ROWS = 1048576
+PARQUET_ROW_GROUP_SIZE = 10000
+PARQUET_COMPRESSION = "snappy"
+# Columns with few distinct values, stored with dictionary encoding
+PARQUET_DICTIONARY_COLUMNS = ["class"]
+PARTITION_COLUMN = "class"
+# Keeps the keys well below the S3 limit of 1024 bytes
+PARTITION_VALUE_MAX_LENGTH = 512
+# Characters Hive escapes in partition values, decoded with urllib.parse.unquote
+ESCAPED_PARTITION_CHARACTERS = re.compile(r"[\x00-\x1f\"#%'*/:=?\\\x7f{\[\]^]")
+# Partition of records without a value, as Hive names it
+DEFAULT_PARTITION_VALUE = "__HIVE_DEFAULT_PARTITION__"
+
+
+class ResultSink(ABC):
+    """
+    Destination that processed records are written to one at a time.
+
+    The file is only created once the first record is written, so no empty
+    files are left behind for batches without results.
+    """
+
+    def __init__(self, bucket_name: str, file_key: str):
+        """
+        Initialize ResultSink.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) of the result file
+        """
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+        self.record_count = 0
+
+    @abstractmethod
+    def write(self, record: Dict[str, Any]) -> None:
+        """
+        Append a record to the result file.
+
+        Args:
+            record (Dict[str, Any]): Processed record
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Complete the result file."""
+
+    @abstractmethod
+    def abort(self) -> None:
+        """Discard the result file."""
+
+
+class TextResultSink(ResultSink):
+    """Base of text formats, encoded in UTF-8 and streamed to S3 in parts."""
+
+    def __init__(self, bucket_name: str, file_key: str):
+        """
+        Initialize TextResultSink.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) of the result file
+        """
+        super().__init__(bucket_name, file_key)
+        self._buffer = io.StringIO()
+        self._writer: Optional[S3StreamWriter] = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._writer is None:
+            self._writer = S3StreamWriter(self.bucket_name, self.file_key)
+
+        self._write_record(record)
+        self.record_count += 1
+
+        if self._buffer.tell() >= TEXT_FLUSH_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        if self._writer is None:
+            return
+
+        self._flush()
+        self._writer.close()
+
+    def abort(self) -> None:
+        if self._writer is not None:
+            self._writer.abort()
+
+    @abstractmethod
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        """
+        Render a record into the text buffer.
+
+        Args:
+            record (Dict[str, Any]): Processed record
+        """
+
+    def _flush(self) -> None:
+        """Send the text buffer to the S3 stream."""
+        self._writer.write(self._buffer.getvalue().encode("utf-8"))
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+
+class CsvResultSink(TextResultSink):
+    """Writes records as CSV, with the fields of the first record as header."""
+
+    def __init__(self, bucket_name: str, file_key: str):
+        """
+        Initialize CsvResultSink.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) of the result file
+        """
+        super().__init__(bucket_name, file_key)
+        self._csv_writer: Optional[csv.DictWriter] = None
+
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        if self._csv_writer is None:
+            self._csv_writer = csv.DictWriter(self._buffer, fieldnames=list(record.keys()))
+            self._csv_writer.writeheader()
+
+        self._csv_writer.writerow(record)
+
+
+class JsonLinesResultSink(TextResultSink):
+    """Writes records as JSON Lines."""
+
+    def _write_record(self, record: Dict[str, Any]) -> None:
+        if self.record_count:
+            self._buffer.write("\n")
+        self._buffer.write(json.dumps(record, ensure_ascii=False))
+
+
+class StreamingWorkbook:
+    """
+    Excel workbook in openpyxl's write-only mode.
+
+    Rows are serialized as they are appended instead of being kept as cell
+    objects, so memory use does not grow with the number of rows. When a sheet
+    reaches the Excel row limit, the rows continue on a new sheet that repeats
+    the header. openpyxl is only imported once a workbook is created.
+    """
+
+    def __init__(self, header: List[str]):
+        """
+        Initialize StreamingWorkbook.
+
+        Args:
+            header (List[str]): Column names, written as first row of every sheet
+        """
+        from openpyxl import Workbook
+
+        self.header = header
+        self.row_count = 0
+        self._workbook = Workbook(write_only=True)
+        self._sheet = None
+        self._sheet_rows = EXCEL_MAX_ROWS
+
+    def append(self, row: List[Any]) -> None:
+        """
+        Append a row, starting a new sheet when the current one is full.
+
+        Args:
+            row (List[Any]): Cell values
+        """
+        if self._sheet_rows >= EXCEL_MAX_ROWS:
+            sheet_number = len(self._workbook.worksheets) + 1
+            self._sheet = self._workbook.create_sheet("Sheet" if sheet_number == 1 else f"Sheet{sheet_number}")
+            self._sheet.append(self.header)
+            self._sheet_rows = 1
+
+        self._sheet.append(row)
+        self._sheet_rows += 1
+        self.row_count += 1
+
+    def save(self, stream: io.RawIOBase) -> None:
+        """
+        Write the workbook to a stream, e.g. an S3StreamWriter.
+
+        Args:
+            stream (io.RawIOBase): Writable stream
+        """
+        if self._sheet is None:
+            self._workbook.create_sheet("Sheet").append(self.header)
+        self._workbook.save(stream)
+
+
+class ExcelResultSink(ResultSink):
+    """Writes records to an Excel workbook, spilling to further sheets past the row limit."""
+
+    def __init__(self, bucket_name: str, file_key: str):
+        """
+        Initialize ExcelResultSink.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) of the result file
+        """
+        super().__init__(bucket_name, file_key)
+        self._workbook: Optional[StreamingWorkbook] = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._workbook is None:
+            self._workbook = StreamingWorkbook([str(header) for header in record.keys()])
+
+        # Handle None values and convert all values to string
+        self._workbook.append([str(value) if value is not None else "" for value in record.values()])
+        self.record_count += 1
+
+    def close(self) -> None:
+        if self._workbook is None:
+            return
+
+        with S3StreamWriter(self.bucket_name, self.file_key) as writer:
+            self._workbook.save(writer)
+        self._workbook = None
+
+    def abort(self) -> None:
+        self._workbook = None
+
+
+class ParquetResultSink(ResultSink):
+    """
+    Writes records to a compressed Parquet file, a row group at a time.
+
+    All values are stored as strings. Columns with few distinct values, such
+    as the class, are dictionary encoded. pyarrow is only imported once the
+    first row group is written.
+    """
+
+    def __init__(self, bucket_name: str, file_key: str):
+        """
+        Initialize ParquetResultSink.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) of the result file
+        """
+        super().__init__(bucket_name, file_key)
+        self._rows: List[Dict[str, Any]] = []
+        self._schema = None
+        self._stream: Optional[S3StreamWriter] = None
+        self._parquet_writer = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._rows.append(record)
+        self.record_count += 1
+
+        if len(self._rows) >= PARQUET_ROW_GROUP_SIZE:
+            self._flush()
+
+    def close(self) -> None:
+        if not self.record_count:
+            return
+
+        self._flush()
+        self._parquet_writer.close()
+        self._stream.close()
+
+    def abort(self) -> None:
+        self._rows = []
+        if self._stream is not None:
+            self._stream.abort()
+
+    def _flush(self) -> None:
+        """Write the buffered records as one row group."""
+        if not self._rows:
+            return
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._parquet_writer is None:
+            columns = list(self._rows[0].keys())
+            self._schema = pa.schema([(column, pa.string()) for column in columns])
+            self._stream = S3StreamWriter(self.bucket_name, self.file_key)
+            self._parquet_writer = pq.ParquetWriter(
+                self._stream,
+                self._schema,
+                compression=PARQUET_COMPRESSION,
+                use_dictionary=[column for column in PARQUET_DICTIONARY_COLUMNS if column in columns]
+            )
+
+        # Built with StringBuilder, as converting Python lists makes pyarrow import pandas
+        columns = []
+        for name in self._schema.names:
+            builder = pa.lib.StringBuilder()
+            builder.append_values([None if row.get(name) is None else str(row.get(name)) for row in self._rows])
+            columns.append(builder.finish())
+        table = pa.Table.from_arrays(columns, schema=self._schema)
+        self._parquet_writer.write_table(table)
+        self._rows = []
+
+
+class PartitionedParquetResultSink(ResultSink):
+    """
+    Writes records to Parquet files in Hive-style dt=<date>/class=<class> partitions.
+
+    Athena reads the partition values from the keys, so queries filtering on
+    the date or the class only scan the matching files. The class is therefore
+    not repeated inside the files, and is escaped in the key the way Hive
+    escapes partition values, so it can be decoded again. Every batch writes
+    one file per class.
+    """
+
+    def __init__(self, bucket_name: str, folder_name: str, date: str, file_name: str):
+        """
+        Initialize PartitionedParquetResultSink.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            folder_name (str): Folder holding the partitions
+            date (str): Value of the dt partition, YYYY-MM-DD
+            file_name (str): Name of the files without extension
+        """
+        super().__init__(bucket_name, f"{folder_name}/dt={date}")
+        self.file_name = file_name
+        self._sinks: Dict[str, ParquetResultSink] = {}
+
+    def write(self, record: Dict[str, Any]) -> None:
+        partition_value = encode_partition_value(record.get(PARTITION_COLUMN))
+        sink = self._sinks.get(partition_value)
+        if sink is None:
+            sink = ParquetResultSink(
+                self.bucket_name,
+                f"{self.file_key}/{PARTITION_COLUMN}={partition_value}/{self.file_name}.parquet"
+            )
+            self._sinks[partition_value] = sink
+
+        sink.write({key: value for key, value in record.items() if key != PARTITION_COLUMN})
+        self.record_count += 1
+
+    def close(self) -> None:
+        for sink in self._sinks.values():
+            sink.close()
+
+    def abort(self) -> None:
+        for sink in self._sinks.values():
+            sink.abort()
+
+
+def encode_partition_value(value: Any) -> str:
+    """
+    Escape a value to use as a partition in an S3 key, like Hive does.
+
+    Reserved and control characters are percent-encoded, so distinct values
+    get distinct partitions. Values too long for a key, which only unknown
+    labels of malformed model outputs reach, are cut and made unique with a
+    hash of the whole value.
+
+    Args:
+        value (Any): Partition value, e.g. the class of a record
+    """
+    text = "" if value is None else str(value)
+    if not text:
+        return DEFAULT_PARTITION_VALUE
+
+    encoded = ESCAPED_PARTITION_CHARACTERS.sub(lambda match: f"%{ord(match.group()):02X}", text)
+    if len(encoded.encode("utf-8")) <= PARTITION_VALUE_MAX_LENGTH:
+        return encoded
+
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+    prefix = encoded.encode("utf-8")[:PARTITION_VALUE_MAX_LENGTH - len(digest) - 1].decode("utf-8", "ignore")
+    # Do not cut an escape sequence in half
+    prefix = re.sub(r"%[0-9A-F]?$", "", prefix)
+    return f"{prefix}~{digest}"
+
+
+RESULT_SINKS = {
+    ".csv": CsvResultSink,
+    ".json": JsonLinesResultSink,
+    ".xlsx": ExcelResultSink,
+    ".parquet": ParquetResultSink
+}
+
+
+def create_result_sink(output_format: str, bucket_name: str, file_key: str) -> ResultSink:
+    """
+    Create the sink writing an output format.
+
+    Args:
+        output_format (str): File extension of the format, e.g. ".csv"
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) of the result file
+    """
+    if output_format not in RESULT_SINKS:
+        raise ValueError(f"Unsupported output format: {output_format}")
+
+    return RESULT_SINKS[output_format](bucket_name, file_key)
+
+
+def write_to_sinks(records: Iterable[Dict[str, Any]], sinks: List[ResultSink]) -> int:
+    """
+    Write every record to all sinks in a single pass.
+
+    When a record cannot be processed or written, all result files are discarded.
+
+    Args:
+        records (Iterable[Dict[str, Any]]): Processed records
+        sinks (List[ResultSink]): Destinations of the records
+
+    Returns:
+        int: Number of records written
+    """
+    record_count = 0
+    try:
+        for record in records:
+            for sink in sinks:
+                sink.write(record)
+            record_count += 1
+
+        for sink in sinks:
+            sink.close()
+    except Exception:
+        for sink in sinks:
+            sink.abort()
+        raise
+
+    return record_count
@@ -1,8 +1,12 @@
 import logging
+from functools import lru_cache
 import os
 from typing import Dict, Any
-from utils.sqs_parser import extract_bucket_from_sqs_message
-from utils.s3 import read_s3_file
+from utils.compression import get_compression, strip_compression_extension
+from utils.id_generator import generate_parent_id
+from utils.sqs_batch import process_sqs_records
+from utils.sqs_parser import extract_bucket_from_sqs_message, extract_shard_from_sqs_message
+from utils.s3 import iter_s3_file_chunks, iter_s3_xlsx_records, read_s3_file
 from dataPreparation.dataProcessor import DataProcessor
 from dataPreparation.environmentConfig import EnvironmentConfig
 
@@ -12,57 +16,98 @@ log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
 
+@lru_cache(maxsize=1)
+def get_processor() -> DataProcessor:
+    """
+    Create the configuration and processor on the first invocation.
+
+    They are reused by later invocations of the same execution environment.
+    """
+    return DataProcessor(EnvironmentConfig())
+
+
+def process_record(record: Dict[str, Any]) -> None:
+    """
+    Prepare the batches of the input file in an SQS message.
+
+    Large CSV and JSON Lines files are split into shards, which are sent back
+    to the queue and prepared by parallel invocations.
+
+    Args:
+        record (Dict[str, Any]): SQS record containing S3 event information or a shard
+    """
+    processor = get_processor()
+    config = processor.config
+
+    shard = extract_shard_from_sqs_message(record["body"])
+    if shard:
+        batch_count = processor.prepare_shard(shard)
+        logger.info(f"Successfully processed {batch_count} batches for shard {shard['index']} of {shard['key']}")
+        return
+
+    # Extract bucket details
+    input_bucket = extract_bucket_from_sqs_message(record["body"])
+
+    if not input_bucket:
+        return
+
+    input_bucket_name = input_bucket.get("input_bucket_name")
+    input_key = input_bucket.get("input_key_name")
+    # requests.csv.gz is read as a CSV file that is decompressed while it is streamed
+    file_extension = strip_compression_extension(input_key).lower().split(".")[-1]
+    compression = get_compression(input_key)
+    # A redelivered message prepares the file under the same parent ID as the failed attempt
+    parent_id = generate_parent_id(input_bucket_name, input_key, input_bucket.get("input_version", ""))
+    priority = processor.get_priority(input_bucket_name, input_key)
+
+    if compression and file_extension in ["xlsx", "xls"]:
+        logger.error(f"Compressed Excel files are not supported: {input_key}")
+        return
+    elif file_extension == "xlsx":
+        # Only the mapped columns are read, row by row
+        file_content = iter_s3_xlsx_records(
+            input_bucket_name,
+            input_key,
+            [config.get("input_mapping_text_field"), config.get("input_mapping_id_field")],
+            config.get_int("xlsx_sheet_concurrency", 1)
+        )
+    elif file_extension == "xls":
+        file_content = read_s3_file(input_bucket_name, input_key)
+        if not file_content:
+            return
+    else:
+        if processor.shard_file(input_bucket_name, input_key, file_extension, parent_id, priority):
+            return
+
+        # Stream CSV/JSON content so the whole object is never held in memory, gzip
+        # and zstd compressed objects are decompressed on the fly
+        file_content = iter_s3_file_chunks(input_bucket_name, input_key)
+
+    batch_count = processor.prepare_batches(file_extension, file_content, parent_id, priority=priority)
+
+    if not batch_count:
+        logger.warning(f"No valid content processed for file {input_key}")
+        return
+
+    logger.info(f"Successfully processed {batch_count} batches for {input_key}")
+
+
 def lambda_handler(event: Dict, context: Any) -> Dict[str, Any]:
     """
     Process incoming S3 events and prepare data for Bedrock processing.
 
+    The input files of a batch are processed concurrently, and only the
+    messages of the files that failed are reported to be delivered again.
+
     Args:
         event (Dict[str, Any]): Lambda event
         context (LambdaContext): Lambda context
 
     """
-    try:
-        logger.info("Start data preparation processing.")
-
-        # Initialize configuration
-        config = EnvironmentConfig()
-        processor = DataProcessor(config)
-
-        for record in event["Records"]:
-            # Extract bucket details
-            input_bucket = extract_bucket_from_sqs_message(record["body"])
-            input_bucket_name = input_bucket.get("input_bucket_name")
-
-            if not input_bucket:
-                continue
-
-            input_key = input_bucket.get("input_key_name")
-            file_extension = input_key.lower().split(".")[-1]
-            file_content = read_s3_file(input_bucket_name, input_key)
-
-            if not file_content:
-                continue
-
-            jsonl_content = processor.convert_to_jsonl(file_extension, file_content)
-            
-            if not jsonl_content:
-                logger.warning(f"No valid content processed for file {input_key}")
-                continue
-
-            batches = processor.process_jsonl_batches(jsonl_content)
-            
-            if batches:
-                processor.save_batches(batches)
-                logger.info(f"Successfully processed {len(batches)} batches for {input_key}")
-
-        return {
-            "statusCode": 200,
-            "body": "Processing completed successfully"
-        }
-
-    except Exception as e:
-        logger.error(f"Processing error: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": f"Error during processing: {str(e)}"
-        }
\ No newline at end of file
+    logger.info("Start data preparation processing.")
+
+    return process_sqs_records(
+        event["Records"],
+        process_record,
+        get_processor().config.get_int("record_concurrency", 1)
+    )
\ No newline at end of file
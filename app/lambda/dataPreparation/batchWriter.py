@@ -0,0 +1,133 @@
+import os
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from utils.s3 import save_lines_to_s3
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+
+class BatchWriter:
+    """
+    Uploads JSONL batches to S3 from a bounded thread pool.
+
+    Batches are handed over as soon as they are cut, so S3 network time overlaps
+    with parsing of the following records. The number of batches waiting or in
+    flight is capped to keep memory bounded.
+    """
+
+    def __init__(self, bucket_name: str, max_workers: int = 4, max_pending: Optional[int] = None):
+        """
+        Initialize BatchWriter.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket the batches are written to
+            max_workers (int): Number of concurrent uploads
+            max_pending (Optional[int]): Maximum number of batches queued or in flight
+        """
+        self.bucket_name = bucket_name
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(max_workers, 1),
+            thread_name_prefix="batch-writer"
+        )
+        self._slots = threading.BoundedSemaphore(max_pending or max(max_workers, 1) * 2)
+        self._futures: List[Future] = []
+        self._failed = threading.Event()
+
+    def submit(
+        self,
+        file_key: str,
+        lines: List[str],
+        on_uploaded: Optional[Callable[[], None]] = None,
+        before_upload: Optional[Callable[[], None]] = None
+    ) -> None:
+        """
+        Queue a batch for upload, blocking while too many batches are pending.
+
+        Args:
+            file_key (str): Key (path) where the batch will be stored in S3
+            lines (List[str]): JSONL lines of the batch
+            on_uploaded (Optional[Callable[[], None]]): Called in the worker once the batch is uploaded
+            before_upload (Optional[Callable[[], None]]): Called in the worker before the batch is uploaded
+        """
+        if self._failed.is_set():
+            raise RuntimeError("A previous batch upload failed")
+
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._upload, file_key, lines, on_uploaded, before_upload)
+        except Exception:
+            self._slots.release()
+            raise
+
+        future.add_done_callback(lambda _: self._slots.release())
+        self._futures.append(future)
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Wait for all uploads to finish.
+
+        Returns:
+            List[Dict[str, Any]]: Upload statistics per batch, in submission order
+        """
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self._failed.set()
+            for future in self._futures:
+                future.cancel()
+        self._executor.shutdown(wait=True)
+
+    def _upload(
+        self,
+        file_key: str,
+        lines: List[str],
+        on_uploaded: Optional[Callable[[], None]],
+        before_upload: Optional[Callable[[], None]]
+    ) -> Dict[str, Any]:
+        """
+        Upload one batch and collect its statistics.
+
+        Args:
+            file_key (str): Key (path) where the batch will be stored in S3
+            lines (List[str]): JSONL lines of the batch
+            on_uploaded (Optional[Callable[[], None]]): Called once the batch is uploaded
+            before_upload (Optional[Callable[[], None]]): Called before the batch is uploaded
+        """
+        try:
+            if before_upload:
+                before_upload()
+
+            start_time = time.perf_counter()
+            size = save_lines_to_s3(lines, self.bucket_name, file_key)
+            latency = time.perf_counter() - start_time
+
+            if on_uploaded:
+                on_uploaded()
+
+            logger.info(
+                f"Uploaded batch {file_key}: {len(lines)} records, "
+                f"{size} bytes in {latency:.3f}s"
+            )
+            return {
+                "file_key": file_key,
+                "records": len(lines),
+                "bytes": size,
+                "latency": latency
+            }
+        except Exception as e:
+            self._failed.set()
+            logger.error(f"Error uploading batch {file_key}: {str(e)}")
+            raise
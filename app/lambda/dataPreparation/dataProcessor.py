@@ -1,19 +1,49 @@
 import json
 import os
 import logging
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Set, Tuple
 from csv import DictReader
-from typing import Dict, List, Optional
-from utils.dynamodb import create_job_status_record
+from functools import partial
+from itertools import chain, islice
+from utils.batch_failures import report_failed_batch
+from utils.compression import get_compression_extension
+from utils.dynamodb import (
+    PARENT_ID_INDEX,
+    complete_parent_batch,
+    complete_parent_shard,
+    create_job_status_record,
+    get_job_status_record,
+    query_job_status_items,
+    register_parent_shards,
+    transition_job_status
+)
 from utils.id_generator import generate_random_id, get_current_date_short_str
-from utils.s3 import save_file_to_s3
+from utils.s3 import S3StreamWriter, get_s3_object_metadata, iter_s3_file_chunks, list_s3_keys
+from utils.sharding import (
+    get_alias_file_name,
+    get_batch_item_id,
+    get_batch_number,
+    get_shard_index,
+    get_shard_item_id
+)
+from utils.sqs_batch import send_sqs_messages
+from utils.stream_reader import iter_json_records, iter_lines
+from dataPreparation.batchWriter import BatchWriter
 from dataPreparation.environmentConfig import EnvironmentConfig
+from dataPreparation.fileSharder import FileSharder
+from dataPreparation.jobRegistrar import JobRegistrar
+from dataPreparation.modelInputTemplate import ModelInputTemplate
+from dataPreparation.realtimeClassifier import RealtimeClassifier
+from dataPreparation.recordBatcher import BATCHING_MODE_RECORDS, RecordBatcher
+from dataPreparation.recordDeduplicator import RecordDeduplicator
 
 # Configure logging
 logger = logging.getLogger(__name__)
 log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
+CHARS_PER_TOKEN = 4
+
 
 class DataProcessor:
     """Handles data processing and conversion operations."""
@@ -27,6 +57,306 @@ class DataProcessor:
 
         """
         self.config = config
+        # The prompt is the same for every record, so the request envelope is serialized once
+        self.model_input_template = ModelInputTemplate(config.get("prompt"))
+
+    def prepare_batches(
+        self,
+        file_extension: str,
+        file_content: Iterable,
+        parent_id: Optional[str] = None,
+        shard_index: Optional[int] = None,
+        priority: Optional[int] = None
+    ) -> int:
+        """
+        Convert file content into Bedrock batch files and register them.
+
+        Duplicate texts are collapsed and cached results are served without a
+        model request when deduplication is enabled. Duplicates are still sent
+        when the unique texts fall short of the minimum records of a batch.
+        Files with fewer records than REALTIME_RECORD_THRESHOLD are classified
+        right away with InvokeModel instead of a batch inference job.
+
+        When the preparation of the file or shard is retried, the batches
+        uploaded by the earlier attempt are kept, as their jobs may have
+        started, and only the records they do not hold are prepared again.
+
+        Args:
+            file_extension (str): File extension
+            file_content (Iterable): Text chunks for CSV/JSON, parsed records for XLSX/XLS
+            parent_id (Optional[str]): ID grouping the batches of the file, generated if not given
+            shard_index (Optional[int]): Index of the shard, None if the file is not sharded
+            priority (Optional[int]): Priority of the batch jobs, lower values are started first
+
+        Returns:
+            int: Number of saved batches, including the batch of cached results
+                and the batch of real-time results
+        """
+        parent_id = parent_id or generate_random_id()
+        job_status_table = self.config.get("job_status_table")
+        texts = self._iter_texts(self._iter_records(file_extension, file_content))
+
+        # Like a shard, a file is pending while it is prepared, so its batches
+        # cannot complete the parent before all of them are counted
+        if shard_index is None:
+            register_parent_shards(job_status_table, parent_id, [get_shard_item_id(parent_id, 0)])
+
+        prepared_ids, prepared_item_ids = self._find_prepared_batches(parent_id, shard_index or 0)
+        last_batch_number = max(map(get_batch_number, prepared_item_ids), default=0)
+        if prepared_ids:
+            texts = ((record_id, text) for record_id, text in texts if record_id not in prepared_ids)
+
+        deduplicator = self._create_deduplicator(parent_id, shard_index or 0)
+
+        try:
+            # The records left by an earlier attempt may be too few for a batch of their own
+            realtime_texts, texts = self._take_realtime_texts(texts, shard_index is None or last_batch_number > 0)
+            batch_count = 0
+            if realtime_texts is not None:
+                if deduplicator:
+                    realtime_texts = list(deduplicator.iter_unique(realtime_texts))
+                    # The real-time results are processed as soon as they are written
+                    deduplicator.close_aliases()
+            else:
+                if deduplicator:
+                    minimum_records = int(self.config.get("minimum_records_per_batch", 10))
+                    texts = deduplicator.iter_unique(texts, minimum_records)
+                batches = self.iter_batches(self._iter_texts_as_jsonl(texts))
+                batch_count = self.save_batches(batches, parent_id, shard_index, last_batch_number + 1, priority)
+
+                # A file too small for a batch leaves no sidecar behind
+                if not batch_count and deduplicator and deduplicator.misses:
+                    deduplicator.abort()
+                    deduplicator = None
+            cached_batch_count = 1 if deduplicator and deduplicator.hits else 0
+
+            # The cached results file becomes visible when the deduplicator is
+            # closed, so its batch is counted on the parent before that. The
+            # real-time results are visible as soon as they are classified, so
+            # the cached batch is counted together with them, as are the
+            # batches kept from an earlier attempt.
+            pending_batch_count = cached_batch_count + len(prepared_item_ids)
+            if realtime_texts:
+                batch_count = self.classify_realtime(
+                    realtime_texts,
+                    parent_id,
+                    pending_batch_count,
+                    shard_index or 0,
+                    last_batch_number + 1
+                )
+            else:
+                complete_parent_shard(
+                    job_status_table,
+                    parent_id,
+                    get_shard_item_id(parent_id, shard_index or 0),
+                    batch_count + pending_batch_count
+                )
+
+            # Batches of the earlier attempt that completed while the shard was pending were not counted
+            for item_id in prepared_item_ids:
+                response = get_job_status_record(job_status_table, item_id) or {}
+                if response.get("Item", {}).get("job_status", {}).get("S") == "COMPLETED":
+                    complete_parent_batch(job_status_table, parent_id, item_id)
+            if batch_count or prepared_item_ids:
+                self._report_failed_batches(parent_id, shard_index or 0)
+            batch_count += cached_batch_count
+        except Exception:
+            if deduplicator:
+                deduplicator.abort()
+            raise
+
+        if deduplicator:
+            deduplicator.close()
+
+        return batch_count
+
+    @staticmethod
+    def get_priority(bucket_name: str, file_key: str) -> Optional[int]:
+        """
+        Read the priority of the batch jobs of an input file from its "priority" user metadata.
+
+        Args:
+            bucket_name (str): Name of the input bucket
+            file_key (str): Key (path) of the input file
+
+        Returns:
+            Optional[int]: Priority of the batch jobs, or None if the file has none
+        """
+        priority = get_s3_object_metadata(bucket_name, file_key).get("priority")
+        if priority is None:
+            return None
+
+        try:
+            return int(priority)
+        except ValueError:
+            logger.warning(f"Ignoring priority {priority!r} of {file_key}, it is not an integer")
+            return None
+
+    def shard_file(
+        self,
+        bucket_name: str,
+        file_key: str,
+        file_extension: str,
+        parent_id: Optional[str] = None,
+        priority: Optional[int] = None
+    ) -> int:
+        """
+        Split a large input file into shards that are prepared in parallel.
+
+        Every shard is sent as a message to the queue of this function, and is
+        counted on the parent as a pending batch until its batches are
+        registered, so the parent cannot complete while a shard is still
+        being prepared. When the file is sharded again by a retry, the shards
+        are sent again but not counted twice.
+
+        Args:
+            bucket_name (str): Name of the input bucket
+            file_key (str): Key (path) of the input file
+            file_extension (str): File extension
+            parent_id (Optional[str]): ID grouping the batches of the file, generated if not given
+            priority (Optional[int]): Priority of the batch jobs, lower values are started first
+
+        Returns:
+            int: Number of shards, 0 if the file is prepared in one piece
+        """
+        shard_queue_url = self.config.get("shard_queue_url")
+        shard_size = self.config.get_int("shard_size_mb", 0) * 1024 * 1024
+        if not shard_queue_url or not shard_size:
+            return 0
+
+        plan = FileSharder(shard_size).plan(bucket_name, file_key, file_extension)
+        if not plan:
+            return 0
+
+        parent_id = parent_id or generate_random_id()
+        shard_count = len(plan["ranges"])
+        register_parent_shards(
+            self.config.get("job_status_table"),
+            parent_id,
+            [get_shard_item_id(parent_id, index) for index in range(shard_count)]
+        )
+
+        send_sqs_messages(shard_queue_url, [
+            json.dumps({
+                "shard": {
+                    "bucket": bucket_name,
+                    "key": file_key,
+                    "file_extension": file_extension,
+                    "parent_id": parent_id,
+                    "index": index,
+                    "count": shard_count,
+                    "start": start,
+                    "end": end,
+                    "header": plan["header"],
+                    "priority": priority
+                }
+            })
+            for index, (start, end) in enumerate(plan["ranges"])
+        ])
+
+        logger.info(f"Sent {shard_count} shards of {file_key} for parent {parent_id}")
+        return shard_count
+
+    def prepare_shard(self, shard: Dict[str, Any]) -> int:
+        """
+        Prepare the batches of one shard of an input file.
+
+        Args:
+            shard (Dict[str, Any]): Shard message sent by shard_file
+
+        Returns:
+            int: Number of saved batches, including the batch of cached results
+        """
+        logger.info(f"Preparing shard {shard['index'] + 1} of {shard['count']} of {shard['key']}")
+
+        file_content = iter_s3_file_chunks(shard["bucket"], shard["key"], start=shard["start"], end=shard["end"])
+        # Only the first shard starts with the CSV header
+        if shard["index"] and shard.get("header"):
+            file_content = chain([shard["header"]], file_content)
+
+        return self.prepare_batches(
+            shard["file_extension"],
+            file_content,
+            shard["parent_id"],
+            shard["index"],
+            shard.get("priority")
+        )
+
+    def classify_realtime(
+        self,
+        texts: List[Tuple[str, Any]],
+        parent_id: str,
+        pending_batch_count: int = 0,
+        shard_index: int = 0,
+        batch_number: int = 1
+    ) -> int:
+        """
+        Classify the records of a small file with InvokeModel and write them as one batch.
+
+        The results are written in the Bedrock batch output format to the
+        results folder, where batchResultsProcessing picks them up like the
+        output of a batch inference job. The batch is counted on the parent,
+        in place of the pending file, before its output file becomes visible. If the records cannot be
+        classified, the batch is marked as FAILED and counted as failed on the parent.
+
+        Args:
+            texts (List[Tuple[str, Any]]): Record IDs with their texts
+            parent_id (str): ID grouping the batches of the file
+            pending_batch_count (int): Batches of the parent counted together with this one
+            shard_index (int): Index of the shard, 0 if the file is not sharded
+            batch_number (int): Number of the batch within the shard
+
+        Returns:
+            int: Number of saved batches
+        """
+        job_status_table = self.config.get("job_status_table")
+        file_id = get_batch_item_id(parent_id, batch_number, shard_index)
+        realtime_job_id = f"realtime-{get_shard_item_id(parent_id, shard_index)}"
+        output_key = f"{self.config.get('results_folder_name')}/{realtime_job_id}/{file_id}.jsonl.out"
+
+        classifier = RealtimeClassifier(
+            model_id=self.config.get("bedrock_model_id"),
+            max_concurrency=self.config.get_int("realtime_max_concurrency", 8),
+            requests_per_second=float(self.config.get("realtime_requests_per_second", "0") or 0),
+            max_retries=self.config.get_int("realtime_max_retries", 5)
+        )
+        render_model_input = self.model_input_template.render_model_input
+
+        create_job_status_record(job_status_table, file_id, "RUNNING", {"bedrock_job_short_id": realtime_job_id})
+        writer = S3StreamWriter(self.config.get("output_bucket_name"), output_key)
+        try:
+            records = ((record_id, render_model_input(text)) for record_id, text in texts)
+            for line in classifier.iter_output_lines(records):
+                writer.write(f"{line}\n".encode("utf-8"))
+
+            complete_parent_shard(
+                job_status_table,
+                parent_id,
+                get_shard_item_id(parent_id, shard_index),
+                1 + pending_batch_count
+            )
+            writer.close()
+        except Exception as e:
+            writer.abort()
+            logger.error(f"Real-time classification of {file_id} failed: {e}")
+            transition_job_status(
+                job_status_table,
+                file_id,
+                "RUNNING",
+                {"job_status": "FAILED", "error_message": str(e)}
+            )
+            # The failed batch ends the shard, so it is counted like a batch of results
+            complete_parent_shard(
+                job_status_table,
+                parent_id,
+                get_shard_item_id(parent_id, shard_index),
+                1 + pending_batch_count
+            )
+            report_failed_batch(job_status_table, parent_id, file_id, self._get_results_s3_uri(), str(e))
+            return 1
+
+        logger.info(f"Classified {len(texts)} records of parent {parent_id} in real time")
+        return 1
 
     def convert_to_jsonl(self, file_extension: str, file_content: str) -> Optional[str]:
         """
@@ -38,11 +368,14 @@ class DataProcessor:
 
         """
         try:
-            records = self._parse_content(file_extension, file_content)
-            if not records:
+            if isinstance(file_content, str):
+                file_content = [file_content]
+
+            jsonl_lines = list(self.iter_jsonl_lines(file_extension, file_content))
+            if not jsonl_lines:
                 return None
 
-            return self._convert_records_to_jsonl(records)
+            return "\n".join(jsonl_lines)
 
         except Exception as e:
             logger.error(f"Error converting to JSONL: {str(e)}")
@@ -60,87 +393,204 @@ class DataProcessor:
 
         """
         try:
-            batch_size = self.config.get_int("batch_size", 10)
             lines = [line for line in jsonl_content.splitlines() if line.strip()]
-            total_records = len(lines)
-            logger.info(f"Processing {total_records} records")
-
-            if not self._validate_batch_size(total_records, batch_size):
-                return []
+            logger.info(f"Processing {len(lines)} records")
 
-            return self._create_batches(lines, batch_size)
+            weighted_lines = ((line, self._estimate_tokens(line)) for line in lines)
+            return list(self.iter_batches(weighted_lines))
 
         except Exception as e:
             logger.error(f"Error processing JSONL batches: {str(e)}")
             raise
 
+    def iter_jsonl_batches(self, file_extension: str, file_content: Iterable) -> Iterator[List[str]]:
+        """
+        Stream file content through parsing, JSONL conversion and batching.
+
+        Records are pulled through the pipeline one at a time, so peak memory
+        depends on the batch size rather than on the size of the input file.
+
+        Args:
+            file_extension (str): File extension
+            file_content (Iterable): Text chunks for CSV/JSON, parsed records for XLSX/XLS
+
+        """
+        records = self._iter_records(file_extension, file_content)
+        return self.iter_batches(self._iter_records_as_jsonl(records))
+
+    def iter_jsonl_lines(self, file_extension: str, file_content: Iterable) -> Iterator[str]:
+        """
+        Parse file content and yield one Bedrock JSONL line per record.
+
+        Args:
+            file_extension (str): File extension
+            file_content (Iterable): Text chunks for CSV/JSON, parsed records for XLSX/XLS
+
+        """
+        records = self._iter_records(file_extension, file_content)
+        return (line for line, _ in self._iter_records_as_jsonl(records))
+
+    def iter_batches(self, weighted_lines: Iterable[Tuple[str, int]]) -> Iterator[List[str]]:
+        """
+        Cut JSONL lines into batches on the fly.
+
+        Batches are cut by record count or packed to a token and byte budget,
+        depending on BATCHING_MODE. A summary of the batch size distribution is
+        logged once the input is exhausted.
+
+        Args:
+            weighted_lines (Iterable[Tuple[str, int]]): JSONL lines with their estimated token counts
+
+        """
+        batcher = RecordBatcher(
+            minimum_records=int(self.config.get("minimum_records_per_batch", 10)),
+            batch_size=self.config.get_int("batch_size", 10),
+            mode=self.config.get("batching_mode", BATCHING_MODE_RECORDS).lower(),
+            max_tokens=self.config.get_int("batch_max_tokens", 0),
+            max_bytes=self.config.get_int("batch_max_bytes", 0),
+            max_records=self.config.get_int("batch_max_records", 0)
+        )
+
+        yield from batcher.iter_batches(weighted_lines)
+
+        summary = batcher.summary()
+        if summary["batches"]:
+            logger.info(f"Batch size distribution ({batcher.mode} mode): {json.dumps(summary)}")
+
     @staticmethod
-    def _parse_content(file_extension: str, content: str) -> Optional[List[Dict]]:
+    def _iter_records(file_extension: str, content: Iterable) -> Iterator[Dict]:
         """
         Parse content based on file type.
 
-        Internal method to parse different file formats into a common dictionary format.
+        Internal method to parse different file formats into a common dictionary format,
+        one record at a time.
 
         Args:
-            file_extension: File extension indicating format (csv, json, xlsx, xls)
-            content
+            file_extension: File extension indicating format (csv, json, jsonl, xlsx, xls)
+            content: Text chunks for CSV/JSON, parsed records for XLSX/XLS
 
         """
-        try:
-            if file_extension == "csv":
-                return list(DictReader(content.splitlines()))
-            elif file_extension == "json":
-                return json.loads(content)
-            elif file_extension in ["xlsx", "xls"]:
-                return content
-            else:
-                logger.error(f"Unsupported file type: {file_extension}")
-                return None
-        except Exception as e:
-            logger.error(f"Error parsing content: {str(e)}")
-            return None
-
-    def _convert_records_to_jsonl(self, records: List[Dict]) -> Optional[str]:
+        if file_extension == "csv":
+            yield from DictReader(iter_lines(content))
+        elif file_extension in ["json", "jsonl"]:
+            yield from iter_json_records(content)
+        elif file_extension in ["xlsx", "xls"]:
+            yield from content
+        else:
+            logger.error(f"Unsupported file type: {file_extension}")
+
+    def _iter_records_as_jsonl(self, records: Iterable[Dict]) -> Iterator[Tuple[str, int]]:
         """
         Convert records to JSONL format.
 
-        Internal method to convert parsed records into JSONL format with proper structure
+        Internal method to convert parsed records into JSONL lines with proper structure
         for Bedrock processing.
 
         Args:
-            records: List of dictionaries containing record data
+            records: Dictionaries containing record data
 
         """
-        try:
-            jsonl_lines = []
-            text_field = self.config.get("input_mapping_text_field")
-            
-            for record in records:
-                try:
-                    text_content = record.pop(text_field)
-                    record_id = self._get_record_id(record)
-                    
-                    jsonl_record = {
-                        "recordId": record_id,
-                        "modelInput": self._create_model_input(text_content)
-                    }
-                    
-                    jsonl_lines.append(json.dumps(jsonl_record, ensure_ascii=False))
-                    
-                except KeyError:
-                    logger.warning(f"Missing text field {text_field} in record")
-                    continue
+        return self._iter_texts_as_jsonl(self._iter_texts(records))
 
-            if not jsonl_lines:
-                logger.warning("No valid records to convert")
-                return None
+    def _iter_texts(self, records: Iterable[Dict]) -> Iterator[Tuple[str, Any]]:
+        """
+        Extract record IDs and texts from parsed records.
 
-            logger.info(f"Converted {len(jsonl_lines)} records to JSONL")
-            return "\n".join(jsonl_lines)
+        Args:
+            records: Dictionaries containing record data
 
-        except Exception as e:
-            logger.error(f"Error converting to JSONL: {str(e)}")
-            return None
+        """
+        text_field = self.config.get("input_mapping_text_field")
+
+        for record in records:
+            # Fragments of a skipped malformed JSON record are not records
+            if not isinstance(record, dict):
+                logger.warning(f"Skipping {type(record).__name__} value that is not a record")
+                continue
+
+            try:
+                text_content = record.pop(text_field)
+                yield self._get_record_id(record), text_content
+
+            except KeyError:
+                logger.warning(f"Missing text field {text_field} in record")
+                continue
+
+    def _take_realtime_texts(
+        self,
+        texts: Iterable[Tuple[str, Any]],
+        allowed: bool = True
+    ) -> Tuple[Optional[List[Tuple[str, Any]]], Iterable[Tuple[str, Any]]]:
+        """
+        Read the texts of a file that is small enough to be classified in real time.
+
+        At most REALTIME_RECORD_THRESHOLD texts are read ahead. If the file
+        has more, the texts read so far are put back in front of the rest.
+        Shards are only classified in real time when few of their records
+        are left by an earlier attempt.
+
+        Args:
+            texts: Record IDs with their texts
+            allowed: Whether the texts may be classified in real time
+
+        Returns:
+            Tuple: All texts of the file if it is classified in real time, otherwise None,
+                and the texts left for the batch files
+        """
+        threshold = self.config.get_int("realtime_record_threshold", 0)
+        if not threshold or not allowed:
+            return None, texts
+        if not self.config.get("bedrock_model_id"):
+            logger.warning("BEDROCK_MODEL_ID is not set, small files are not classified in real time")
+            return None, texts
+
+        texts = iter(texts)
+        head = list(islice(texts, threshold))
+        if len(head) < threshold:
+            return head, iter(())
+        return None, chain(head, texts)
+
+    def _iter_texts_as_jsonl(self, texts: Iterable[Tuple[str, Any]]) -> Iterator[Tuple[str, int]]:
+        """
+        Convert record texts to JSONL lines for Bedrock processing.
+
+        Each line is paired with the estimated number of input tokens of the record,
+        i.e. its text plus the shared system prompt.
+
+        Args:
+            texts: Record IDs with their texts
+
+        """
+        converted = 0
+        render = self.model_input_template.render
+        estimate_tokens = self._estimate_tokens
+        system_tokens = estimate_tokens(self.model_input_template.prompt)
+
+        for record_id, text_content in texts:
+            converted += 1
+            yield render(record_id, text_content), estimate_tokens(text_content) + system_tokens
+
+        if not converted:
+            logger.warning("No valid records to convert")
+        else:
+            logger.info(f"Converted {converted} records to JSONL")
+
+    @staticmethod
+    def _estimate_tokens(text: Any) -> int:
+        """
+        Estimate the number of tokens in a text.
+
+        Internal method using a characters-per-token heuristic, which is close enough
+        to size batches without calling a tokenizer for every record.
+
+        Args:
+            text: Text to estimate
+
+        """
+        if not text:
+            return 0
+
+        return -(-len(str(text)) // CHARS_PER_TOKEN)
 
     def _get_record_id(self, record: Dict[str, str]) -> str:
         """
@@ -157,123 +607,210 @@ class DataProcessor:
         bom_id_field = f"\ufeff{id_field}"
         return record.get(id_field) or record.get(bom_id_field) or generate_random_id()
 
-    def _create_model_input(self, text_content: str) -> Dict[str, Any]:
+    def save_batches(
+        self,
+        batches: Iterable[List[str]],
+        parent_id: Optional[str] = None,
+        shard_index: Optional[int] = None,
+        first_batch_number: int = 1,
+        priority: Optional[int] = None
+    ) -> int:
         """
-        Create model input structure for Bedrock.
+        Save processed batches to S3.
 
-        Internal method to format text content into the required structure for
-        Bedrock model input.
+        Batches are consumed as they are produced, so a generator from
+        iter_jsonl_batches can be passed in directly. Each batch is streamed to
+        S3 from a bounded pool of upload threads while the next one is built.
+        Their DRAFT job records are registered in bulk ahead of the uploads.
+        The batches are counted on the parent by the caller.
 
         Args:
-            text_content: Text content to process
-
+            batches (Iterable[List[str]]): Processed batches
+            parent_id (Optional[str]): ID grouping the batches, generated if not given
+            shard_index (Optional[int]): Index of the shard, or None if the file is not sharded
+            first_batch_number (int): Number of the first batch within the shard
+            priority (Optional[int]): Priority stored on the job records, lower values are started first
+
+        Returns:
+            int: Number of saved batches
         """
-        return {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": 2048,
-            "messages": [{
-                "role": "user",
-                "content": [{
-                    "type": "text",
-                    "text": text_content
-                }]
-            }],
-            "system": self.config.get("prompt")
-        }
+        try:
+            output_bucket = self.config.get("output_bucket_name")
+            output_folder = self.config.get("output_folder_name")
+            job_status_table = self.config.get("job_status_table")
+            upload_concurrency = self.config.get_int("upload_concurrency", 4)
+            parent_id = parent_id or generate_random_id()
+            current_date = get_current_date_short_str()
+
+            get_file_id = partial(get_batch_item_id, parent_id, shard_index=shard_index or 0)
+            registrar = JobRegistrar(
+                job_status_table,
+                lambda index: get_file_id(index + first_batch_number),
+                extra_attributes=None if priority is None else {"priority": priority}
+            )
+
+            try:
+                with BatchWriter(output_bucket, max_workers=upload_concurrency) as writer:
+                    for i, batch in enumerate(batches):
+                        file_id = get_file_id(i + first_batch_number)
+                        base_filename = f"{output_folder}/{current_date}/{parent_id}/{file_id}.jsonl"
+
+                        writer.submit(
+                            base_filename,
+                            batch,
+                            on_uploaded=partial(registrar.mark_uploaded, i),
+                            before_upload=registrar.register(i).result
+                        )
 
-    def _validate_batch_size(self, total_records: int, batch_size: int) -> bool:
+                    upload_stats = writer.close()
+
+                registrar.close(len(upload_stats))
+            except Exception:
+                registrar.abort()
+                raise
+
+            self._log_upload_stats(upload_stats)
+            return len(upload_stats)
+
+        except Exception as e:
+            logger.error(f"Error saving batches: {str(e)}")
+            raise
+
+    def _find_prepared_batches(self, parent_id: str, shard_index: int) -> Tuple[Set[Any], List[str]]:
         """
-        Validate batch size configuration.
+        Find the batch files an earlier attempt at preparing a file or shard uploaded.
 
-        Internal method to ensure batch size meets minimum requirements.
+        The first batch of the file or shard is looked up first, so a first
+        attempt costs a single read.
 
         Args:
-            total_records: Total number of records to process
-            batch_size: Configured batch size
+            parent_id (str): ID grouping the batches of the file
+            shard_index (int): Index of the shard, 0 if the file is not sharded
 
+        Returns:
+            Tuple[Set[Any], List[str]]: IDs of the records in the uploaded batches, and the
+                item IDs of the batches
         """
-        
-        minimum_records = int(self.config.get("minimum_records_per_batch", 10))
-        
-        if total_records < minimum_records:
-            logger.warning(
-                f"Total records ({total_records}) is less than minimum required ({minimum_records})"
-            )
-            return False
-            
-        if batch_size < minimum_records:
-            logger.warning(
-                f"Batch size ({batch_size}) is less than minimum required ({minimum_records})"
+        first_item_id = get_batch_item_id(parent_id, 1, shard_index)
+        response = get_job_status_record(self.config.get("job_status_table"), first_item_id)
+        if response is None:
+            raise RuntimeError(f"Could not read the job status of {first_item_id}")
+        if "Item" not in response:
+            return set(), []
+
+        output_bucket = self.config.get("output_bucket_name")
+        output_folder = self.config.get("output_folder_name")
+        # The batch files are written to the folder of the day the earlier attempt started
+        dates = {response["Item"]["created_date"]["S"][:10], get_current_date_short_str()}
+
+        record_ids: Set[Any] = set()
+        item_ids: List[str] = []
+        for date in sorted(dates):
+            for file_key in list_s3_keys(output_bucket, f"{output_folder}/{date}/{parent_id}/"):
+                item_id = file_key.rsplit("/", 1)[-1].split(".", 1)[0]
+                if get_shard_index(item_id) != shard_index:
+                    continue
+
+                item_ids.append(item_id)
+                for line in iter_lines(iter_s3_file_chunks(output_bucket, file_key)):
+                    if line.strip():
+                        record_ids.add(json.loads(line)["recordId"])
+
+        if item_ids:
+            logger.info(
+                f"Keeping {len(item_ids)} batches with {len(record_ids)} records of an earlier "
+                f"attempt at shard {shard_index} of parent {parent_id}"
             )
-            return False
-            
-        return True
+        return record_ids, item_ids
 
-    def _create_batches(self, lines: List[str], batch_size: int) -> List[List[str]]:
+    def _report_failed_batches(self, parent_id: str, shard_index: int) -> None:
         """
-        Create batches from content lines.
-
-        Internal method to split content into appropriate sized batches.
+        Count the batches of a shard that failed for good while the shard was pending.
 
         Args:
-            lines: List of JSONL lines to batch
-            batch_size: Size of each batch
-
+            parent_id (str): ID grouping the batches of the file
+            shard_index (int): Index of the shard, 0 if the file is not sharded
         """
-        batches = []
-        current_batch = []
-        minimum_records = int(self.config.get("minimum_records_per_batch", 10))
-
-        for line in lines:
-            current_batch.append(line)
-            
-            if len(current_batch) >= batch_size:
-                batches.append(current_batch)
-                current_batch = []
+        job_status_table = self.config.get("job_status_table")
+        failed_items = query_job_status_items(
+            job_status_table,
+            PARENT_ID_INDEX,
+            "parent_id",
+            parent_id,
+            filters={"job_status": "FAILED"}
+        ) or []
+
+        for item in failed_items:
+            item_id = item["id"]["S"]
+            if get_shard_index(item_id) == shard_index:
+                report_failed_batch(
+                    job_status_table,
+                    parent_id,
+                    item_id,
+                    self._get_results_s3_uri(),
+                    item.get("error_message", {}).get("S", "")
+                )
 
-        if current_batch:
-            if len(current_batch) >= minimum_records:
-                batches.append(current_batch)
-            elif batches:
-                batches[-1].extend(current_batch)
+    def _get_results_s3_uri(self) -> str:
+        """Get the S3 URI of the folder Bedrock and the real-time classifier write results to."""
+        return f"s3://{self.config.get('output_bucket_name')}/{self.config.get('results_folder_name')}/"
 
-        return batches
-    
-    def save_batches(
-        self,
-        batches: List[List[str]]
-    ) -> None:
+    def _create_deduplicator(self, parent_id: str, shard_index: int = 0) -> Optional[RecordDeduplicator]:
         """
-        Save processed batches to S3.
+        Create the deduplication stage for a file, if enabled.
+
+        Duplicates are recorded in an alias sidecar under the dedup folder. Cached
+        results are written as batch 0 of the parent, directly in the Bedrock output
+        folder, so batchResultsProcessing picks them up like any other batch.
 
         Args:
-            batches (List[List[str]]): Processed batches
+            parent_id: ID grouping the batches of the file
+            shard_index: Index of the shard, 0 if the file is not sharded
 
         """
-        try:
-            output_bucket = self.config.get("output_bucket_name")
-            output_folder = self.config.get("output_folder_name")
-            parent_id = generate_random_id()
-
-            for i, batch in enumerate(batches):
-                batch_content = "\n".join(batch)
-
-                file_id = f"{parent_id}-batch{i+1}"
-                current_date = get_current_date_short_str()
-                base_filename = f"{output_folder}/{current_date}/{parent_id}/{file_id}.jsonl"
-                
-                save_file_to_s3(
-                    batch_content,
-                    output_bucket,
-                    base_filename
-                )
+        if self.config.get("deduplication_enabled", "true").lower() != "true":
+            return None
 
-                create_job_status_record(
-                    self.config.get("job_status_table"),
-                    file_id,
-                    "DRAFT"
-                )
+        output_bucket = self.config.get("output_bucket_name")
+        dedup_folder = self.config.get("dedup_folder_name")
+        results_folder = self.config.get("results_folder_name")
+        job_status_table = self.config.get("job_status_table")
+        cached_file_id = get_batch_item_id(parent_id, 0, shard_index)
+        # Unique per shard, as the results are matched to their item by this ID
+        cached_job_id = f"cached-{get_shard_item_id(parent_id, shard_index)}"
+        alias_extension = get_compression_extension(self.config.get("internal_compression"))
+
+        return RecordDeduplicator(
+            prompt=self.config.get("prompt"),
+            model_id=self.config.get("bedrock_model_id"),
+            bucket_name=output_bucket,
+            alias_key=f"{dedup_folder}/{parent_id}/{get_alias_file_name(shard_index)}{alias_extension}",
+            cached_key=f"{results_folder}/{cached_job_id}/{cached_file_id}.jsonl.out",
+            render_model_input=self.model_input_template.render_model_input,
+            register_cached_batch=partial(
+                create_job_status_record,
+                job_status_table,
+                cached_file_id,
+                "RUNNING",
+                {"bedrock_job_short_id": cached_job_id}
+            ),
+            cache_table=self.config.get("result_cache_table") or None
+        )
 
-        except Exception as e:
-            logger.error(f"Error saving batches: {str(e)}")
-            raise
\ No newline at end of file
+    @staticmethod
+    def _log_upload_stats(upload_stats: List[Dict[str, Any]]) -> None:
+        """
+        Log a summary of the batch uploads.
+
+        Args:
+            upload_stats: Upload statistics per batch
+        """
+        if not upload_stats:
+            return
+
+        total_bytes = sum(stats["bytes"] for stats in upload_stats)
+        latencies = [stats["latency"] for stats in upload_stats]
+        logger.info(
+            f"Uploaded {len(upload_stats)} batches, {total_bytes} bytes in total. "
+            f"Upload latency avg: {sum(latencies) / len(latencies):.3f}s, max: {max(latencies):.3f}s"
+        )
@@ -35,6 +35,31 @@ class EnvironmentConfig:
                     raise ValueError(f"Missing required environment variable: {var}")
                 self.config[var.lower()] = value.strip()
 
+            optional_vars = {
+                "UPLOAD_CONCURRENCY": "4",
+                "BATCHING_MODE": "records",
+                "BATCH_MAX_TOKENS": "0",
+                "BATCH_MAX_BYTES": "0",
+                "BATCH_MAX_RECORDS": "50000",
+                "BEDROCK_MODEL_ID": "",
+                "DEDUPLICATION_ENABLED": "true",
+                "DEDUP_FOLDER_NAME": "dedup_data",
+                "RESULTS_FOLDER_NAME": "output_data",
+                "RESULT_CACHE_TABLE": "",
+                "XLSX_SHEET_CONCURRENCY": "1",
+                "RECORD_CONCURRENCY": "1",
+                "SHARD_SIZE_MB": "0",
+                "SHARD_QUEUE_URL": "",
+                "INTERNAL_COMPRESSION": "gzip",
+                "REALTIME_RECORD_THRESHOLD": "0",
+                "REALTIME_MAX_CONCURRENCY": "8",
+                "REALTIME_REQUESTS_PER_SECOND": "0",
+                "REALTIME_MAX_RETRIES": "5"
+            }
+
+            for var, default in optional_vars.items():
+                self.config[var.lower()] = os.environ.get(var, default).strip()
+
             self._validate_bucket_arn()
             self._process_field_names()
             logger.info("Environment configuration loaded successfully")
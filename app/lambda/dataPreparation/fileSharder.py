@@ -0,0 +1,174 @@
+import json
+import os
+import logging
+from typing import Any, Dict, List, Optional
+from utils.compression import get_compression
+from utils.s3 import get_s3_object_size, read_s3_bytes
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+SHARDABLE_EXTENSIONS = ["csv", "json", "jsonl"]
+BOUNDARY_PROBE_SIZE = 64 * 1024
+CSV_SCAN_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class FileSharder:
+    """
+    Splits large CSV and JSON Lines objects into byte ranges of whole records.
+
+    The ranges start right after a line break, so every shard can be parsed on
+    its own. JSON Lines boundaries are found with small ranged reads around the
+    target offsets. A CSV field may hold line breaks inside quotes, so CSV
+    boundaries are found by scanning the object once in chunks and counting
+    the quote characters, and a CSV range only starts after a line break that
+    lies outside quotes. A trailing range shorter than half a shard is merged
+    into the one before.
+    """
+
+    def __init__(self, shard_size: int):
+        """
+        Initialize FileSharder.
+
+        Args:
+            shard_size (int): Target size of a shard in bytes
+        """
+        self.shard_size = shard_size
+
+    def plan(self, bucket_name: str, file_key: str, file_extension: str) -> Optional[Dict[str, Any]]:
+        """
+        Plan the shards of an input file.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) of the file in S3
+            file_extension (str): File extension
+
+        Returns:
+            Optional[Dict[str, Any]]: Byte ranges of the shards and the CSV header line,
+                or None if the file is prepared in one piece
+        """
+        # Byte ranges of a compressed object cannot be decompressed on their own
+        if not self.shard_size or file_extension not in SHARDABLE_EXTENSIONS or get_compression(file_key):
+            return None
+
+        size = get_s3_object_size(bucket_name, file_key)
+        if size <= self.shard_size:
+            return None
+
+        head = read_s3_bytes(bucket_name, file_key, 0, min(size, BOUNDARY_PROBE_SIZE))
+        header = None
+
+        if file_extension == "csv":
+            header_end = head.find(b"\n")
+            if header_end < 0:
+                logger.warning(f"No line break in the first {len(head)} bytes of {file_key}, not sharding it")
+                return None
+            header = head[:header_end + 1].decode("utf-8")
+        elif not self._is_json_lines(head):
+            logger.info(f"{file_key} is not in JSON Lines format, preparing it in one piece")
+            return None
+
+        if file_extension == "csv":
+            boundaries = self._find_csv_boundaries(bucket_name, file_key, size)
+        else:
+            boundaries = [0]
+            target = self.shard_size
+            while target < size:
+                boundary = self._find_line_start(bucket_name, file_key, target, size)
+                if boundary is None or size - boundary < self.shard_size // 2:
+                    break
+                boundaries.append(boundary)
+                target = boundary + self.shard_size
+
+        if len(boundaries) == 1:
+            return None
+
+        ranges = list(zip(boundaries, boundaries[1:] + [size]))
+        logger.info(f"Split {file_key} of {size} bytes into {len(ranges)} shards")
+        return {"ranges": ranges, "header": header}
+
+    @staticmethod
+    def _is_json_lines(head: bytes) -> bool:
+        """
+        Check whether a file holds one JSON object per line.
+
+        Args:
+            head: First bytes of the file
+        """
+        first_line = head.split(b"\n", 1)[0].strip().lstrip(b"\xef\xbb\xbf")
+        if not first_line.startswith(b"{"):
+            return False
+
+        try:
+            json.loads(first_line)
+            return True
+        except ValueError:
+            return False
+
+    @staticmethod
+    def _find_line_start(bucket_name: str, file_key: str, offset: int, size: int) -> Optional[int]:
+        """
+        Find the first line start at or after an offset.
+
+        Args:
+            bucket_name: Name of the S3 bucket
+            file_key: Key (path) of the file in S3
+            offset: Offset to search from
+            size: Size of the object in bytes
+        """
+        # The line break may be the byte right before the offset
+        position = offset - 1
+        while position < size:
+            probe = read_s3_bytes(bucket_name, file_key, position, min(size, position + BOUNDARY_PROBE_SIZE))
+            line_break = probe.find(b"\n")
+            if line_break >= 0:
+                return position + line_break + 1
+            position += len(probe)
+
+        return None
+
+    def _find_csv_boundaries(self, bucket_name: str, file_key: str, size: int) -> List[int]:
+        """
+        Find the shard boundaries of a CSV file at line breaks outside quoted fields.
+
+        An escaped quote is written as two quote characters, so a line break
+        lies outside quotes exactly when an even number of quote characters
+        comes before it.
+
+        Args:
+            bucket_name: Name of the S3 bucket
+            file_key: Key (path) of the file in S3
+            size: Size of the object in bytes
+        """
+        boundaries = [0]
+        target = self.shard_size
+        quote_count = 0
+        position = 0
+
+        while position < size:
+            chunk = read_s3_bytes(bucket_name, file_key, position, min(size, position + CSV_SCAN_CHUNK_SIZE))
+            cursor = 0
+            while True:
+                # The line break may be the byte right before the target
+                search_start = max(cursor, target - 1 - position)
+                line_break = chunk.find(b"\n", search_start) if search_start < len(chunk) else -1
+                if line_break < 0:
+                    quote_count += chunk.count(b'"', cursor)
+                    break
+
+                quote_count += chunk.count(b'"', cursor, line_break)
+                cursor = line_break + 1
+                if quote_count % 2:
+                    continue
+
+                boundary = position + cursor
+                if size - boundary < self.shard_size // 2:
+                    return boundaries
+                boundaries.append(boundary)
+                target = boundary + self.shard_size
+            position += len(chunk)
+
+        return boundaries
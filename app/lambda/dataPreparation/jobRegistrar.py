@@ -0,0 +1,133 @@
+import os
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+from utils.dynamodb import BATCH_WRITE_MAX_ITEMS, create_job_status_records, delete_job_status_records
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+
+class JobRegistrar:
+    """
+    Registers DRAFT job status records in blocks of 25 with BatchWriteItem.
+
+    The number of batches of a file is only known once it is fully read, so
+    IDs are registered a block ahead: the first batch of a block registers
+    the whole block in the background, and the uploads of the block wait for
+    it. Records always exist before their batch file lands in S3. IDs of the
+    last block that end up unused are deleted when the registrar is closed,
+    and the IDs of every batch that was not uploaded when it is aborted.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        get_item_id: Callable[[int], str],
+        block_size: int = BATCH_WRITE_MAX_ITEMS,
+        extra_attributes: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Initialize JobRegistrar.
+
+        Args:
+            table_name (str): Name of the job status table
+            get_item_id (Callable[[int], str]): Returns the item ID of the batch at an index
+            block_size (int): Number of IDs registered per BatchWriteItem call
+            extra_attributes (Optional[Dict[str, Any]]): Additional attributes to store on every record
+        """
+        self.table_name = table_name
+        self.get_item_id = get_item_id
+        self.block_size = block_size
+        self.extra_attributes = extra_attributes
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-registrar")
+        self._blocks: Dict[int, Future] = {}
+        self._uploaded: Set[int] = set()
+        self._lock = threading.Lock()
+
+    def register(self, index: int) -> Future:
+        """
+        Make sure the block holding a batch index is being registered.
+
+        Args:
+            index (int): Zero-based index of the batch
+
+        Returns:
+            Future: Completes once the record of the batch exists
+        """
+        block = index // self.block_size
+        with self._lock:
+            if block not in self._blocks:
+                item_ids = self._get_block_ids(block)
+                self._blocks[block] = self._executor.submit(
+                    create_job_status_records, self.table_name, item_ids, "DRAFT", self.extra_attributes
+                )
+            return self._blocks[block]
+
+    def mark_uploaded(self, index: int) -> None:
+        """
+        Record that the batch at an index was uploaded, so its record is kept on abort.
+
+        Args:
+            index (int): Zero-based index of the batch
+        """
+        with self._lock:
+            self._uploaded.add(index)
+
+    def close(self, used_count: int) -> None:
+        """
+        Wait for the registrations and delete the IDs that were not used.
+
+        Args:
+            used_count (int): Number of batches that were saved
+        """
+        try:
+            for future in self._blocks.values():
+                future.result()
+
+            unused_ids = [
+                item_id
+                for block in self._blocks
+                for index, item_id in enumerate(self._get_block_ids(block), start=block * self.block_size)
+                if index >= used_count
+            ]
+            if unused_ids:
+                delete_job_status_records(self.table_name, unused_ids)
+        finally:
+            self._executor.shutdown(wait=True)
+
+    def abort(self) -> None:
+        """Stop registering new blocks and delete the records of the batches that were not uploaded."""
+        for future in self._blocks.values():
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+        # A retry looks up the record of the first batch to find the batches
+        # this attempt uploaded, so it is kept if any of them was
+        unused_ids = [
+            item_id
+            for block, future in self._blocks.items()
+            if not future.cancelled()
+            for index, item_id in enumerate(self._get_block_ids(block), start=block * self.block_size)
+            if index not in self._uploaded and (index > 0 or not self._uploaded)
+        ]
+        if not unused_ids:
+            return
+
+        try:
+            delete_job_status_records(self.table_name, unused_ids)
+        except Exception as e:
+            logger.error(f"Error deleting {len(unused_ids)} DRAFT job status records of an aborted preparation: {e}")
+
+    def _get_block_ids(self, block: int) -> List[str]:
+        """
+        Get the item IDs of a block.
+
+        Args:
+            block (int): Index of the block
+        """
+        start = block * self.block_size
+        return [self.get_item_id(index) for index in range(start, start + self.block_size)]
@@ -0,0 +1,109 @@
+import json
+import os
+import logging
+import uuid
+from json.encoder import encode_basestring
+from typing import Any, Dict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+ANTHROPIC_VERSION = "bedrock-2023-05-31"
+MAX_TOKENS = 2048
+
+
+def encode_value(value: Any) -> str:
+    """
+    Serialize a value exactly like json.dumps(value, ensure_ascii=False).
+
+    Strings, the common case, go straight to the C string encoder of the json
+    module, which skips the type dispatch of json.dumps.
+
+    Args:
+        value (Any): Value to serialize
+    """
+    if type(value) is str:
+        return encode_basestring(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+class ModelInputTemplate:
+    """
+    Pre-serialized Bedrock batch input line with slots for the record ID and text.
+
+    The envelope of a request, i.e. the Anthropic version, the token limit and
+    the escaped system prompt, is the same for every record of a file. It is
+    serialized once, and each line is built by joining the constant fragments
+    with the escaped ID and text of the record. The lines are byte for byte
+    the same as serializing the whole request with json.dumps.
+    """
+
+    def __init__(self, prompt: str):
+        """
+        Initialize ModelInputTemplate.
+
+        Args:
+            prompt (str): System prompt sent with every record
+        """
+        self.prompt = prompt
+
+        # Random placeholders cannot occur in the serialized prompt
+        id_slot = encode_value(f"record-id-{uuid.uuid4().hex}")
+        text_slot = encode_value(f"record-text-{uuid.uuid4().hex}")
+        line = json.dumps({
+            "recordId": json.loads(id_slot),
+            "modelInput": self.create_model_input(json.loads(text_slot))
+        }, ensure_ascii=False)
+
+        self._line_prefix, _, rest = line.partition(id_slot)
+        self._input_prefix, _, self._input_suffix = rest.partition(text_slot)
+        # The model input object starts right after the modelInput key
+        model_input_start = self._input_prefix.index('"modelInput": ') + len('"modelInput": ')
+        self._line_middle = self._input_prefix[:model_input_start]
+        self._input_prefix = self._input_prefix[model_input_start:]
+        # The line closes the model input object and then the record object
+        self._input_suffix = self._input_suffix[:-1]
+
+    def create_model_input(self, text_content: Any) -> Dict[str, Any]:
+        """
+        Create the model input of a record as a dictionary.
+
+        Args:
+            text_content (Any): Text to classify
+        """
+        return {
+            "anthropic_version": ANTHROPIC_VERSION,
+            "max_tokens": MAX_TOKENS,
+            "messages": [{
+                "role": "user",
+                "content": [{
+                    "type": "text",
+                    "text": text_content
+                }]
+            }],
+            "system": self.prompt
+        }
+
+    def render_model_input(self, text_content: Any) -> str:
+        """
+        Serialize the model input of a record.
+
+        Args:
+            text_content (Any): Text to classify
+        """
+        return f"{self._input_prefix}{encode_value(text_content)}{self._input_suffix}"
+
+    def render(self, record_id: Any, text_content: Any) -> str:
+        """
+        Serialize the batch input line of a record.
+
+        Args:
+            record_id (Any): ID of the record
+            text_content (Any): Text to classify
+        """
+        return (
+            f"{self._line_prefix}{encode_value(record_id)}{self._line_middle}"
+            f"{self._input_prefix}{encode_value(text_content)}{self._input_suffix}}}"
+        )
@@ -0,0 +1,298 @@
+import json
+import os
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+from boto3 import client
+from utils.aws_clients import CLIENT_CONFIG
+from utils.dynamodb import get_error_code
+from dataPreparation.modelInputTemplate import encode_value
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+bedrock_runtime_client = client("bedrock-runtime", config=CLIENT_CONFIG)
+
+# Error codes of InvokeModel worth another attempt
+THROTTLING_ERROR_CODES = ["ThrottlingException", "TooManyRequestsException", "ServiceQuotaExceededException"]
+RETRYABLE_ERROR_CODES = THROTTLING_ERROR_CODES + [
+    "ModelTimeoutException",
+    "ModelNotReadyException",
+    "ServiceUnavailableException",
+    "InternalServerException"
+]
+# Error codes of a single record, the other errors fail the whole file
+RECORD_ERROR_CODES = ["ValidationException", "ModelErrorException"]
+# Status codes written to the output file, as Bedrock batch inference reports them
+ERROR_STATUS_CODES = {
+    "ThrottlingException": "429",
+    "TooManyRequestsException": "429",
+    "ServiceQuotaExceededException": "429",
+    "ModelTimeoutException": "408",
+    "ModelNotReadyException": "503",
+    "ServiceUnavailableException": "503",
+    "InternalServerException": "500",
+    "ValidationException": "400",
+    "ModelErrorException": "424"
+}
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20
+
+
+class TokenBucket:
+    """
+    Limits the rate of requests shared by several threads.
+
+    Every request takes a token; tokens are refilled at a constant rate up to
+    the capacity, which allows short bursts. A thread that finds the bucket
+    empty reserves the next token and sleeps until it is refilled.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize TokenBucket.
+
+        Args:
+            rate (float): Tokens added per second, 0 for no limit
+            capacity (Optional[float]): Maximum number of tokens, one second of tokens by default
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """
+        Take a token, waiting until one is available.
+
+        Returns:
+            float: Seconds waited
+        """
+        if self.rate <= 0:
+            return 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits the number of requests in flight, adapting the limit to throttling.
+
+    The limit grows by one for every window of successful requests and is
+    halved when a request is throttled (additive increase, multiplicative
+    decrease), so it settles just below the concurrency the quota allows.
+    """
+
+    def __init__(self, max_limit: int, initial_limit: Optional[int] = None):
+        """
+        Initialize AdaptiveConcurrencyLimiter.
+
+        Args:
+            max_limit (int): Highest number of requests in flight
+            initial_limit (Optional[int]): Number of requests in flight at the start, half of the maximum by default
+        """
+        self.max_limit = max(1, max_limit)
+        self.limit = float(min(self.max_limit, initial_limit or -(-self.max_limit // 2)))
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self) -> None:
+        """Wait until a request can be sent within the current limit."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled: bool = False) -> None:
+        """
+        Complete a request and adapt the limit.
+
+        Args:
+            throttled (bool): Whether the request was throttled
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class RealtimeClassifier:
+    """
+    Classifies records on demand with InvokeModel instead of a batch inference job.
+
+    Records are sent from a pool of threads. A token bucket caps the request
+    rate, and the number of requests in flight adapts to throttling. Throttled
+    and failed requests are retried with exponential backoff and jitter. The
+    results are returned as lines in the Bedrock batch output format, so the
+    output file is processed like the one of a batch inference job. Records
+    that still fail are written with their error, and batchResultsProcessing
+    reports them like the errors of a batch job.
+    """
+
+    def __init__(
+        self,
+        model_id: str,
+        max_concurrency: int = 8,
+        requests_per_second: float = 0,
+        max_retries: int = 5
+    ):
+        """
+        Initialize RealtimeClassifier.
+
+        Args:
+            model_id (str): Bedrock model ID
+            max_concurrency (int): Highest number of requests in flight
+            requests_per_second (float): Highest request rate, 0 for no limit
+            max_retries (int): Retries of a throttled or failed request
+        """
+        self.model_id = model_id
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.rate_limiter = TokenBucket(requests_per_second)
+        self.concurrency_limiter = AdaptiveConcurrencyLimiter(self.max_concurrency)
+        self.requests = 0
+        self.retries = 0
+        self.throttles = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def iter_output_lines(self, records: Iterable[Tuple[Any, str]]) -> Iterator[str]:
+        """
+        Classify records and yield their output lines in the order of the records.
+
+        Args:
+            records (Iterable[Tuple[Any, str]]): Record IDs with their serialized model inputs
+        """
+        start = time.perf_counter()
+        count = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="invoke-model") as executor:
+            for line in executor.map(lambda record: self._classify(*record), records):
+                count += 1
+                yield line
+
+        logger.info(
+            f"Classified {count} records with InvokeModel in {time.perf_counter() - start:.1f}s: "
+            f"{self.requests} requests, {self.retries} retries, {self.throttles} throttled, "
+            f"{self.failures} failed, concurrency limit {self.concurrency_limiter.limit:.1f}"
+        )
+
+    def _classify(self, record_id: Any, model_input: str) -> str:
+        """
+        Send one record to the model, retrying throttled and failed requests.
+
+        Args:
+            record_id: ID of the record
+            model_input: Serialized model input of the record
+        """
+        attempt = 0
+        while True:
+            model_output, error = self._invoke(model_input)
+            if error is None:
+                return self._format_output(record_id, model_input, model_output)
+
+            error_code = get_error_code(error)
+            # Errors without a code, e.g. connection errors, are retried as well
+            retryable = error_code is None or error_code in RETRYABLE_ERROR_CODES
+            if retryable and attempt < self.max_retries:
+                self._count(retries=1)
+                time.sleep(random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt)))
+                attempt += 1
+                continue
+
+            # Errors such as missing permissions would fail every record
+            if not retryable and error_code not in RECORD_ERROR_CODES:
+                raise error
+
+            self._count(failures=1)
+            logger.warning(f"Failed to classify record {record_id} after {attempt + 1} attempts: {error}")
+            return self._format_error(record_id, model_input, error_code, str(error))
+
+    def _invoke(self, model_input: str) -> Tuple[Optional[Dict[str, Any]], Optional[Exception]]:
+        """
+        Send one request within the rate and concurrency limits.
+
+        Args:
+            model_input: Serialized model input of the record
+
+        Returns:
+            Tuple[Optional[Dict[str, Any]], Optional[Exception]]: Response body, or the error of the request
+        """
+        self.rate_limiter.acquire()
+        self.concurrency_limiter.acquire()
+        throttled = False
+        try:
+            response = bedrock_runtime_client.invoke_model(
+                modelId=self.model_id,
+                body=model_input,
+                contentType="application/json",
+                accept="application/json"
+            )
+            return json.loads(response["body"].read()), None
+        except Exception as e:
+            throttled = get_error_code(e) in THROTTLING_ERROR_CODES
+            return None, e
+        finally:
+            self.concurrency_limiter.release(throttled)
+            self._count(requests=1, throttles=int(throttled))
+
+    def _count(self, **counts: int) -> None:
+        """
+        Add to the request statistics.
+
+        Args:
+            counts: Increments per statistic, e.g. retries=1
+        """
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    @staticmethod
+    def _format_output(record_id: Any, model_input: str, model_output: Dict[str, Any]) -> str:
+        """
+        Format a result like a line of a Bedrock batch output file.
+
+        Args:
+            record_id: ID of the record
+            model_input: Serialized model input of the record
+            model_output: Response body of InvokeModel
+        """
+        return (
+            f'{{"recordId": {encode_value(record_id)}, "modelInput": {model_input}, '
+            f'"modelOutput": {json.dumps(model_output, ensure_ascii=False)}}}'
+        )
+
+    @staticmethod
+    def _format_error(record_id: Any, model_input: str, error_code: Optional[str], error_message: str) -> str:
+        """
+        Format a failed record like a line of a Bedrock batch output file.
+
+        Args:
+            record_id: ID of the record
+            model_input: Serialized model input of the record
+            error_code: AWS error code, None for errors without one
+            error_message: Error message
+        """
+        error = {"errorCode": ERROR_STATUS_CODES.get(error_code, "500"), "errorMessage": error_message}
+        return (
+            f'{{"recordId": {encode_value(record_id)}, "modelInput": {model_input}, '
+            f'"error": {json.dumps(error, ensure_ascii=False)}}}'
+        )
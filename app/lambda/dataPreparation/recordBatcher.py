@@ -0,0 +1,215 @@
+import os
+import logging
+import statistics
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+BATCHING_MODE_RECORDS = "records"
+BATCHING_MODE_TOKENS = "tokens"
+
+
+class RecordBatcher:
+    """
+    Cuts a stream of JSONL lines into Bedrock batch files.
+
+    In "records" mode a batch is closed after a fixed number of records. In
+    "tokens" mode batches are packed up to a token and byte budget, capped by a
+    maximum record count. Both modes respect the minimum number of records per
+    batch required by Bedrock.
+    """
+
+    def __init__(
+        self,
+        minimum_records: int,
+        batch_size: int,
+        mode: str = BATCHING_MODE_RECORDS,
+        max_tokens: int = 0,
+        max_bytes: int = 0,
+        max_records: int = 0
+    ):
+        """
+        Initialize RecordBatcher.
+
+        Args:
+            minimum_records (int): Minimum number of records per batch
+            batch_size (int): Number of records per batch in "records" mode
+            mode (str): Batching mode, "records" or "tokens"
+            max_tokens (int): Estimated token budget per batch in "tokens" mode
+            max_bytes (int): Byte budget per batch in "tokens" mode
+            max_records (int): Maximum number of records per batch in "tokens" mode
+        """
+        self.minimum_records = minimum_records
+        self.batch_size = batch_size
+        self.mode = mode
+        self.max_tokens = max_tokens
+        self.max_bytes = max_bytes
+        self.max_records = max_records
+        self.total_records = 0
+        self._batch_sizes: List[Tuple[int, int, int]] = []
+
+    def validate(self) -> bool:
+        """Validate the batching configuration."""
+        if self.mode not in [BATCHING_MODE_RECORDS, BATCHING_MODE_TOKENS]:
+            logger.warning(f"Unsupported batching mode: {self.mode}")
+            return False
+
+        limit = self.batch_size if self.mode == BATCHING_MODE_RECORDS else self.max_records
+        if limit < self.minimum_records:
+            logger.warning(
+                f"Batch size ({limit}) is less than minimum required ({self.minimum_records})"
+            )
+            return False
+
+        return True
+
+    def iter_batches(self, items: Iterable[Tuple[str, int]]) -> Iterator[List[str]]:
+        """
+        Cut weighted JSONL lines into batches on the fly.
+
+        At most two batches are held in memory: the one being filled and the
+        last full one, which is kept back so that a trailing batch smaller than
+        the minimum can still be merged into it.
+
+        Args:
+            items (Iterable[Tuple[str, int]]): JSONL lines with their estimated token counts
+        """
+        if not self.validate():
+            return
+
+        pending_batch: List[Tuple[str, int, int]] = []
+        current_batch: List[Tuple[str, int, int]] = []
+        current_tokens = 0
+        current_bytes = 0
+
+        for line, tokens in items:
+            size = self._line_size(line)
+            self.total_records += 1
+
+            if current_batch and self._is_full(current_batch, current_tokens + tokens, current_bytes + size):
+                if pending_batch:
+                    yield self._emit(pending_batch)
+                pending_batch = current_batch
+                current_batch = []
+                current_tokens = 0
+                current_bytes = 0
+
+            if self.max_tokens and tokens > self.max_tokens:
+                logger.warning(
+                    f"Record with {tokens} estimated tokens exceeds the batch token budget ({self.max_tokens})"
+                )
+
+            current_batch.append((line, tokens, size))
+            current_tokens += tokens
+            current_bytes += size
+
+            if self.mode == BATCHING_MODE_RECORDS and len(current_batch) >= self.batch_size:
+                if pending_batch:
+                    yield self._emit(pending_batch)
+                pending_batch = current_batch
+                current_batch = []
+                current_tokens = 0
+                current_bytes = 0
+
+        if self.total_records < self.minimum_records:
+            logger.warning(
+                f"Total records ({self.total_records}) is less than minimum required ({self.minimum_records})"
+            )
+            return
+
+        if current_batch and len(current_batch) < self.minimum_records:
+            pending_batch, current_batch = self._merge_tail(pending_batch, current_batch)
+
+        if pending_batch:
+            yield self._emit(pending_batch)
+        if current_batch:
+            yield self._emit(current_batch)
+
+        logger.info(f"Processed {self.total_records} records")
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Summarize the size distribution of the emitted batches.
+
+        Returns:
+            Dict[str, Any]: Batch count and min/mean/p50/p95/max of records, tokens and bytes per batch
+        """
+        summary: Dict[str, Any] = {"batches": len(self._batch_sizes)}
+        if not self._batch_sizes:
+            return summary
+
+        for index, name in enumerate(["records", "tokens", "bytes"]):
+            values = sorted(sizes[index] for sizes in self._batch_sizes)
+            summary[name] = {
+                "min": values[0],
+                "mean": round(statistics.mean(values), 1),
+                "p50": values[len(values) // 2],
+                "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+                "max": values[-1],
+            }
+
+        return summary
+
+    def _is_full(self, batch: List[Tuple[str, int, int]], tokens: int, size: int) -> bool:
+        """
+        Check whether the next record has to start a new batch in "tokens" mode.
+
+        A batch is never closed before it holds the minimum number of records.
+
+        Args:
+            batch: Records of the current batch
+            tokens: Estimated tokens of the batch including the next record
+            size: Bytes of the batch including the next record
+        """
+        if self.mode != BATCHING_MODE_TOKENS or len(batch) < self.minimum_records:
+            return False
+
+        return (
+            len(batch) >= self.max_records
+            or (self.max_tokens and tokens > self.max_tokens)
+            or (self.max_bytes and size > self.max_bytes)
+        )
+
+    def _merge_tail(
+        self,
+        pending_batch: List[Tuple[str, int, int]],
+        tail_batch: List[Tuple[str, int, int]]
+    ) -> Tuple[List[Tuple[str, int, int]], List[Tuple[str, int, int]]]:
+        """
+        Handle a trailing batch smaller than the minimum.
+
+        In "records" mode the tail is appended to the previous batch. In
+        "tokens" mode records are moved from the previous batch to the tail
+        instead, so neither batch grows past its budget.
+
+        Args:
+            pending_batch: Last full batch
+            tail_batch: Trailing batch with fewer records than the minimum
+        """
+        if self.mode == BATCHING_MODE_TOKENS and len(pending_batch) + len(tail_batch) >= 2 * self.minimum_records:
+            split_at = len(pending_batch) - (self.minimum_records - len(tail_batch))
+            return pending_batch[:split_at], pending_batch[split_at:] + tail_batch
+
+        return pending_batch + tail_batch, []
+
+    def _emit(self, batch: List[Tuple[str, int, int]]) -> List[str]:
+        """
+        Record the size of a batch and return its lines.
+
+        Args:
+            batch: Lines with their token and byte counts
+        """
+        self._batch_sizes.append((
+            len(batch),
+            sum(tokens for _, tokens, _ in batch),
+            sum(size for _, _, size in batch)
+        ))
+        return [line for line, _, _ in batch]
+
+    @staticmethod
+    def _line_size(line: str) -> int:
+        """Bytes taken by a line in the batch file, including the separator."""
+        return (len(line) if line.isascii() else len(line.encode("utf-8"))) + 1
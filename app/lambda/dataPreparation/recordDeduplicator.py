@@ -0,0 +1,236 @@
+import json
+import os
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from utils.compression import get_compression
+from utils.content_hash import compute_content_digest
+from utils.dynamodb import get_cached_results
+from utils.s3 import S3StreamWriter
+from dataPreparation.modelInputTemplate import encode_value
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+CACHE_LOOKUP_BATCH_SIZE = 100
+
+
+class RecordDeduplicator:
+    """
+    Collapses duplicate classification requests and serves cached results.
+
+    Records are keyed by a hash of their normalized text, the prompt and the
+    model ID. Only the first occurrence of a text is sent to the model; later
+    occurrences are written to an alias sidecar so batchResultsProcessing can
+    fan the result out to them. Texts found in the result cache are written
+    straight to a Bedrock-shaped .out file instead of being sent at all.
+    Only a 16-byte digest per unique text is kept in memory.
+
+    Bedrock rejects batches with fewer records than its minimum, so while
+    fewer unique texts than the minimum were sent, duplicates and cached
+    records are held back. If the input ends short of the minimum, they are
+    sent to the model again to make up the difference.
+    """
+
+    def __init__(
+        self,
+        prompt: str,
+        model_id: str,
+        bucket_name: str,
+        alias_key: str,
+        cached_key: str,
+        render_model_input: Callable[[Any], str],
+        register_cached_batch: Callable[[], None],
+        cache_table: Optional[str] = None
+    ):
+        """
+        Initialize RecordDeduplicator.
+
+        Args:
+            prompt (str): System prompt used for classification
+            model_id (str): Bedrock model ID
+            bucket_name (str): Bucket for the alias sidecar and the cached results file
+            alias_key (str): Key of the alias sidecar, compressed if it ends in .gz or .zst
+            cached_key (str): Key of the .out file holding cached results
+            render_model_input (Callable): Serializes the Bedrock model input for a text
+            register_cached_batch (Callable): Registers the cached results file before it is written
+            cache_table (Optional[str]): Name of the result cache table, if enabled
+        """
+        self.prompt = prompt
+        self.model_id = model_id
+        self.bucket_name = bucket_name
+        self.alias_key = alias_key
+        self.cached_key = cached_key
+        self.render_model_input = render_model_input
+        self.register_cached_batch = register_cached_batch
+        self.cache_table = cache_table
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.padded = 0
+        self._sent: Set[bytes] = set()
+        self._cached: Dict[bytes, str] = {}
+        self._alias_writer: Optional[S3StreamWriter] = None
+        self._cached_writer: Optional[S3StreamWriter] = None
+        self._held: List[Tuple[bytes, str, Any, Optional[str]]] = []
+        self._minimum_records = 0
+
+    def iter_unique(self, records: Iterable[Tuple[str, Any]], minimum_records: int = 0) -> Iterator[Tuple[str, Any]]:
+        """
+        Yield only the records that have to be sent to the model.
+
+        When the result cache is enabled, new texts are looked up in groups of
+        100 with a single BatchGetItem call.
+
+        Args:
+            records (Iterable[Tuple[str, Any]]): Record IDs with their texts
+            minimum_records (int): Records yielded at least, as far as the input has them,
+                when any record is sent to the model
+        """
+        self._minimum_records = minimum_records
+        pending: Dict[bytes, List[Tuple[str, Any]]] = {}
+
+        for record_id, text in records:
+            digest = compute_content_digest(text, self.prompt, self.model_id)
+
+            if digest in self._sent:
+                self._collapse(digest, record_id, text)
+            elif digest in self._cached:
+                self._collapse(digest, record_id, text, self._cached[digest])
+            elif not self.cache_table:
+                self._sent.add(digest)
+                self.misses += 1
+                yield record_id, text
+            else:
+                pending.setdefault(digest, []).append((record_id, text))
+                if len(pending) >= CACHE_LOOKUP_BATCH_SIZE:
+                    yield from self._resolve(pending)
+                    pending = {}
+
+            if self._held and self.misses >= self._minimum_records:
+                self._release_held()
+
+        if pending:
+            yield from self._resolve(pending)
+
+        # Cached records alone need no batch, so they are only sent to make up a short batch
+        if self.misses:
+            padding = self._held[:max(0, self._minimum_records - self.misses)]
+            self._held = self._held[len(padding):]
+            for _, record_id, text, _ in padding:
+                self.padded += 1
+                yield record_id, text
+        self._release_held()
+
+    def close_aliases(self) -> None:
+        """Complete the upload of the alias sidecar before results of the sent records can be processed."""
+        if self._alias_writer is not None:
+            self._alias_writer.close()
+            self._alias_writer = None
+
+    def close(self) -> None:
+        """Complete the sidecar uploads."""
+        for writer in [self._alias_writer, self._cached_writer]:
+            if writer is not None:
+                writer.close()
+
+        logger.info(
+            f"Deduplication: {self.misses} records sent to the model, "
+            f"{self.duplicates} duplicates collapsed, {self.hits} cache hits, "
+            f"{self.padded} records sent again to reach the batch minimum"
+        )
+
+    def abort(self) -> None:
+        """Discard the sidecar uploads."""
+        self._held = []
+        for writer in [self._alias_writer, self._cached_writer]:
+            if writer is not None:
+                writer.abort()
+
+    def _resolve(self, pending: Dict[bytes, List[Tuple[str, Any]]]) -> Iterator[Tuple[str, Any]]:
+        """
+        Look up pending texts in the result cache and yield the misses.
+
+        Args:
+            pending: Records per digest waiting for a cache lookup
+        """
+        cached = get_cached_results(self.cache_table, [digest.hex() for digest in pending])
+
+        for digest, entries in pending.items():
+            model_output = cached.get(digest.hex())
+            first_id, first_text = entries[0]
+
+            if model_output is not None:
+                self._cached[digest] = model_output
+                for record_id, text in entries:
+                    self._collapse(digest, record_id, text, model_output)
+                continue
+
+            self._sent.add(digest)
+            self.misses += 1
+            yield first_id, first_text
+
+            for record_id, text in entries[1:]:
+                self._collapse(digest, record_id, text)
+
+    def _collapse(self, digest: bytes, record_id: str, text: Any, model_output: Optional[str] = None) -> None:
+        """
+        Write a duplicate or cached record, or hold it back while the model may get too few records.
+
+        Args:
+            digest: Content digest of the text
+            record_id: ID of the record
+            text: Text of the record
+            model_output: Cached raw model output text, None for a duplicate
+        """
+        if len(self._held) < self._minimum_records - self.misses:
+            self._held.append((digest, record_id, text, model_output))
+        elif model_output is None:
+            self._write_alias(digest, record_id)
+        else:
+            self._write_cached(record_id, text, model_output)
+
+    def _release_held(self) -> None:
+        """Write the duplicate and cached records that were held back."""
+        held, self._held = self._held, []
+        for digest, record_id, text, model_output in held:
+            if model_output is None:
+                self._write_alias(digest, record_id)
+            else:
+                self._write_cached(record_id, text, model_output)
+
+    def _write_alias(self, digest: bytes, record_id: str) -> None:
+        """
+        Record a duplicate of a text that is sent to the model.
+
+        Args:
+            digest: Content digest of the text
+            record_id: ID of the duplicate record
+        """
+        if self._alias_writer is None:
+            self._alias_writer = S3StreamWriter(self.bucket_name, self.alias_key, compression=get_compression(self.alias_key))
+
+        line = json.dumps({"content_hash": digest.hex(), "recordId": record_id}, ensure_ascii=False)
+        self._alias_writer.write(f"{line}\n".encode("utf-8"))
+        self.duplicates += 1
+
+    def _write_cached(self, record_id: str, text: Any, model_output: str) -> None:
+        """
+        Write a cached result in the Bedrock batch output format.
+
+        Args:
+            record_id: ID of the record
+            text: Text of the record
+            model_output: Cached raw model output text
+        """
+        if self._cached_writer is None:
+            self.register_cached_batch()
+            self._cached_writer = S3StreamWriter(self.bucket_name, self.cached_key)
+
+        line = (
+            f'{{"recordId": {encode_value(record_id)}, "modelInput": {self.render_model_input(text)}, '
+            f'"modelOutput": {{"content": [{{"type": "text", "text": {encode_value(model_output)}}}]}}}}'
+        )
+        self._cached_writer.write(f"{line}\n".encode("utf-8"))
+        self.hits += 1
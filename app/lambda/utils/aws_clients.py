@@ -0,0 +1,19 @@
+import os
+import logging
+from botocore.config import Config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+# Connections kept open per client, shared by the threads of an invocation
+MAX_POOL_CONNECTIONS = int(os.environ.get("AWS_MAX_POOL_CONNECTIONS", "32"))
+
+# Configuration of the clients the modules create at import, so warm
+# invocations of an execution environment reuse their open connections
+CLIENT_CONFIG = Config(
+    max_pool_connections=MAX_POOL_CONNECTIONS,
+    tcp_keepalive=True,
+    retries={"mode": "standard"}
+)
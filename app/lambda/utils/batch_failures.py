@@ -0,0 +1,56 @@
+import json
+import os
+import logging
+from utils.dynamodb import complete_parent_batch
+from utils.s3 import save_file_to_s3
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+# Folder of the results folder holding the reports of failed batches
+FAILED_BATCHES_FOLDER = "failed_batches"
+
+def report_failed_batch(
+    table_name: str,
+    parent_id: str,
+    item_id: str,
+    output_s3_uri: str,
+    error_message: str
+) -> None:
+    """
+    Count a batch that failed for good on its parent.
+
+    A failed batch writes no output file, so the parent would never be
+    finalized if it was the last batch of the parent to end. In that case a
+    report of the failed batch is written to the results folder, where it
+    triggers batchResultsProcessing to finalize the parent like the output
+    file of the last batch does. A batch that was already counted is not
+    reported again, and a batch whose shard is still pending is counted by the
+    preparation of the shard once it ends.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+        item_id (str): ID of the failed batch
+        output_s3_uri (str): S3 URI of the results folder, e.g. s3://bucket/output_data/
+        error_message (str): Reason the batch failed
+    """
+    counts = complete_parent_batch(table_name, parent_id, item_id, failed=True)
+    if counts is None:
+        return
+
+    logger.error(
+        f"Batch {item_id} failed, {counts['failed_count']} of {counts['total_count']} batches "
+        f"of parent {parent_id} failed: {error_message}"
+    )
+    if counts["completed_count"] + counts["failed_count"] < counts["total_count"]:
+        return
+
+    bucket_name, _, prefix = output_s3_uri[len("s3://"):].partition("/")
+    save_file_to_s3(
+        json.dumps({"batch": item_id, "error_message": error_message}),
+        bucket_name,
+        f"{prefix}{FAILED_BATCHES_FOLDER}/{parent_id}/{item_id}.jsonl.out"
+    )
@@ -0,0 +1,218 @@
+import os
+import io
+import logging
+import zlib
+from typing import Iterable, Iterator, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_EXTENSIONS = {
+    COMPRESSION_GZIP: ".gz",
+    COMPRESSION_ZSTD: ".zst"
+}
+# Window bits of zlib for the gzip container
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+# Data compressed into one zstd frame, frames are concatenated in the object
+ZSTD_FRAME_SIZE = 4 * 1024 * 1024
+ZSTD_LEVEL = 3
+
+def get_compression(file_key: str) -> Optional[str]:
+    """
+    Get the compression of an object from the extension of its key.
+
+    Args:
+        file_key (str): Key (path) of the file, e.g. input/requests.csv.gz
+
+    Returns:
+        Optional[str]: "gzip" or "zstd", or None for uncompressed files
+    """
+    lowered = file_key.lower()
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if lowered.endswith(extension):
+            return compression
+    return None
+
+def strip_compression_extension(file_key: str) -> str:
+    """
+    Remove the compression extension from a key, e.g. requests.csv.gz becomes requests.csv.
+
+    Args:
+        file_key (str): Key (path) of the file
+
+    """
+    compression = get_compression(file_key)
+    if not compression:
+        return file_key
+    return file_key[:-len(COMPRESSION_EXTENSIONS[compression])]
+
+def get_compression_extension(compression: Optional[str]) -> str:
+    """
+    Get the extension appended to the keys of files written with a compression.
+
+    Args:
+        compression (Optional[str]): "gzip", "zstd", or None/"none" for uncompressed files
+
+    """
+    if not compression or compression == "none":
+        return ""
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unsupported compression: {compression}")
+    return COMPRESSION_EXTENSIONS[compression]
+
+def iter_decompressed(chunks: Iterable[bytes], compression: str, chunk_size: int) -> Iterator[bytes]:
+    """
+    Decompress a stream of compressed chunks.
+
+    Only the current chunk and its decompressed content are held in memory.
+    Concatenated gzip members and zstd frames are decoded one after another.
+
+    Args:
+        chunks (Iterable[bytes]): Compressed chunks, e.g. of an S3 object body
+        compression (str): "gzip" or "zstd"
+        chunk_size (int): Number of decompressed bytes yielded at a time for zstd
+
+    """
+    if compression == COMPRESSION_GZIP:
+        yield from _iter_gunzipped(chunks)
+    elif compression == COMPRESSION_ZSTD:
+        yield from _iter_unzstd(chunks, chunk_size)
+    else:
+        raise ValueError(f"Unsupported compression: {compression}")
+
+def _iter_gunzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Decompress gzip content with zlib, member by member.
+
+    Args:
+        chunks (Iterable[bytes]): Compressed chunks
+
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    in_member = False
+    for chunk in chunks:
+        while chunk:
+            in_member = True
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+            if not decompressor.eof:
+                break
+            chunk = decompressor.unused_data
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+            in_member = False
+
+    if in_member:
+        raise EOFError("Compressed file ended before the end of the gzip stream")
+
+def _iter_unzstd(chunks: Iterable[bytes], chunk_size: int) -> Iterator[bytes]:
+    """
+    Decompress zstd content with the codec bundled with pyarrow.
+
+    Args:
+        chunks (Iterable[bytes]): Compressed chunks
+        chunk_size (int): Number of decompressed bytes read at a time
+
+    """
+    import pyarrow as pa
+
+    stream = pa.CompressedInputStream(pa.PythonFile(ChunkReader(chunks), mode="r"), COMPRESSION_ZSTD)
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            return
+        yield data
+
+
+class ChunkReader(io.RawIOBase):
+    """Read-only file-like object over a stream of byte chunks."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        """
+        Initialize ChunkReader.
+
+        Args:
+            chunks (Iterable[bytes]): Chunks returned by the reads, in order
+        """
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        """
+        Fill a buffer from the current chunk, pulling the next chunk when it is used up.
+
+        Args:
+            buffer: Buffer to fill
+        """
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class StreamCompressor:
+    """
+    Compresses content that is written in pieces, for streaming uploads.
+
+    gzip content is compressed as one stream with zlib. zstd content is
+    compressed into frames of a few MiB with the codec bundled with pyarrow,
+    which readers decode as one stream.
+    """
+
+    def __init__(self, compression: str):
+        """
+        Initialize StreamCompressor.
+
+        Args:
+            compression (str): "gzip" or "zstd"
+        """
+        get_compression_extension(compression)
+        self.compression = compression
+        self._compressor = zlib.compressobj(wbits=GZIP_WBITS) if compression == COMPRESSION_GZIP else None
+        self._codec = None
+        self._pending = bytearray()
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress a piece of content, returning the compressed bytes that are ready.
+
+        Args:
+            data (bytes): Content to compress
+        """
+        if self._compressor is not None:
+            return self._compressor.compress(data)
+
+        self._pending.extend(data)
+        if len(self._pending) < ZSTD_FRAME_SIZE:
+            return b""
+        return self._compress_frame()
+
+    def flush(self) -> bytes:
+        """Compress the remaining content and end the stream."""
+        if self._compressor is not None:
+            return self._compressor.flush()
+        return self._compress_frame() if self._pending else b""
+
+    def _compress_frame(self) -> bytes:
+        """Compress the pending content into one zstd frame."""
+        if self._codec is None:
+            import pyarrow as pa
+            self._codec = pa.Codec(COMPRESSION_ZSTD, compression_level=ZSTD_LEVEL)
+
+        frame = self._codec.compress(bytes(self._pending), asbytes=True)
+        self._pending = bytearray()
+        return frame
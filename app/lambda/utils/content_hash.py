@@ -0,0 +1,47 @@
+import os
+import logging
+import hashlib
+from typing import Any
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+def normalize_text(text: Any) -> str:
+    """
+    Normalize text before hashing by collapsing all whitespace runs.
+
+    Args:
+        text (Any): Text to normalize
+
+    """
+    return " ".join(str(text).split())
+
+def compute_content_digest(text: Any, prompt: str, model_id: str) -> bytes:
+    """
+    Compute a compact digest identifying a classification request.
+
+    Two requests share a digest only if they send the same normalized text with
+    the same prompt to the same model.
+
+    Args:
+        text (Any): Text to classify
+        prompt (str): System prompt used for classification
+        model_id (str): Bedrock model ID
+
+    """
+    content = "\x1f".join([model_id or "", prompt or "", normalize_text(text)])
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+def compute_content_hash(text: Any, prompt: str, model_id: str) -> str:
+    """
+    Compute the hex content hash used as the result cache key.
+
+    Args:
+        text (Any): Text to classify
+        prompt (str): System prompt used for classification
+        model_id (str): Bedrock model ID
+
+    """
+    return compute_content_digest(text, prompt, model_id).hex()
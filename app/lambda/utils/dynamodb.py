@@ -1,16 +1,33 @@
 import datetime
 import os
 import logging
+import time
 from typing import Any, Dict, List, Optional, Tuple
-from utils.id_generator import get_current_date_full_str
+from utils.id_generator import get_current_date_full_str, get_current_timestamp
+from utils.sharding import get_shard_index, get_shard_item_id
 from boto3 import client
+from utils.aws_clients import CLIENT_CONFIG
 
 # Configure logging
 logger = logging.getLogger(__name__)
 log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
-dynamodb_client = client("dynamodb")
+dynamodb_client = client("dynamodb", config=CLIENT_CONFIG)
+
+BATCH_WRITE_MAX_ITEMS = 25
+BATCH_GET_MAX_KEYS = 100
+MAX_BATCH_RETRIES = 5
+
+# Job statuses in the order a job moves through them. Terminal statuses can be
+# reached from any of them and are never left.
+JOB_STATUS_ORDER = ["DRAFT", "QUEUED", "SUBMITTING", "RUNNING"]
+TERMINAL_JOB_STATUSES = ["COMPLETED", "FAILED"]
+
+# Global secondary indexes of the job status table
+PARENT_ID_INDEX = "parent_id-index"
+BEDROCK_JOB_SHORT_ID_INDEX = "bedrock_job_short_id-index"
+JOB_STATUS_INDEX = "job_status-index"
 
 def get_dynamodb_value(value: Any) -> Dict[str, Any]:
     """
@@ -28,7 +45,7 @@ def get_dynamodb_value(value: Any) -> Dict[str, Any]:
         return {"BOOL": value}
     elif isinstance(value, (int, float)):
         return {"N": str(value)}
-    elif isinstance(value, datetime):
+    elif isinstance(value, datetime.datetime):
         return {"S": value.isoformat()}
     elif isinstance(value, list):
         return {"L": [get_dynamodb_value(item) for item in value]}
@@ -39,6 +56,16 @@ def get_dynamodb_value(value: Any) -> Dict[str, Any]:
     else:
         raise ValueError(f"Unsupported type for DynamoDB: {type(value)}")
 
+def get_error_code(error: Exception) -> Optional[str]:
+    """
+    Get the AWS error code of a failed client call.
+
+    Args:
+        error (Exception): Exception raised by the client
+
+    """
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
 def construct_filter_expression(filters: Dict[str, Any]) -> Tuple[str, Dict[str, Dict[str, Any]], Dict[str, str]]:
     """
     Construct DynamoDB filter expression dynamically.
@@ -65,8 +92,8 @@ def construct_filter_expression(filters: Dict[str, Any]) -> Tuple[str, Dict[str,
         # Build attribute values dictionary
         attr_values[value_placeholder] = get_dynamodb_value(value)
     
-    # Combine all update parts with SET
-    filter_expression = " ".join(update_parts)
+    # Combine all filter parts with AND
+    filter_expression = " AND ".join(update_parts)
     
     return filter_expression, attr_values, attr_names
 
@@ -124,7 +151,12 @@ def get_job_status_record(table_name: str, item_id: str) -> Optional[Dict]:
         logger.error(f"Error reading from DynamoDB: {e}")
         return None
 
-def create_job_status_record(table_name: str, item_id: str, job_status: str) -> None:
+def create_job_status_record(
+    table_name: str,
+    item_id: str,
+    job_status: str,
+    extra_attributes: Optional[Dict[str, Any]] = None
+) -> None:
     """
     Write item to DynamoDB.
 
@@ -132,25 +164,86 @@ def create_job_status_record(table_name: str, item_id: str, job_status: str) ->
         table_name (str): Name of the DynamoDB table
         item_id (str): ID of the item to create
         job_status (str): Status of the job
+        extra_attributes (Optional[Dict[str, Any]]): Additional attributes to store on the item
     """
     try:
-        current_date = get_current_date_full_str()
-        parent_id = item_id.partition("-batch")[0]
-
         dynamodb_client.put_item(
             TableName=table_name,
-            Item={
-                "id": {"S": item_id},
-                "parent_id": {"S": parent_id},
-                "created_date": {"S": current_date},
-                "job_status": {"S": job_status},
-            }
+            Item=_build_job_status_item(item_id, job_status, extra_attributes)
         )
         logger.info(f"Successfully created job status item to DynamoDB table {table_name} with id {item_id}")
     except Exception as e:
         logger.error(f"Error creating job status record in DynamoDB table: {e}")
         raise
 
+def create_job_status_records(
+    table_name: str,
+    item_ids: List[str],
+    job_status: str,
+    extra_attributes: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Write items to DynamoDB in bulk with BatchWriteItem.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        item_ids (List[str]): IDs of the items to create
+        job_status (str): Status of the jobs
+        extra_attributes (Optional[Dict[str, Any]]): Additional attributes to store on every item
+    """
+    try:
+        batch_write_items(table_name, [
+            {"PutRequest": {"Item": _build_job_status_item(item_id, job_status, extra_attributes)}}
+            for item_id in item_ids
+        ])
+        logger.info(f"Successfully created {len(item_ids)} job status items in DynamoDB table {table_name}")
+    except Exception as e:
+        logger.error(f"Error creating job status records in DynamoDB table: {e}")
+        raise
+
+def delete_job_status_records(table_name: str, item_ids: List[str]) -> None:
+    """
+    Delete items from DynamoDB in bulk with BatchWriteItem.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        item_ids (List[str]): IDs of the items to delete
+    """
+    try:
+        batch_write_items(table_name, [
+            {"DeleteRequest": {"Key": {"id": {"S": item_id}}}}
+            for item_id in item_ids
+        ])
+        logger.info(f"Successfully deleted {len(item_ids)} job status items from DynamoDB table {table_name}")
+    except Exception as e:
+        logger.error(f"Error deleting job status records from DynamoDB table: {e}")
+        raise
+
+def _build_job_status_item(
+    item_id: str,
+    job_status: str,
+    extra_attributes: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Build a new job status item.
+
+    Args:
+        item_id (str): ID of the item
+        job_status (str): Status of the job
+        extra_attributes (Optional[Dict[str, Any]]): Additional attributes to store on the item
+
+    """
+    item = {
+        "id": {"S": item_id},
+        "parent_id": {"S": item_id.partition("-batch")[0]},
+        "created_date": {"S": get_current_date_full_str()},
+        "job_status": {"S": job_status},
+    }
+    for key, value in (extra_attributes or {}).items():
+        item[key] = get_dynamodb_value(value)
+
+    return item
+
 def update_job_status_record(
     table_name: str,
     item_id: str,
@@ -189,40 +282,68 @@ def update_job_status_record(
 def update_or_create_job_status_record(
         table_name: str,
         item_id: str,
-        updates: Dict[str, Any]
-) -> None:
+        updates: Dict[str, Any],
+        forward_only: bool = False
+) -> bool:
     """
     Create or update DynamoDB record for the given job status.
 
+    The record is upserted with a single UpdateItem call. created_date and
+    parent_id are only set when the record is created.
+
     Args:
         table_name (str): Name of the DynamoDB table
         item_id (str): ID of the item to update or create
         updates (Dict[str, Any]): Dictionary of fields to update
+        forward_only (bool): Only apply the update if it moves job_status forward,
+            e.g. never from COMPLETED back to RUNNING
+
+    Returns:
+        bool: False if the update was skipped because the status would not move forward
     """
     try:
-        # Check if the item exists
-        response = get_job_status_record(table_name, item_id)
-
-        if "Item" in response:
-            update_expr, attr_values, attr_names = construct_update_expression(updates)
-            logger.info(f"Job status record is found.")
-            update_job_status_record(
-                table_name,
-                item_id,
-                update_expr,
-                attr_values,
-                attr_names
-            )
-        else:
-            logger.info("Job status record is not found, creating a new one...")
-            create_job_status_record(
-                table_name,
-                item_id,
-                updates.get("job_status", "DRAFT")
-            )
+        update_expr, attr_values, attr_names = construct_update_expression(dict(updates))
+        update_expr += (
+            ", #created_date = if_not_exists(#created_date, :created_date)"
+            ", #parent_id = if_not_exists(#parent_id, :parent_id)"
+        )
+        attr_names.update({"#created_date": "created_date", "#parent_id": "parent_id"})
+        attr_values.update({
+            ":created_date": {"S": get_current_date_full_str()},
+            ":parent_id": {"S": item_id.partition("-batch")[0]}
+        })
+
+        update_params = {
+            "TableName": table_name,
+            "Key": {"id": {"S": item_id}},
+            "UpdateExpression": update_expr,
+            "ExpressionAttributeValues": attr_values,
+            "ExpressionAttributeNames": attr_names
+        }
+
+        job_status = updates.get("job_status")
+        if forward_only and job_status:
+            previous_statuses = get_previous_job_statuses(job_status)
+            placeholders = [f":previous_status{i}" for i in range(len(previous_statuses))]
+            condition = "attribute_not_exists(#job_status)"
+            if placeholders:
+                condition += f" OR #job_status IN ({', '.join(placeholders)})"
+            update_params["ConditionExpression"] = condition
+            attr_values.update({
+                placeholder: {"S": status}
+                for placeholder, status in zip(placeholders, previous_statuses)
+            })
+
+        dynamodb_client.update_item(**update_params)
+        logger.info(f"Successfully upserted job status record in DynamoDB table {table_name} with id {item_id}")
+        return True
 
     except Exception as e:
-        raise e
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Skipped job status update of {item_id} to {updates.get('job_status')}, the status would not move forward")
+            return False
+        logger.error(f"Error upserting job status record in DynamoDB table: {e}")
+        raise
 
 def get_job_status_items(
     table_name: str,
@@ -296,4 +417,720 @@ def get_job_status_items(
 
     except Exception as e:
         logger.error(f"Error reading from DynamoDB: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def get_previous_job_statuses(job_status: str) -> List[str]:
+    """
+    Get the statuses a job can move to the given status from.
+
+    Args:
+        job_status (str): Target status
+
+    """
+    if job_status in TERMINAL_JOB_STATUSES:
+        return list(JOB_STATUS_ORDER)
+
+    if job_status not in JOB_STATUS_ORDER:
+        return []
+
+    return JOB_STATUS_ORDER[:JOB_STATUS_ORDER.index(job_status)]
+
+def register_parent_shards(table_name: str, parent_id: str, shard_item_ids: List[str]) -> Optional[Dict[str, int]]:
+    """
+    Create the aggregate record of a parent with the shards still being prepared.
+
+    The aggregate item uses the parent ID as its key and tracks how many batches
+    the parent has and how many of them are completed. It has no parent_id
+    attribute, so it never shows up among the batches of the parent. Every
+    shard is counted as one pending batch and listed as pending until its
+    batches are counted. A file that is not split is registered as shard 0.
+    A parent is registered once, so a retried preparation of the same file
+    does not count its shards twice.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+        shard_item_ids (List[str]): IDs the shards are counted under
+
+    Returns:
+        Optional[Dict[str, int]]: Total and completed batch counts after the update, or None
+            if the parent was already registered
+    """
+    try:
+        response = dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression=(
+                "ADD #total_count :count, #pending_shards :shard_item_ids "
+                "SET #record_type = :record_type, "
+                "#created_date = if_not_exists(#created_date, :created_date)"
+            ),
+            ConditionExpression="attribute_not_exists(#total_count)",
+            ExpressionAttributeNames={
+                "#total_count": "total_count",
+                "#pending_shards": "pending_shards",
+                "#record_type": "record_type",
+                "#created_date": "created_date"
+            },
+            ExpressionAttributeValues={
+                ":count": {"N": str(len(shard_item_ids))},
+                ":shard_item_ids": {"SS": shard_item_ids},
+                ":record_type": {"S": "parent"},
+                ":created_date": {"S": get_current_date_full_str()}
+            },
+            ReturnValues="ALL_NEW"
+        )
+        counts = _get_parent_counts(response["Attributes"])
+        logger.info(f"Registered {len(shard_item_ids)} shards for parent {parent_id}: {counts}")
+        return counts
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Shards of parent {parent_id} are already registered")
+            return None
+        logger.error(f"Error registering shards for parent {parent_id}: {e}")
+        raise
+
+def complete_parent_batch(
+    table_name: str,
+    parent_id: str,
+    item_id: str,
+    failed: bool = False
+) -> Optional[Dict[str, int]]:
+    """
+    Count a batch as completed on the aggregate record of its parent.
+
+    The update is a single conditional UpdateItem, so concurrent completions
+    never lose a count and a redelivered completion of the same batch is not
+    counted twice. Exactly one caller sees completed_count and failed_count
+    together reach total_count. A batch is not counted while its shard is
+    still pending, as it is not part of total_count yet.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+        item_id (str): ID of the completed batch
+        failed (bool): Count the batch in failed_count, as it ended without results
+
+    Returns:
+        Optional[Dict[str, int]]: Batch counts after the update, or None if the batch was
+            already counted, its shard is pending or the parent has no aggregate record
+    """
+    count_name = "failed" if failed else "completed"
+    try:
+        condition = (
+            "attribute_exists(#total_count) AND NOT contains(#completed_batches, :item_id) "
+            "AND NOT contains(#failed_batches, :item_id)"
+        )
+        attr_names = {
+            "#total_count": "total_count",
+            "#count": f"{count_name}_count",
+            "#batches": f"{count_name}_batches",
+            "#completed_batches": "completed_batches",
+            "#failed_batches": "failed_batches"
+        }
+        attr_values = {
+            ":one": {"N": "1"},
+            ":item_ids": {"SS": [item_id]},
+            ":item_id": {"S": item_id}
+        }
+        shard_index = get_shard_index(item_id)
+        if shard_index is not None:
+            condition += " AND NOT contains(#pending_shards, :shard_item_id)"
+            attr_names["#pending_shards"] = "pending_shards"
+            attr_values[":shard_item_id"] = {"S": get_shard_item_id(parent_id, shard_index)}
+
+        response = dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression="ADD #count :one, #batches :item_ids",
+            ConditionExpression=condition,
+            ExpressionAttributeNames=attr_names,
+            ExpressionAttributeValues=attr_values,
+            ReturnValues="ALL_NEW"
+        )
+        return _get_parent_counts(response["Attributes"])
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Batch {item_id} is already counted, pending or parent {parent_id} has no aggregate record")
+            return None
+        logger.error(f"Error completing batch {item_id} of parent {parent_id}: {e}")
+        raise
+
+def complete_parent_shard(table_name: str, parent_id: str, shard_item_id: str, batch_count: int) -> Optional[Dict[str, int]]:
+    """
+    Count the batches of a prepared shard and release the placeholder of the shard.
+
+    When an input file is split into shards, every shard is registered on the
+    parent as one pending batch before the shards are sent out, so the parent
+    cannot complete while a shard is still being prepared. The batches of the
+    shard and the release of its placeholder are counted in one conditional
+    UpdateItem, so a redelivered shard is not counted twice. A file that is
+    not split is counted the same way, as shard 0.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+        shard_item_id (str): ID the placeholder of the shard is counted under
+        batch_count (int): Number of batches the shard created
+
+    Returns:
+        Optional[Dict[str, int]]: Total and completed batch counts after the update, or None
+            if the shard was already counted
+    """
+    try:
+        response = dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression=(
+                "ADD #total_count :batch_count, #completed_count :one, #completed_batches :item_ids "
+                "DELETE #pending_shards :item_ids"
+            ),
+            ConditionExpression="attribute_exists(#total_count) AND NOT contains(#completed_batches, :item_id)",
+            ExpressionAttributeNames={
+                "#total_count": "total_count",
+                "#completed_count": "completed_count",
+                "#completed_batches": "completed_batches",
+                "#pending_shards": "pending_shards"
+            },
+            ExpressionAttributeValues={
+                ":batch_count": {"N": str(batch_count)},
+                ":one": {"N": "1"},
+                ":item_ids": {"SS": [shard_item_id]},
+                ":item_id": {"S": shard_item_id}
+            },
+            ReturnValues="ALL_NEW"
+        )
+        counts = _get_parent_counts(response["Attributes"])
+        logger.info(f"Registered {batch_count} batches of shard {shard_item_id}: {counts}")
+        return counts
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Shard {shard_item_id} is already counted on parent {parent_id}")
+            return None
+        logger.error(f"Error completing shard {shard_item_id} of parent {parent_id}: {e}")
+        raise
+
+def mark_parent_finalized(table_name: str, parent_id: str) -> None:
+    """
+    Record on the aggregate record that a parent has been finalized.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+    """
+    try:
+        dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression="SET #finalized_date = :finalized_date",
+            ConditionExpression="attribute_exists(#total_count)",
+            ExpressionAttributeNames={
+                "#finalized_date": "finalized_date",
+                "#total_count": "total_count"
+            },
+            ExpressionAttributeValues={
+                ":finalized_date": {"S": get_current_date_full_str()}
+            }
+        )
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            return
+        logger.error(f"Error marking parent {parent_id} as finalized: {e}")
+        raise
+
+def claim_parent_retry_round(table_name: str, parent_id: str, max_rounds: int) -> Optional[int]:
+    """
+    Add a re-submission batch to a completed parent.
+
+    The batch is counted in the same conditional UpdateItem that claims the
+    round, so the parent stays open until the re-submitted records are
+    processed, and a repeated finalization cannot claim the same round twice.
+    The claim is timestamped until confirm_parent_retry_round, so the round
+    can be taken over if the batch is never created.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+        max_rounds (int): Maximum number of re-submission rounds per parent
+
+    Returns:
+        Optional[int]: Number of the claimed round, or None if the parent is not
+            complete or has no rounds left
+    """
+    try:
+        response = dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression="SET #retry_claimed_at = :now ADD #total_count :one, #retry_rounds :one",
+            ConditionExpression=(
+                "#completed_count = #total_count AND attribute_not_exists(#finalized_date) "
+                "AND (attribute_not_exists(#retry_rounds) OR #retry_rounds < :max_rounds)"
+            ),
+            ExpressionAttributeNames={
+                "#total_count": "total_count",
+                "#completed_count": "completed_count",
+                "#finalized_date": "finalized_date",
+                "#retry_rounds": "retry_rounds",
+                "#retry_claimed_at": "retry_claimed_at"
+            },
+            ExpressionAttributeValues={
+                ":one": {"N": "1"},
+                ":max_rounds": {"N": str(max_rounds)},
+                ":now": {"N": str(int(get_current_timestamp().timestamp()))}
+            },
+            ReturnValues="UPDATED_NEW"
+        )
+        return int(response["Attributes"]["retry_rounds"]["N"])
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Parent {parent_id} has no re-submission round left")
+            return None
+        logger.error(f"Error claiming a re-submission round for parent {parent_id}: {e}")
+        raise
+
+def take_over_parent_retry_round(table_name: str, parent_id: str, claim_timeout: int) -> Optional[int]:
+    """
+    Renew the claim of a re-submission round whose batch was not confirmed in time.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+        claim_timeout (int): Seconds after which a claim is considered abandoned
+
+    Returns:
+        Optional[int]: Number of the round taken over, or None if the round is not claimed
+            or its claim has not expired yet
+    """
+    now = int(get_current_timestamp().timestamp())
+    try:
+        response = dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression="SET #retry_claimed_at = :now",
+            ConditionExpression="#retry_claimed_at < :expired_before AND attribute_not_exists(#finalized_date)",
+            ExpressionAttributeNames={
+                "#retry_claimed_at": "retry_claimed_at",
+                "#finalized_date": "finalized_date"
+            },
+            ExpressionAttributeValues={
+                ":now": {"N": str(now)},
+                ":expired_before": {"N": str(now - claim_timeout)}
+            },
+            ReturnValues="ALL_NEW"
+        )
+        return int(response["Attributes"]["retry_rounds"]["N"])
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            return None
+        logger.error(f"Error taking over the re-submission round of parent {parent_id}: {e}")
+        raise
+
+def confirm_parent_retry_round(table_name: str, parent_id: str) -> None:
+    """
+    Release the claim of a re-submission round once its batch is created.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+    """
+    try:
+        dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression="REMOVE #retry_claimed_at",
+            ExpressionAttributeNames={"#retry_claimed_at": "retry_claimed_at"}
+        )
+    except Exception as e:
+        logger.error(f"Error confirming the re-submission round of parent {parent_id}: {e}")
+        raise
+
+def release_parent_retry_round(table_name: str, parent_id: str) -> None:
+    """
+    Undo claim_parent_retry_round when the re-submission batch could not be created.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+    """
+    try:
+        dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": parent_id}},
+            UpdateExpression="REMOVE #retry_claimed_at ADD #total_count :minus_one, #retry_rounds :minus_one",
+            ExpressionAttributeNames={
+                "#total_count": "total_count",
+                "#retry_rounds": "retry_rounds",
+                "#retry_claimed_at": "retry_claimed_at"
+            },
+            ExpressionAttributeValues={
+                ":minus_one": {"N": "-1"}
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error releasing the re-submission round of parent {parent_id}: {e}")
+        raise
+
+def get_parent_counts(table_name: str, parent_id: str) -> Optional[Dict[str, int]]:
+    """
+    Read the batch counts of a parent from its aggregate record.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        parent_id (str): Parent ID that groups batches together
+
+    Returns:
+        Optional[Dict[str, int]]: Total, completed and failed batch counts, the failed
+            batches, whether the parent is finalized, whether a re-submission round is claimed and the shards still being
+            prepared, or None if the parent has no aggregate record
+    """
+    response = get_job_status_record(table_name, parent_id)
+    if not response or "total_count" not in response.get("Item", {}):
+        return None
+
+    return _get_parent_counts(response["Item"])
+
+def _get_parent_counts(item: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Extract the batch counts from a parent aggregate item.
+
+    Args:
+        item (Dict[str, Any]): DynamoDB item of the parent
+
+    """
+    return {
+        "total_count": int(item.get("total_count", {}).get("N", "0")),
+        "completed_count": int(item.get("completed_count", {}).get("N", "0")),
+        "failed_count": int(item.get("failed_count", {}).get("N", "0")),
+        "failed_batches": item.get("failed_batches", {}).get("SS", []),
+        "finalized": "finalized_date" in item,
+        "retry_claimed": "retry_claimed_at" in item,
+        "pending_shards": item.get("pending_shards", {}).get("SS", [])
+    }
+
+def query_job_status_items(
+    table_name: str,
+    index_name: str,
+    key_name: str,
+    key_value: Any,
+    filters: Optional[Dict[str, Any]] = None,
+    scan_if_empty: bool = False,
+    max_items: Optional[int] = None
+) -> Optional[List[Dict]]:
+    """
+    Read items sharing a key value through a global secondary index.
+
+    Unlike get_job_status_items, the cost of the lookup does not depend on the
+    size of the table. If the index cannot be queried, the lookup falls back to
+    a Scan. Index reads are eventually consistent, so scan_if_empty can be used
+    to confirm an empty result with a consistent Scan for items written just
+    before the lookup.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        index_name (str): Name of the index keyed by key_name
+        key_name (str): Partition key of the index
+        key_value (Any): Value to look up
+        filters (Optional[Dict[str, Any]]): Additional filters applied to the matching items
+        scan_if_empty (bool): Whether to confirm an empty result with a consistent Scan
+        max_items (Optional[int]): Stop reading once this many items are found, in index order
+
+    """
+    all_filters = {key_name: key_value, **(filters or {})}
+
+    try:
+        items = []
+        last_evaluated_key = None
+        attr_names = {f"#{key_name}": key_name}
+        attr_values = {f":{key_name}": get_dynamodb_value(key_value)}
+
+        query_params = {
+            "TableName": table_name,
+            "IndexName": index_name,
+            "KeyConditionExpression": f"#{key_name} = :{key_name}",
+            "ExpressionAttributeValues": attr_values,
+            "ExpressionAttributeNames": attr_names
+        }
+
+        if filters:
+            filter_expr, filter_values, filter_names = construct_filter_expression(filters)
+            query_params["FilterExpression"] = filter_expr
+            attr_values.update(filter_values)
+            attr_names.update(filter_names)
+
+        while True:
+            if last_evaluated_key:
+                query_params["ExclusiveStartKey"] = last_evaluated_key
+
+            response = dynamodb_client.query(**query_params)
+            items.extend(response.get("Items", []))
+
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key or (max_items and len(items) >= max_items):
+                break
+
+        if max_items:
+            items = items[:max_items]
+
+        logger.info(f"Query on index {index_name} returned {len(items)} items for {key_name} {key_value}")
+
+    except Exception as e:
+        logger.warning(f"Query on index {index_name} failed, falling back to Scan: {e}")
+        return get_job_status_items(table_name, all_filters, consistent_read=True)
+
+    if not items and scan_if_empty:
+        logger.info(f"No items found on index {index_name}, confirming with a consistent Scan")
+        return get_job_status_items(table_name, all_filters, consistent_read=True)
+
+    return items
+
+def count_job_status_items(
+    table_name: str,
+    job_status: str,
+    required_attribute: Optional[str] = None
+) -> int:
+    """
+    Count the items with a job status through the job status index.
+
+    If the index cannot be queried, e.g. while it is still being created,
+    the items are counted with a Scan.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        job_status (str): Status to count
+        required_attribute (Optional[str]): Only count items that have this attribute
+
+    """
+    count = 0
+    last_evaluated_key = None
+    query_params = {
+        "TableName": table_name,
+        "IndexName": JOB_STATUS_INDEX,
+        "KeyConditionExpression": "#job_status = :job_status",
+        "ExpressionAttributeNames": {"#job_status": "job_status"},
+        "ExpressionAttributeValues": {":job_status": {"S": job_status}},
+        "Select": "COUNT"
+    }
+
+    if required_attribute:
+        query_params["FilterExpression"] = "attribute_exists(#required)"
+        query_params["ExpressionAttributeNames"]["#required"] = required_attribute
+
+    try:
+        while True:
+            if last_evaluated_key:
+                query_params["ExclusiveStartKey"] = last_evaluated_key
+
+            response = dynamodb_client.query(**query_params)
+            count += response.get("Count", 0)
+
+            last_evaluated_key = response.get("LastEvaluatedKey")
+            if not last_evaluated_key:
+                return count
+
+    except Exception as e:
+        logger.warning(f"Query on index {JOB_STATUS_INDEX} failed, counting with a Scan: {e}")
+        items = get_job_status_items(table_name, {"job_status": job_status}, consistent_read=True)
+        # An unknown count must not be taken for free job slots
+        if items is None:
+            raise
+        return sum(1 for item in items if not required_attribute or required_attribute in item)
+
+def transition_job_status(
+    table_name: str,
+    item_id: str,
+    from_status: str,
+    updates: Dict[str, Any]
+) -> bool:
+    """
+    Update a job only if it still has the expected status.
+
+    Used to claim a job so that it is handled by a single caller, and to move
+    a job backwards, e.g. from SUBMITTING to QUEUED when it could not be started.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        item_id (str): ID of the item to update
+        from_status (str): Status the job must have
+        updates (Dict[str, Any]): Dictionary of fields to update
+
+    Returns:
+        bool: False if the job no longer had the expected status
+    """
+    try:
+        update_expr, attr_values, attr_names = construct_update_expression(dict(updates))
+        attr_names["#expected_status"] = "job_status"
+        attr_values[":expected_status"] = {"S": from_status}
+
+        dynamodb_client.update_item(
+            TableName=table_name,
+            Key={"id": {"S": item_id}},
+            UpdateExpression=update_expr,
+            ConditionExpression="#expected_status = :expected_status",
+            ExpressionAttributeValues=attr_values,
+            ExpressionAttributeNames=attr_names
+        )
+        return True
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Job {item_id} is no longer {from_status}")
+            return False
+        logger.error(f"Error updating job status of {item_id}: {e}")
+        raise
+
+def acquire_lease(table_name: str, lease_id: str, owner: str, duration_seconds: int) -> bool:
+    """
+    Acquire an expiring lease item, so that only one caller runs a task at a time.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        lease_id (str): ID of the lease item
+        owner (str): Identifier of the caller
+        duration_seconds (int): Seconds after which the lease can be taken over
+
+    """
+    now = int(get_current_timestamp().timestamp())
+    try:
+        dynamodb_client.put_item(
+            TableName=table_name,
+            Item={
+                "id": {"S": lease_id},
+                "lease_owner": {"S": owner},
+                "lease_expires": {"N": str(now + duration_seconds)}
+            },
+            ConditionExpression="attribute_not_exists(#id) OR #lease_expires < :now",
+            ExpressionAttributeNames={"#id": "id", "#lease_expires": "lease_expires"},
+            ExpressionAttributeValues={":now": {"N": str(now)}}
+        )
+        return True
+    except Exception as e:
+        if get_error_code(e) == "ConditionalCheckFailedException":
+            logger.info(f"Lease {lease_id} is held by another caller")
+            return False
+        logger.error(f"Error acquiring lease {lease_id}: {e}")
+        raise
+
+def release_lease(table_name: str, lease_id: str, owner: str) -> None:
+    """
+    Release a lease acquired with acquire_lease.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        lease_id (str): ID of the lease item
+        owner (str): Identifier of the caller
+    """
+    try:
+        dynamodb_client.delete_item(
+            TableName=table_name,
+            Key={"id": {"S": lease_id}},
+            ConditionExpression="#lease_owner = :owner",
+            ExpressionAttributeNames={"#lease_owner": "lease_owner"},
+            ExpressionAttributeValues={":owner": {"S": owner}}
+        )
+    except Exception as e:
+        if get_error_code(e) != "ConditionalCheckFailedException":
+            logger.error(f"Error releasing lease {lease_id}: {e}")
+
+def batch_write_items(table_name: str, requests: List[Dict[str, Any]]) -> None:
+    """
+    Write requests to DynamoDB with BatchWriteItem in groups of 25.
+
+    Unprocessed items are retried with exponential backoff.
+
+    Args:
+        table_name (str): Name of the DynamoDB table
+        requests (List[Dict[str, Any]]): PutRequest/DeleteRequest entries
+    """
+    for start in range(0, len(requests), BATCH_WRITE_MAX_ITEMS):
+        pending = {table_name: requests[start:start + BATCH_WRITE_MAX_ITEMS]}
+
+        for attempt in range(MAX_BATCH_RETRIES + 1):
+            response = dynamodb_client.batch_write_item(RequestItems=pending)
+            pending = response.get("UnprocessedItems") or {}
+            if not pending:
+                break
+
+            if attempt == MAX_BATCH_RETRIES:
+                raise RuntimeError(
+                    f"{len(pending[table_name])} items were not written to DynamoDB table {table_name}"
+                )
+
+            logger.warning(f"Retrying {len(pending[table_name])} unprocessed items for table {table_name}")
+            time.sleep(0.05 * 2 ** attempt)
+
+def get_cached_results(table_name: str, content_hashes: List[str]) -> Dict[str, str]:
+    """
+    Look up classification results in the result cache with BatchGetItem.
+
+    Args:
+        table_name (str): Name of the result cache table
+        content_hashes (List[str]): Content hashes to look up
+
+    Returns:
+        Dict[str, str]: Raw model output text per content hash found in the cache
+    """
+    try:
+        results: Dict[str, str] = {}
+        now = int(get_current_timestamp().timestamp())
+        unique_hashes = list(dict.fromkeys(content_hashes))
+
+        for start in range(0, len(unique_hashes), BATCH_GET_MAX_KEYS):
+            pending = {
+                table_name: {
+                    "Keys": [
+                        {"content_hash": {"S": content_hash}}
+                        for content_hash in unique_hashes[start:start + BATCH_GET_MAX_KEYS]
+                    ],
+                    "ProjectionExpression": "content_hash, model_output, #ttl",
+                    "ExpressionAttributeNames": {"#ttl": "ttl"}
+                }
+            }
+
+            for attempt in range(MAX_BATCH_RETRIES + 1):
+                response = dynamodb_client.batch_get_item(RequestItems=pending)
+
+                for item in response.get("Responses", {}).get(table_name, []):
+                    # Expired items may still be returned until DynamoDB TTL removes them
+                    if "ttl" in item and int(item["ttl"]["N"]) < now:
+                        continue
+                    results[item["content_hash"]["S"]] = item["model_output"]["S"]
+
+                pending = response.get("UnprocessedKeys") or {}
+                if not pending or attempt == MAX_BATCH_RETRIES:
+                    break
+                time.sleep(0.05 * 2 ** attempt)
+
+        return results
+
+    except Exception as e:
+        logger.error(f"Error reading from result cache: {e}")
+        return {}
+
+def put_cached_results(table_name: str, results: Dict[str, str], ttl_days: int) -> None:
+    """
+    Store classification results in the result cache.
+
+    Args:
+        table_name (str): Name of the result cache table
+        results (Dict[str, str]): Raw model output text per content hash
+        ttl_days (int): Number of days the results stay in the cache
+    """
+    try:
+        current_date = get_current_date_full_str()
+        expires_at = int(get_current_timestamp().timestamp()) + ttl_days * 24 * 60 * 60
+
+        batch_write_items(table_name, [
+            {
+                "PutRequest": {
+                    "Item": {
+                        "content_hash": {"S": content_hash},
+                        "model_output": {"S": model_output},
+                        "created_date": {"S": current_date},
+                        "ttl": {"N": str(expires_at)},
+                    }
+                }
+            }
+            for content_hash, model_output in results.items()
+        ])
+        logger.info(f"Stored {len(results)} results in result cache table {table_name}")
+    except Exception as e:
+        logger.error(f"Error writing to result cache: {e}")
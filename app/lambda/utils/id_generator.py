@@ -15,6 +15,24 @@ def generate_random_id() -> str:
     """
     return str(uuid.uuid4())
 
+def generate_parent_id(bucket_name: str, file_key: str, version: str) -> str:
+    """
+    Derive the parent ID of an input file from the S3 object it is read from.
+
+    A redelivered event of the same upload yields the same ID, so a retried
+    preparation writes the batches of the first attempt again instead of a
+    second set of batches.
+
+    Args:
+        bucket_name (str): Name of the input bucket
+        file_key (str): Key (path) of the input file
+        version (str): Sequencer or ETag of the upload
+
+    Returns:
+        str: UUID derived from the object
+    """
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"s3://{bucket_name}/{file_key}#{version}"))
+
 def get_current_timestamp() -> datetime:
     """
     Get current UTC timestamp.
@@ -1,8 +1,11 @@
 import os
+import codecs
 import logging
-from typing import Dict, List, Optional
+import tempfile
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 from boto3 import client
-import pandas as pd
+from utils.aws_clients import CLIENT_CONFIG
+from utils.compression import StreamCompressor, get_compression, iter_decompressed, strip_compression_extension
 import io
 from io import BytesIO
 
@@ -11,7 +14,243 @@ logger = logging.getLogger(__name__)
 log_level = os.environ.get("LOG_LEVEL", "INFO")
 logger.setLevel(log_level)
 
-s3_client = client("s3")
+s3_client = client("s3", config=CLIENT_CONFIG)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DELETE_OBJECTS_MAX_KEYS = 1000
+COPY_PART_SIZE = 1024 * 1024 * 1024
+
+
+class S3StreamWriter(io.RawIOBase):
+    """
+    Write-only file-like object that streams content to S3.
+
+    Data is buffered until a part is full and then sent with a multipart
+    upload, so only one part is held in memory at a time. Content smaller than
+    a single part is sent with one put_object call on close. Ranges of other
+    S3 objects can be appended with copy_from, which copies them server side.
+
+    When extra_args sets a ChecksumAlgorithm, S3 verifies every part and the
+    checksum of the object is available as checksum after close. With a
+    compression, the content is compressed as it is written and
+    bytes_written counts the compressed bytes.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        file_key: str,
+        part_size: int = DEFAULT_PART_SIZE,
+        extra_args: Optional[Dict[str, Any]] = None,
+        compression: Optional[str] = None
+    ) -> None:
+        """
+        Initialize S3StreamWriter.
+
+        Args:
+            bucket_name (str): Name of the S3 bucket
+            file_key (str): Key (path) where the file will be stored in S3
+            part_size (int): Size of each multipart upload part, at least 5 MiB
+            extra_args (Optional[Dict[str, Any]]): Extra arguments for the upload, e.g. ContentType
+            compression (Optional[str]): "gzip" or "zstd" to compress the content, None or "none" to store it as is
+        """
+        super().__init__()
+        self.bucket_name = bucket_name
+        self.file_key = file_key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.extra_args = extra_args or {}
+        self.bytes_written = 0
+        self.checksum: Optional[str] = None
+        self._checksum_field = f"Checksum{self.extra_args['ChecksumAlgorithm']}" if "ChecksumAlgorithm" in self.extra_args else None
+        self._compressor = StreamCompressor(compression) if compression and compression != "none" else None
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts: List[Dict[str, Any]] = []
+        self._completed = False
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: bytes) -> int:
+        """
+        Buffer data and upload every full part.
+
+        Args:
+            data (bytes): Content to append to the object
+        """
+        if self.closed:
+            raise ValueError("I/O operation on closed S3 stream")
+
+        self._append(self._compressor.compress(data) if self._compressor else data)
+        return len(data)
+
+    def copy_from(self, bucket_name: str, file_key: str, start: int, end: int) -> None:
+        """
+        Append a byte range of another S3 object.
+
+        Ranges of at least a minimum part are copied server side with
+        UploadPartCopy. Smaller ranges, and the bytes needed to complete a
+        part that is already buffered, are downloaded instead.
+
+        Args:
+            bucket_name (str): Bucket of the source object
+            file_key (str): Key of the source object
+            start (int): First byte of the range
+            end (int): Byte after the last byte of the range
+        """
+        if self._compressor:
+            raise ValueError("Ranges cannot be copied into a compressed S3 stream")
+
+        if self._buffer and end - start >= MIN_PART_SIZE:
+            fill_end = min(end, start + self.part_size - len(self._buffer))
+            self.write(read_s3_bytes(bucket_name, file_key, start, fill_end))
+            start = fill_end
+
+        if end - start < MIN_PART_SIZE:
+            if end > start:
+                self.write(read_s3_bytes(bucket_name, file_key, start, end))
+            return
+
+        while start < end:
+            part_end = min(end, start + COPY_PART_SIZE)
+            if end - part_end < MIN_PART_SIZE:
+                part_end = end
+            self._upload_part_copy(bucket_name, file_key, start, part_end)
+            self.bytes_written += part_end - start
+            start = part_end
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def close(self) -> None:
+        """Upload the remaining buffer and complete the object."""
+        if self.closed:
+            return
+
+        try:
+            if self._compressor:
+                self._append(self._compressor.flush())
+
+            if self._upload_id is None:
+                response = s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=self.file_key,
+                    Body=bytes(self._buffer),
+                    **self.extra_args
+                )
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                response = s3_client.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.file_key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts}
+                )
+            if self._checksum_field:
+                self.checksum = response.get(self._checksum_field)
+            self._buffer = bytearray()
+            self._completed = True
+            logger.info(f"File uploaded successfully to s3://{self.bucket_name}/{self.file_key}")
+        except Exception as e:
+            logger.error(f"Error saving file to S3: {e}")
+            self.abort()
+            raise
+        finally:
+            super().close()
+
+    def abort(self) -> None:
+        """
+        Abort the multipart upload, if one was started, and discard buffered data.
+
+        An object that was already completed by close is deleted, so a group of
+        files written together can be discarded when a later one fails.
+        """
+        self._buffer = bytearray()
+        if self._completed:
+            try:
+                s3_client.delete_object(Bucket=self.bucket_name, Key=self.file_key)
+                logger.info(f"Deleted s3://{self.bucket_name}/{self.file_key}")
+            except Exception as e:
+                logger.warning(f"Error deleting {self.file_key}: {e}")
+            self._completed = False
+        if self._upload_id is not None:
+            try:
+                s3_client.abort_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=self.file_key,
+                    UploadId=self._upload_id
+                )
+            except Exception as e:
+                logger.warning(f"Error aborting multipart upload for {self.file_key}: {e}")
+            self._upload_id = None
+        super().close()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _append(self, data: bytes) -> None:
+        """Buffer content to upload and send every full part."""
+        self._buffer.extend(data)
+        self.bytes_written += len(data)
+
+        while len(self._buffer) >= self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._upload_part(part)
+
+    def _start_upload(self) -> None:
+        """Start the multipart upload on first use."""
+        if self._upload_id is None:
+            response = s3_client.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=self.file_key,
+                **self.extra_args
+            )
+            self._upload_id = response["UploadId"]
+
+    def _upload_part(self, part: bytes) -> None:
+        """Send one part, starting the multipart upload on first use."""
+        self._start_upload()
+
+        part_number = len(self._parts) + 1
+        checksum_args = {"ChecksumAlgorithm": self.extra_args["ChecksumAlgorithm"]} if self._checksum_field else {}
+        response = s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=self.file_key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            Body=part,
+            **checksum_args
+        )
+        self._add_part(part_number, response)
+
+    def _upload_part_copy(self, bucket_name: str, file_key: str, start: int, end: int) -> None:
+        """Copy a byte range of another object as one part, starting the multipart upload on first use."""
+        self._start_upload()
+
+        part_number = len(self._parts) + 1
+        response = s3_client.upload_part_copy(
+            Bucket=self.bucket_name,
+            Key=self.file_key,
+            UploadId=self._upload_id,
+            PartNumber=part_number,
+            CopySource={"Bucket": bucket_name, "Key": file_key},
+            CopySourceRange=f"bytes={start}-{end - 1}"
+        )
+        self._add_part(part_number, response["CopyPartResult"])
+
+    def _add_part(self, part_number: int, response: Dict[str, Any]) -> None:
+        """Remember an uploaded part for completing the upload."""
+        part = {"ETag": response["ETag"], "PartNumber": part_number}
+        if self._checksum_field:
+            part[self._checksum_field] = response[self._checksum_field]
+        self._parts.append(part)
 
 def save_file_to_s3(file_content: str, bucket_name: str, file_key: str) -> None:
     """
@@ -33,6 +272,32 @@ def save_file_to_s3(file_content: str, bucket_name: str, file_key: str) -> None:
         logger.error(f"Error saving file to S3: {e}")
         raise
 
+def save_lines_to_s3(
+    lines: Iterable[str],
+    bucket_name: str,
+    file_key: str,
+    part_size: int = DEFAULT_PART_SIZE
+) -> int:
+    """
+    Stream newline-separated lines to S3 without joining them into one string.
+
+    Args:
+        lines (Iterable[str]): Lines to upload
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) where the file will be stored in S3
+        part_size (int): Size of each multipart upload part
+
+    Returns:
+        int: Number of bytes uploaded
+    """
+    with S3StreamWriter(bucket_name, file_key, part_size) as writer:
+        separator = b""
+        for line in lines:
+            writer.write(separator + line.encode("utf-8"))
+            separator = b"\n"
+
+    return writer.bytes_written
+
 def read_s3_xlsx_file(bucket: str, key: str) -> List[Dict]:
     """
     Read and parse Excel file from S3.
@@ -42,6 +307,8 @@ def read_s3_xlsx_file(bucket: str, key: str) -> List[Dict]:
         key (str): Key (path) of the Excel file in S3
 
     """
+    import pandas as pd
+
     try:
         response = s3_client.get_object(Bucket=bucket, Key=key)
         excel_data = io.BytesIO(response['Body'].read())
@@ -70,6 +337,37 @@ def read_s3_xlsx_file(bucket: str, key: str) -> List[Dict]:
         logger.error(f"Error reading Excel file from S3: {e}")
         raise
 
+def iter_s3_xlsx_records(
+    bucket_name: str,
+    file_key: str,
+    columns: Optional[List[str]] = None,
+    sheet_concurrency: int = 1
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the records of an Excel file from S3 without loading it with pandas.
+
+    The file is downloaded to a temporary file, because the sheets of the
+    zip archive are read with random access, and parsed row by row.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) of the Excel file in S3
+        columns (Optional[List[str]]): Names of the columns to read, all columns if None
+        sheet_concurrency (int): Number of sheets parsed at the same time
+
+    """
+    from utils.xlsx_reader import iter_xlsx_records
+
+    with tempfile.NamedTemporaryFile(suffix=".xlsx") as local_file:
+        try:
+            s3_client.download_fileobj(bucket_name, file_key, local_file)
+            local_file.flush()
+        except Exception as e:
+            logger.error(f"Error reading Excel file from S3: {e}")
+            raise
+
+        yield from iter_xlsx_records(local_file.name, columns, sheet_concurrency)
+
 def read_s3_file(bucket_name: str, file_key: str) -> Optional[str]:
     """
     Read file content from S3.
@@ -80,16 +378,165 @@ def read_s3_file(bucket_name: str, file_key: str) -> Optional[str]:
 
     """
     try:
-        file_extension = file_key.lower().split('.')[-1]
+        compression = get_compression(file_key)
+        file_extension = strip_compression_extension(file_key).lower().split('.')[-1]
         
-        if file_extension in ["xlsx", "xls"]:
+        if file_extension in ["xlsx", "xls"] and not compression:
             return read_s3_xlsx_file(bucket_name, file_key)
         elif file_extension in ["csv", "json", "out"]:
-            response = s3_client.get_object(Bucket=bucket_name, Key=file_key)
-            return response["Body"].read().decode('utf-8')
+            return "".join(iter_s3_file_chunks(bucket_name, file_key))
         else:
             logger.error(f"Unsupported file type: {file_extension}")
         
     except Exception as e:
         logger.error(f"Error reading S3 file: {e}")
         return None
+
+def read_s3_bytes(bucket_name: str, file_key: str, start: Optional[int] = None, end: Optional[int] = None) -> bytes:
+    """
+    Read the raw content of a binary file, e.g. a Parquet file, from S3.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) of the file in S3
+        start (Optional[int]): First byte to read, if only a range is needed;
+            a negative value reads that many bytes from the end of the file
+        end (Optional[int]): Byte after the last byte to read
+
+    """
+    try:
+        range_args = {}
+        if start is not None and start < 0:
+            range_args["Range"] = f"bytes={start}"
+        elif start is not None or end is not None:
+            range_args["Range"] = f"bytes={start or 0}-{'' if end is None else end - 1}"
+        response = s3_client.get_object(Bucket=bucket_name, Key=file_key, **range_args)
+        return response["Body"].read()
+    except Exception as e:
+        logger.error(f"Error reading S3 file: {e}")
+        raise
+
+def iter_s3_file_chunks(
+    bucket_name: str,
+    file_key: str,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    start: Optional[int] = None,
+    end: Optional[int] = None
+) -> Iterator[str]:
+    """
+    Stream file content from S3 as decoded text chunks.
+
+    The object body is read in chunks and decoded incrementally, so multi-byte
+    characters split across chunk boundaries are handled and the whole object
+    is never held in memory. Objects with a .gz or .zst key are decompressed
+    on the fly.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) of the file in S3
+        chunk_size (int): Number of bytes read from the body at a time
+        start (Optional[int]): First byte to read, from the start if None
+        end (Optional[int]): Byte to stop before, until the end if None
+
+    """
+    compression = get_compression(file_key)
+    try:
+        range_args = {}
+        if start is not None or end is not None:
+            if compression:
+                raise ValueError(f"Byte ranges of the compressed file {file_key} cannot be decoded")
+            range_args["Range"] = f"bytes={start or 0}-{'' if end is None else end - 1}"
+        response = s3_client.get_object(Bucket=bucket_name, Key=file_key, **range_args)
+    except Exception as e:
+        logger.error(f"Error reading S3 file: {e}")
+        raise
+
+    chunks = response["Body"].iter_chunks(chunk_size)
+    if compression:
+        chunks = iter_decompressed(chunks, compression, chunk_size)
+
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+def get_s3_object_size(bucket_name: str, file_key: str) -> int:
+    """
+    Get the size of an S3 object in bytes.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) of the file in S3
+
+    """
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=file_key)["ContentLength"]
+    except Exception as e:
+        logger.error(f"Error reading S3 object metadata: {e}")
+        raise
+
+def get_s3_object_metadata(bucket_name: str, file_key: str) -> Dict[str, str]:
+    """
+    Get the user metadata of an S3 object, without the x-amz-meta- prefix.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        file_key (str): Key (path) of the file in S3
+
+    """
+    try:
+        return s3_client.head_object(Bucket=bucket_name, Key=file_key).get("Metadata", {})
+    except Exception as e:
+        logger.error(f"Error reading S3 object metadata: {e}")
+        raise
+
+def list_s3_objects(bucket_name: str, prefix: str) -> Iterator[Dict[str, Any]]:
+    """
+    List the objects under a prefix with their key, size and ETag.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        prefix (str): Key prefix to list
+
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        yield from page.get("Contents", [])
+
+def list_s3_keys(bucket_name: str, prefix: str) -> Iterator[str]:
+    """
+    List object keys under a prefix.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        prefix (str): Key prefix to list
+
+    """
+    for obj in list_s3_objects(bucket_name, prefix):
+        yield obj["Key"]
+
+def delete_s3_objects(bucket_name: str, file_keys: List[str]) -> None:
+    """
+    Delete objects with as few DeleteObjects calls as possible.
+
+    Args:
+        bucket_name (str): Name of the S3 bucket
+        file_keys (List[str]): Keys of the objects to delete
+
+    """
+    for start in range(0, len(file_keys), DELETE_OBJECTS_MAX_KEYS):
+        response = s3_client.delete_objects(
+            Bucket=bucket_name,
+            Delete={
+                "Objects": [{"Key": key} for key in file_keys[start:start + DELETE_OBJECTS_MAX_KEYS]],
+                "Quiet": True
+            }
+        )
+        errors = response.get("Errors", [])
+        if errors:
+            raise RuntimeError(f"Failed to delete {len(errors)} objects, first error: {errors[0]}")
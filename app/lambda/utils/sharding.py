@@ -0,0 +1,83 @@
+import os
+import logging
+from typing import Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+# Batch numbers reserved for every shard of an input file, so the shards of a
+# parent never pick the same batch ID and the batches keep their input order
+SHARD_BATCH_STRIDE = 1000000
+ALIAS_FILE_NAME = "aliases.json"
+
+def get_batch_item_id(parent_id: str, batch_number: int, shard_index: int = 0) -> str:
+    """
+    Get the ID of a batch of a parent.
+
+    Batch 0 of a shard holds its cached results, the others are sent to Bedrock.
+
+    Args:
+        parent_id (str): Parent ID that groups batches together
+        batch_number (int): Number of the batch within its shard
+        shard_index (int): Index of the shard of the input file, 0 if it was not sharded
+
+    """
+    return f"{parent_id}-batch{shard_index * SHARD_BATCH_STRIDE + batch_number}"
+
+def get_shard_item_id(parent_id: str, shard_index: int) -> str:
+    """
+    Get the ID the pending preparation of a shard is counted under on its parent.
+
+    Args:
+        parent_id (str): Parent ID that groups batches together
+        shard_index (int): Index of the shard
+
+    """
+    return f"{parent_id}-shard{shard_index}"
+
+def get_shard_index(item_id: str) -> Optional[int]:
+    """
+    Get the shard a batch was prepared by.
+
+    Args:
+        item_id (str): ID of the batch, e.g. <parent>-batch1000003
+
+    Returns:
+        Optional[int]: Index of the shard, or None for batches of re-submitted records
+    """
+    suffix = item_id.partition("-batch")[2]
+    if not suffix.isdigit():
+        return None
+    return int(suffix) // SHARD_BATCH_STRIDE
+
+def get_batch_number(item_id: str) -> Optional[int]:
+    """
+    Get the number of a batch within the shard it was prepared by.
+
+    Args:
+        item_id (str): ID of the batch, e.g. <parent>-batch1000003
+
+    Returns:
+        Optional[int]: Number of the batch, or None for batches of re-submitted records
+    """
+    suffix = item_id.partition("-batch")[2]
+    if not suffix.isdigit():
+        return None
+    return int(suffix) % SHARD_BATCH_STRIDE
+
+def get_alias_file_name(shard_index: int) -> str:
+    """
+    Get the name of the alias sidecar of a shard.
+
+    Duplicates are collapsed within a shard, so every shard keeps its own
+    sidecar. Files that were not sharded use the sidecar of shard 0.
+
+    Args:
+        shard_index (int): Index of the shard
+
+    """
+    if not shard_index:
+        return ALIAS_FILE_NAME
+    return f"aliases-shard{shard_index}.json"
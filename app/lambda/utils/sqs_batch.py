@@ -0,0 +1,76 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+from boto3 import client
+from utils.aws_clients import CLIENT_CONFIG
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+sqs_client = client("sqs", config=CLIENT_CONFIG)
+
+# Maximum number of messages of a SendMessageBatch call
+SEND_BATCH_SIZE = 10
+
+def process_sqs_records(
+    records: List[Dict[str, Any]],
+    process_record: Callable[[Dict[str, Any]], None],
+    max_workers: int = 1
+) -> Dict[str, List[Dict[str, str]]]:
+    """
+    Process the messages of an SQS batch in a bounded thread pool.
+
+    A message that raises is reported in batchItemFailures, so the event
+    source mapping only makes the failed messages visible again and deletes
+    the others. The event source needs ReportBatchItemFailures enabled.
+
+    Args:
+        records (List[Dict[str, Any]]): Records of the SQS event
+        process_record (Callable): Function processing one record
+        max_workers (int): Number of records processed at the same time
+
+    Returns:
+        Dict[str, List[Dict[str, str]]]: Response listing the IDs of the failed messages
+    """
+    if not records:
+        return {"batchItemFailures": []}
+
+    with ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(records))),
+        thread_name_prefix="sqs-record"
+    ) as executor:
+        futures = [executor.submit(process_record, record) for record in records]
+
+    failures = []
+    for record, future in zip(records, futures):
+        error = future.exception()
+        if error is not None:
+            logger.error(f"Error processing message {record.get('messageId')}: {error}")
+            failures.append({"itemIdentifier": record["messageId"]})
+
+    if failures:
+        logger.warning(f"{len(failures)} of {len(records)} messages failed and will be retried")
+    return {"batchItemFailures": failures}
+
+def send_sqs_messages(queue_url: str, bodies: List[str]) -> None:
+    """
+    Send messages to an SQS queue, ten per request.
+
+    Args:
+        queue_url (str): URL of the queue
+        bodies (List[str]): Message bodies
+
+    """
+    for start in range(0, len(bodies), SEND_BATCH_SIZE):
+        entries = [
+            {"Id": str(index), "MessageBody": body}
+            for index, body in enumerate(bodies[start:start + SEND_BATCH_SIZE], start)
+        ]
+        response = sqs_client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        if response.get("Failed"):
+            raise RuntimeError(f"Failed to send {len(response['Failed'])} messages to {queue_url}: {response['Failed']}")
+
+    logger.info(f"Sent {len(bodies)} messages to {queue_url}")
@@ -1,7 +1,7 @@
 import json
 import os
 import logging
-from typing import Dict, Optional
+from typing import Any, Dict, Optional
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,13 +23,31 @@ def extract_bucket_from_sqs_message(message: str) -> Optional[Dict[str, str]]:
         
         input_bucket_name = s3_record["bucket"]["name"]
         input_key_name = s3_record["object"]["key"]
+        # The sequencer differs for every upload of a key, unlike the ETag of identical content
+        input_version = s3_record["object"].get("sequencer") or s3_record["object"].get("eTag", "")
         
         logger.info(f"Extracted bucket: {input_bucket_name}, key: {input_key_name}")
         
         return {
             "input_bucket_name": input_bucket_name,
-            "input_key_name": input_key_name
+            "input_key_name": input_key_name,
+            "input_version": input_version
         }
     except Exception as e:
         logger.error(f'Error extracting bucket from SQS message: {e}')
         return None
+
+def extract_shard_from_sqs_message(message: str) -> Optional[Dict[str, Any]]:
+    """
+    Extract the shard of an input file from SQS message.
+
+    Args:
+        message (str): SQS message body
+
+    Returns:
+        Optional[Dict[str, Any]]: Shard to prepare, or None if the message is an S3 event
+    """
+    try:
+        return json.loads(message).get("shard")
+    except Exception:
+        return None
@@ -0,0 +1,100 @@
+import json
+import os
+import logging
+from typing import Any, Iterable, Iterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+JSON_SEPARATORS = " \t\r\n,[]\ufeff"
+
+def iter_lines(chunks: Iterable[str]) -> Iterator[str]:
+    """
+    Split a stream of text chunks into lines, keeping line endings.
+
+    Only "\\n" is treated as a line break so that "\\r\\n" endings and quoted
+    CSV fields spanning several lines are passed through untouched.
+
+    Args:
+        chunks (Iterable[str]): Decoded text chunks
+
+    """
+    pending = ""
+    for chunk in chunks:
+        pending += chunk
+        if "\n" not in chunk:
+            continue
+
+        lines = pending.split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + "\n"
+
+    if pending:
+        yield pending
+
+def iter_json_records(chunks: Iterable[str]) -> Iterator[Any]:
+    """
+    Incrementally parse JSON values from a stream of text chunks.
+
+    Handles a top-level JSON array, JSON Lines and concatenated JSON objects.
+    Only the record currently being decoded is kept in memory. A malformed
+    record is skipped with a warning up to the next line break, so a single
+    bad record does not fail the whole file.
+
+    Args:
+        chunks (Iterable[str]): Decoded text chunks
+
+    """
+    decoder = json.JSONDecoder()
+    chunk_iterator = iter(chunks)
+    buffer = ""
+    position = 0
+    eof = False
+
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_SEPARATORS:
+            position += 1
+
+        if position >= len(buffer):
+            if eof:
+                return
+            chunk = next(chunk_iterator, None)
+            if chunk is None:
+                eof = True
+            else:
+                buffer = chunk
+                position = 0
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+            # A scalar touching the end of the buffer may still be cut in half
+            complete = eof or end < len(buffer) or isinstance(value, (dict, list))
+        except json.JSONDecodeError as e:
+            # A value cut by the end of the buffer fails at its end, and a JSON
+            # string cannot hold a raw line break, so an error followed by a
+            # line break is in the record itself
+            line_break = buffer.find("\n", e.pos)
+            if not eof and line_break < 0:
+                complete = False
+            else:
+                logger.warning(f"Skipping malformed JSON record: {e}")
+                if line_break < 0:
+                    return
+                position = line_break + 1
+                continue
+
+        if not complete:
+            chunk = next(chunk_iterator, None)
+            if chunk is None:
+                eof = True
+            else:
+                buffer = buffer[position:] + chunk
+                position = 0
+            continue
+
+        yield value
+        position = end
@@ -0,0 +1,287 @@
+import json
+import os
+import logging
+import multiprocessing
+import tempfile
+import zipfile
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from xml.etree import ElementTree
+
+# Configure logging
+logger = logging.getLogger(__name__)
+log_level = os.environ.get("LOG_LEVEL", "INFO")
+logger.setLevel(log_level)
+
+SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+RELATIONSHIP_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+SHEET_DATA_TAG = f"{SPREADSHEET_NS}sheetData"
+ROW_TAG = f"{SPREADSHEET_NS}row"
+CELL_TAG = f"{SPREADSHEET_NS}c"
+VALUE_TAG = f"{SPREADSHEET_NS}v"
+INLINE_STRING_TAG = f"{SPREADSHEET_NS}is"
+TEXT_TAG = f"{SPREADSHEET_NS}t"
+
+def get_sheet_paths(archive: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """
+    List the worksheets of an Excel file with the paths of their XML parts.
+
+    Args:
+        archive (zipfile.ZipFile): Opened Excel file
+
+    """
+    targets = {}
+    with archive.open("xl/_rels/workbook.xml.rels") as rels:
+        for relationship in ElementTree.parse(rels).getroot():
+            target = relationship.get("Target", "")
+            targets[relationship.get("Id")] = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+
+    with archive.open("xl/workbook.xml") as workbook:
+        sheets = ElementTree.parse(workbook).getroot().find(f"{SPREADSHEET_NS}sheets")
+
+    return [
+        (sheet.get("name"), targets[sheet.get(f"{RELATIONSHIP_NS}id")])
+        for sheet in (sheets if sheets is not None else [])
+    ]
+
+def get_sheet_names(file_path: str) -> List[str]:
+    """
+    List the worksheets of an Excel file.
+
+    Args:
+        file_path (str): Path of the local Excel file
+
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        return [name for name, _ in get_sheet_paths(archive)]
+
+def read_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    """
+    Read the shared string table, which holds the text of most string cells.
+
+    Args:
+        archive (zipfile.ZipFile): Opened Excel file
+
+    """
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as source:
+        for _, element in ElementTree.iterparse(source):
+            if element.tag == f"{SPREADSHEET_NS}si":
+                # Rich text is split into runs, phonetic hints (rPh) are not part of the text
+                strings.append("".join(
+                    text.text or ""
+                    for part in element
+                    if part.tag in (TEXT_TAG, f"{SPREADSHEET_NS}r")
+                    for text in part.iter(TEXT_TAG)
+                ))
+                element.clear()
+    return strings
+
+def iter_sheet_records(file_path: str, sheet_name: str, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the rows of a worksheet as records keyed by the header row.
+
+    The worksheet XML is parsed row by row and only the cells of the selected
+    columns are decoded, so neither the sheet nor unused columns are kept in
+    memory. Formulas are read as their cached values and date cells as Excel
+    serial numbers. Empty cells are left out of the records and rows without
+    any value are skipped.
+
+    Args:
+        file_path (str): Path of the local Excel file
+        sheet_name (str): Name of the worksheet
+        columns (Optional[List[str]]): Names of the columns to read, all columns if None
+
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        sheet_path = dict(get_sheet_paths(archive))[sheet_name]
+        shared_strings = read_shared_strings(archive)
+
+        header_rows = _iter_sheet_rows(archive, sheet_path, shared_strings)
+        header = next(header_rows, None)
+        header_rows.close()
+        if header is None:
+            return
+
+        names = {index: str(value).replace("\ufeff", "").strip() for index, value in header.items()}
+        selected = {
+            index: name
+            for index, name in names.items()
+            if name and (columns is None or name in columns)
+        }
+        if columns is not None:
+            missing = [column for column in columns if column not in names.values()]
+            if missing:
+                logger.warning(f"Columns {missing} not found in sheet {sheet_name}")
+
+        rows = _iter_sheet_rows(archive, sheet_path, shared_strings, set(selected))
+        # The header row has values in the selected columns, so it is the first row again
+        next(rows, None)
+
+        record_count = 0
+        for row in rows:
+            record = {selected[index]: value for index, value in row.items()}
+            if record:
+                record_count += 1
+                yield record
+
+        logger.info(f"Read {record_count} records from sheet {sheet_name}")
+
+def _iter_sheet_rows(
+    archive: zipfile.ZipFile,
+    sheet_path: str,
+    shared_strings: List[str],
+    selected_columns: Optional[Set[int]] = None
+) -> Iterator[Dict[int, Any]]:
+    """
+    Stream the non-empty rows of a worksheet as values by column index.
+
+    Args:
+        archive (zipfile.ZipFile): Opened Excel file
+        sheet_path (str): Path of the worksheet XML in the archive
+        shared_strings (List[str]): Shared string table
+        selected_columns (Optional[Set[int]]): Column indexes to decode, all columns if None
+
+    """
+    with archive.open(sheet_path) as source:
+        sheet_data = None
+        row: Dict[int, Any] = {}
+        column = 0
+        for event, element in ElementTree.iterparse(source, events=("start", "end")):
+            if event == "start":
+                if element.tag == SHEET_DATA_TAG:
+                    sheet_data = element
+                elif element.tag == ROW_TAG:
+                    row, column = {}, 0
+                continue
+
+            if element.tag == CELL_TAG:
+                reference = element.get("r")
+                column = _column_index(reference) if reference else column + 1
+                if selected_columns is None or column in selected_columns:
+                    value = _cell_value(element, shared_strings)
+                    if value is not None and value != "":
+                        row[column] = value
+            elif element.tag == ROW_TAG:
+                if row:
+                    yield row
+                # Drop the parsed row, so memory use does not grow with the sheet
+                if sheet_data is not None:
+                    sheet_data.clear()
+
+def _column_index(reference: str) -> int:
+    """
+    Convert the column letters of a cell reference, e.g. "AB12", to a 1-based index.
+
+    Args:
+        reference (str): Cell reference
+
+    """
+    index = 0
+    for character in reference:
+        if not character.isalpha():
+            break
+        index = index * 26 + ord(character.upper()) - 64
+    return index
+
+def _cell_value(element: ElementTree.Element, shared_strings: List[str]) -> Any:
+    """
+    Decode the value of a cell element.
+
+    Args:
+        element (ElementTree.Element): c element of the cell
+        shared_strings (List[str]): Shared string table
+
+    """
+    data_type = element.get("t", "n")
+    if data_type == "inlineStr":
+        inline = element.find(INLINE_STRING_TAG)
+        return "".join(text.text or "" for text in inline.iter(TEXT_TAG)) if inline is not None else None
+
+    value = element.findtext(VALUE_TAG)
+    if value is None:
+        return None
+    if data_type == "s":
+        return shared_strings[int(value)]
+    if data_type == "b":
+        return value == "1"
+    if data_type == "n":
+        try:
+            return float(value) if "." in value or "E" in value.upper() else int(value)
+        except ValueError:
+            return value
+    return value
+
+def iter_xlsx_records(
+    file_path: str,
+    columns: Optional[List[str]] = None,
+    sheet_concurrency: int = 1
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the records of all worksheets of an Excel file, sheet by sheet.
+
+    With a sheet concurrency above one, the following sheets are parsed in
+    separate processes while the records of the current sheet are consumed.
+    They write their records to temporary JSON Lines files, so the records are
+    still yielded in sheet order and never held in memory at once.
+
+    Args:
+        file_path (str): Path of the local Excel file
+        columns (Optional[List[str]]): Names of the columns to read, all columns if None
+        sheet_concurrency (int): Number of sheets parsed at the same time
+
+    """
+    sheet_names = get_sheet_names(file_path)
+    logger.info(f"Found {len(sheet_names)} sheets in Excel file")
+
+    if sheet_concurrency <= 1 or len(sheet_names) == 1:
+        for sheet_name in sheet_names:
+            yield from iter_sheet_records(file_path, sheet_name, columns)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        processes = [
+            multiprocessing.Process(
+                target=_write_sheet_records,
+                args=(file_path, sheet_name, columns, os.path.join(directory, f"{index}.jsonl"))
+            )
+            for index, sheet_name in enumerate(sheet_names)
+        ]
+        started = 0
+        try:
+            for index, sheet_name in enumerate(sheet_names):
+                while started < len(processes) and started < index + sheet_concurrency:
+                    processes[started].start()
+                    started += 1
+
+                processes[index].join()
+                if processes[index].exitcode != 0:
+                    raise RuntimeError(f"Failed to read sheet {sheet_name}")
+
+                records_path = os.path.join(directory, f"{index}.jsonl")
+                with open(records_path, encoding="utf-8") as records_file:
+                    for line in records_file:
+                        yield json.loads(line)
+                os.remove(records_path)
+        finally:
+            for process in processes[:started]:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+
+def _write_sheet_records(file_path: str, sheet_name: str, columns: Optional[List[str]], output_path: str) -> None:
+    """
+    Write the records of a worksheet to a JSON Lines file, run in a child process.
+
+    Args:
+        file_path (str): Path of the local Excel file
+        sheet_name (str): Name of the worksheet
+        columns (Optional[List[str]]): Names of the columns to read, all columns if None
+        output_path (str): Path of the JSON Lines file
+
+    """
+    with open(output_path, "w", encoding="utf-8") as output_file:
+        for record in iter_sheet_records(file_path, sheet_name, columns):
+            output_file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
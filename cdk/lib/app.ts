@@ -47,6 +47,7 @@ const dataPreparationStack = new DataPreparationStack(
     internalClassificationsBucketArn: sharedStack.internalClassificationsBucketArn,
     customerRequestsBucketArn: sharedStack.customerRequestsBucketArn,
     jobProcessingStatusTable: sharedStack.jobProcessingStatusTable,
+    resultCacheTable: sharedStack.resultCacheTable,
   }
 );
 
@@ -61,6 +62,7 @@ const batchResultsProcessingStack = new BatchResultsProcessingStack(
     internalClassificationsBucketArn: sharedStack.internalClassificationsBucketArn,
     customerRequestsBucketArn: sharedStack.customerRequestsBucketArn,
     jobProcessingStatusTable: sharedStack.jobProcessingStatusTable,
+    resultCacheTable: sharedStack.resultCacheTable,
   }
 );
 
@@ -1,3 +1,6 @@
 export const MAX_CONCURRENCY = 10;
 export const PANDA_ACCOUNT = '336392948345'; // this is account where Panda Layer is deployed to
-export const MINIMUM_RECORDS_PER_BATCH = 100; // do not change the value unless Amazon Bedrock changed this limitation of records per single file
\ No newline at end of file
+export const MINIMUM_RECORDS_PER_BATCH = 100; // do not change the value unless Amazon Bedrock changed this limitation of records per single file
+export const JOB_STATUS_PARENT_ID_INDEX = 'parent_id-index'; // must match PARENT_ID_INDEX in app/lambda/utils/dynamodb.py
+export const JOB_STATUS_BEDROCK_JOB_INDEX = 'bedrock_job_short_id-index'; // must match BEDROCK_JOB_SHORT_ID_INDEX in app/lambda/utils/dynamodb.py
+export const JOB_STATUS_INDEX = 'job_status-index'; // must match JOB_STATUS_INDEX in app/lambda/utils/dynamodb.py
\ No newline at end of file
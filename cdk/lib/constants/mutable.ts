@@ -1,13 +1,46 @@
 import { TRAVEL_PROMPT } from './prompts/travel';
-import { OUTPUT_FORMATS, QUICKSIGHT_QUERY_MODES } from './types';
+import { BATCHING_MODES, COMPRESSIONS, EXTRACTION_MODES, OUTPUT_FORMATS, QUICKSIGHT_QUERY_MODES } from './types';
 
 // The constants below can be configured as needed
 export const PREFIX = 'genai';
 export const BEDROCK_AGENT_MODEL = 'anthropic.claude-3-haiku-20240307-v1:0';
 export const BATCH_SIZE = 200; // minimum should be 100
+// 'records' cuts batches every BATCH_SIZE records, 'tokens' packs them up to the token and byte budgets below
+export const BATCHING_MODE = BATCHING_MODES.RECORDS;
+export const BATCH_MAX_TOKENS = 10000000; // estimated input tokens per batch file in 'tokens' mode
+export const BATCH_MAX_BYTES = 200 * 1024 * 1024; // bytes per batch file in 'tokens' mode
+export const BATCH_MAX_RECORDS = 50000; // records per batch file in 'tokens' mode
+export const UPLOAD_CONCURRENCY = 4; // number of batch files uploaded to S3 in parallel during data preparation
+export const XLSX_SHEET_CONCURRENCY = 1; // sheets of an XLSX input parsed in parallel processes, only helps when the function has more than one vCPU
+export const SHARD_SIZE_MB = 512; // CSV and JSON Lines inputs larger than this are split into shards prepared in parallel, 0 disables sharding; JSON Lines records must not span several lines
+export const DATA_PREPARATION_TIMEOUT_MINUTES = 15; // time to prepare one input file or shard
+export const INTERNAL_COMPRESSION = COMPRESSIONS.GZIP; // compression of the alias, error and retry sidecars in the internal bucket
+export const REALTIME_RECORD_THRESHOLD = 100; // files with fewer records to classify are sent to InvokeModel right away instead of a batch inference job, 0 disables it
+export const REALTIME_MAX_CONCURRENCY = 8; // InvokeModel requests in flight at most, lowered automatically while Bedrock throttles
+export const REALTIME_REQUESTS_PER_SECOND = 5; // InvokeModel request rate at most, keep it below the on-demand quota of the model; the threshold divided by the rate must fit DATA_PREPARATION_TIMEOUT_MINUTES
+export const REALTIME_MAX_RETRIES = 5; // retries of a throttled or failed InvokeModel request before the record is reported as failed
+export const DEDUPLICATION_ENABLED = true; // send each distinct text to the model only once and reuse cached results
+export const RESULT_CACHE_TTL_DAYS = 30; // how long classification results are reused for identical texts
+export const MAX_CONCURRENT_BEDROCK_JOBS = 10; // keep at or below the Bedrock quota for concurrent batch inference jobs
+export const SCHEDULER_INTERVAL_MINUTES = 5; // how often queued batch inference jobs are checked for free slots and running ones are reconciled with Bedrock
+export const MAX_JOB_ATTEMPTS = 3; // how often a batch inference job that failed, was stopped or expired is started, before it is marked FAILED
+export const MAX_RETRY_ROUNDS = 1; // how often records that failed in Bedrock are resubmitted in a new batch
+export const COMPACTION_TARGET_SIZE_MB = 64; // size of the files the processed records of a finished request are merged into, 0 disables compaction
+export const MERGE_OUTPUT_FILES = false; // also write one merged output file with a manifest per request once all its batches are processed
+export const OUTPUT_EXTRACTION_MODE = EXTRACTION_MODES.TAGS; // format the prompt asks the model for, 'tags' (<class>...</class>) or 'json'; the other one is tried as a fallback
+export const OUTPUT_EXTRA_FIELDS: string[] = []; // extra output columns extracted from the model outputs, 'labels' and/or 'confidence'
+export const RESULTS_PROCESSING_TIMEOUT_MINUTES = 15; // leaves time to compact the processed records of large requests
+export const RESULTS_PROCESSING_MEMORY_SIZE = 1024; // compaction holds one target-sized file in memory while sorting it
+export const SQS_BATCH_SIZE = 10; // S3 notifications handled per invocation of the batch classifier and results processing functions
+export const SQS_MAX_BATCHING_WINDOW_SECONDS = 5; // how long SQS gathers notifications into one invocation during spikes
+export const RECORD_CONCURRENCY = 4; // notifications of one invocation processed in parallel threads
+export const JOB_STATUS_INDEX_COUNT = 3; // global secondary indexes of the job status table, overridden by the jobStatusIndexCount context when an existing table is upgraded one index per deploy
 
 export const CLASSIFICATIONS_INPUT_FOLDER = 'input_data';
 export const CLASSIFICATIONS_OUTPUT_FOLDER = 'output_data';
+export const DEDUP_FOLDER = 'dedup_data';
+export const ERRORS_FOLDER = 'errors_data';
+export const RETRY_FOLDER = 'retry_data';
 export const OUTPUT_FORMAT = OUTPUT_FORMATS.CSV;
 
 export const INTERNAL_PROCESSED_FOLDER = 'processed_data';
@@ -44,7 +77,7 @@ export const QUICKSIGHT_DATA_SCHEMA = [{
   label: 'Rationale',
   width: '428px',
 }, {
-  name: 'partition_0',
+  name: 'dt',
   type: 'STRING',
   label: 'Date',
 }];
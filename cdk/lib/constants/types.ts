@@ -6,5 +6,22 @@ export const enum QUICKSIGHT_QUERY_MODES {
 export const enum OUTPUT_FORMATS {
   CSV = '.csv',
   JSON = '.json',
-  XLSX = '.xlsx'
+  XLSX = '.xlsx',
+  PARQUET = '.parquet'
+}
+
+export const enum BATCHING_MODES {
+  RECORDS = 'records',
+  TOKENS = 'tokens'
+}
+
+export const enum COMPRESSIONS {
+  NONE = 'none',
+  GZIP = 'gzip',
+  ZSTD = 'zstd'
+}
+
+export const enum EXTRACTION_MODES {
+  TAGS = 'tags',
+  JSON = 'json'
 }
\ No newline at end of file
@@ -1,4 +1,4 @@
-import { Attribute, Table, TableEncryption } from 'aws-cdk-lib/aws-dynamodb';
+import { Attribute, GlobalSecondaryIndexProps, Table, TableEncryption } from 'aws-cdk-lib/aws-dynamodb';
 import { Construct } from 'constructs';
 
 interface DynamoDBProps {
@@ -6,6 +6,8 @@ interface DynamoDBProps {
   readonly partitionKey: Attribute;
   readonly encryption?: TableEncryption | TableEncryption.AWS_MANAGED;
   readonly pointInTimeRecovery?: boolean;
+  readonly timeToLiveAttribute?: string;
+  readonly globalSecondaryIndexes?: GlobalSecondaryIndexProps[];
 }
 
 export class DynamoDBResource extends Construct {
@@ -18,6 +20,11 @@ export class DynamoDBResource extends Construct {
       tableName: props.name,
       partitionKey: props.partitionKey,
       pointInTimeRecovery: props.pointInTimeRecovery,
+      timeToLiveAttribute: props.timeToLiveAttribute,
+    });
+
+    (props.globalSecondaryIndexes ?? []).forEach((index) => {
+      this.table.addGlobalSecondaryIndex(index);
     });
   }
 }
@@ -1,4 +1,6 @@
 import * as cdk from 'aws-cdk-lib';
+import { Rule, Schedule } from 'aws-cdk-lib/aws-events';
+import { LambdaFunction } from 'aws-cdk-lib/aws-events-targets';
 import { Effect, PolicyDocument, PolicyStatement, ServicePrincipal } from 'aws-cdk-lib/aws-iam';
 import { LayerVersion } from 'aws-cdk-lib/aws-lambda';
 import { SqsEventSource } from 'aws-cdk-lib/aws-lambda-event-sources';
@@ -6,7 +8,7 @@ import { Bucket, EventType } from 'aws-cdk-lib/aws-s3';
 import { SqsDestination } from 'aws-cdk-lib/aws-s3-notifications';
 import * as nag from 'cdk-nag';
 import { Construct } from 'constructs';
-import { BEDROCK_AGENT_MODEL, CLASSIFICATIONS_INPUT_FOLDER, CLASSIFICATIONS_OUTPUT_FOLDER, MAX_CONCURRENCY, PANDA_ACCOUNT, PREFIX } from '../constants';
+import { BEDROCK_AGENT_MODEL, CLASSIFICATIONS_INPUT_FOLDER, CLASSIFICATIONS_OUTPUT_FOLDER, MAX_CONCURRENCY, MAX_CONCURRENT_BEDROCK_JOBS, MAX_JOB_ATTEMPTS, PANDA_ACCOUNT, PREFIX, RECORD_CONCURRENCY, SCHEDULER_INTERVAL_MINUTES, SQS_BATCH_SIZE, SQS_MAX_BATCHING_WINDOW_SECONDS } from '../constants';
 import { IamRoleResource } from '../constructs/iam';
 import { LambdaResource } from '../constructs/lambda';
 import { SqsResource } from '../constructs/sqs';
@@ -151,6 +153,13 @@ export class BatchClassifierStack extends cdk.Stack {
               actions: ['bedrock:*'],
               sid: 'BedrockAccess',
             }),
+            // Running jobs are reconciled with a listing of the batch inference jobs
+            new PolicyStatement({
+              effect: Effect.ALLOW,
+              resources: ['*'],
+              actions: ['bedrock:ListModelInvocationJobs'],
+              sid: 'BedrockListJobsAccess',
+            }),
             new PolicyStatement({
               effect: Effect.ALLOW,
               resources: [
@@ -162,12 +171,14 @@ export class BatchClassifierStack extends cdk.Stack {
             new PolicyStatement({
               effect: Effect.ALLOW,
               resources: [
-                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}`
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}`,
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}/index/*`
               ],
               actions: [
                 'dynamodb:GetItem',
                 'dynamodb:PutItem',
                 'dynamodb:UpdateItem',
+                'dynamodb:DeleteItem',
                 'dynamodb:Query',
                 'dynamodb:Scan'
               ],
@@ -212,7 +223,7 @@ export class BatchClassifierStack extends cdk.Stack {
       },
       {
         id: 'AwsSolutions-IAM5',
-        reason: 'Wildcard resource is required for logs:CreateLogGroup as the log group needs to be created before it can be referenced',
+        reason: 'Wildcard resource is required for logs:CreateLogGroup as the log group needs to be created before it can be referenced, and for bedrock:ListModelInvocationJobs, which does not support resource-level permissions',
       }
     ]);
 
@@ -236,15 +247,30 @@ export class BatchClassifierStack extends cdk.Stack {
           BEDROCK_JOB_PREFIX: `${PREFIX}-job`,
           OUTPUT_FOLDER_NAME: CLASSIFICATIONS_OUTPUT_FOLDER,
           JOB_STATUS_TABLE: props.jobProcessingStatusTable,
+          MAX_CONCURRENT_JOBS: `${MAX_CONCURRENT_BEDROCK_JOBS}`,
+          RECORD_CONCURRENCY: `${RECORD_CONCURRENCY}`,
+          MAX_JOB_ATTEMPTS: `${MAX_JOB_ATTEMPTS}`,
         },
       }
     ).lambdaFunction;
 
     batchProcessingFunction.addEventSource(
       new SqsEventSource(batchClassificationsQueue, {
-        batchSize: 1,
+        batchSize: SQS_BATCH_SIZE,
+        maxBatchingWindow: cdk.Duration.seconds(SQS_MAX_BATCHING_WINDOW_SECONDS),
         maxConcurrency: MAX_CONCURRENCY,
+        // only the failed messages of a batch are delivered again
+        reportBatchItemFailures: true,
       }),
     );
+
+    // Start queued jobs when slots free up, even if no new file arrives, and
+    // queue jobs again that ended without output
+    const schedulerRuleName = `${featureName}-scheduler-rule`;
+    new Rule(this, schedulerRuleName, {
+      ruleName: `${prefix}-${schedulerRuleName}-${postfix}`,
+      schedule: Schedule.rate(cdk.Duration.minutes(SCHEDULER_INTERVAL_MINUTES)),
+      targets: [new LambdaFunction(batchProcessingFunction)],
+    });
   }
 }
\ No newline at end of file
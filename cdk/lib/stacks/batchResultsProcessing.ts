@@ -6,7 +6,7 @@ import { Bucket, EventType } from 'aws-cdk-lib/aws-s3';
 import { SqsDestination } from 'aws-cdk-lib/aws-s3-notifications';
 import * as nag from 'cdk-nag';
 import { Construct } from 'constructs';
-import { CLASSIFICATIONS_OUTPUT_FOLDER, INTERNAL_PROCESSED_FOLDER, MAX_CONCURRENCY, OUTPUT_FORMAT, PANDA_ACCOUNT } from '../constants';
+import { BEDROCK_AGENT_MODEL, CLASSIFICATIONS_INPUT_FOLDER, CLASSIFICATIONS_OUTPUT_FOLDER, COMPACTION_TARGET_SIZE_MB, DEDUP_FOLDER, ERRORS_FOLDER, INTERNAL_COMPRESSION, INTERNAL_PROCESSED_FOLDER, MAX_CONCURRENCY, MAX_RETRY_ROUNDS, MERGE_OUTPUT_FILES, MINIMUM_RECORDS_PER_BATCH, OUTPUT_EXTRA_FIELDS, OUTPUT_EXTRACTION_MODE, OUTPUT_FORMAT, PANDA_ACCOUNT, RECORD_CONCURRENCY, RESULT_CACHE_TTL_DAYS, RESULTS_PROCESSING_MEMORY_SIZE, RESULTS_PROCESSING_TIMEOUT_MINUTES, RETRY_FOLDER, SQS_BATCH_SIZE, SQS_MAX_BATCHING_WINDOW_SECONDS } from '../constants';
 import { IamRoleResource } from '../constructs/iam';
 import { LambdaResource } from '../constructs/lambda';
 import { SqsResource } from '../constructs/sqs';
@@ -18,6 +18,7 @@ interface BatchResultsProcessingStackProps {
   readonly internalClassificationsBucketArn: string;
   readonly customerRequestsBucketArn: string;
   readonly jobProcessingStatusTable: string;
+  readonly resultCacheTable: string;
 }
 
 export class BatchResultsProcessingStack extends cdk.Stack { 
@@ -37,6 +38,8 @@ export class BatchResultsProcessingStack extends cdk.Stack {
       {
         name: `${prefix}-${batchResultsProcessingQueueName}-${postfix}`,
         dlqName: `${prefix}-${batchResultsProcessingDlqName}-${postfix}`,
+        // must not be shorter than the function timeout
+        visibilityTimeout: cdk.Duration.minutes(RESULTS_PROCESSING_TIMEOUT_MINUTES),
       }
     ).queue;
 
@@ -103,14 +106,16 @@ export class BatchResultsProcessingStack extends cdk.Stack {
                 's3:GetObject',
                 's3:PutObject',
                 's3:ListBucket',
-                's3:DeleteObject'
+                's3:DeleteObject',
+                's3:AbortMultipartUpload'
               ],
               sid: 'S3Access',
             }),
             new PolicyStatement({
               effect: Effect.ALLOW,
               resources: [
-                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}`
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}`,
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}/index/*`
               ],
               actions: [
                 'dynamodb:GetItem',
@@ -121,6 +126,16 @@ export class BatchResultsProcessingStack extends cdk.Stack {
               ],
               sid: 'DynamoDBAccess',
             }),
+            new PolicyStatement({
+              effect: Effect.ALLOW,
+              resources: [
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.resultCacheTable}`
+              ],
+              actions: [
+                'dynamodb:BatchWriteItem'
+              ],
+              sid: 'ResultCacheAccess',
+            }),
             new PolicyStatement({
               effect: Effect.ALLOW,
               resources: [
@@ -166,20 +181,42 @@ export class BatchResultsProcessingStack extends cdk.Stack {
         handler: 'batchResultsProcessing.lambda_handler',
         lambdaRole: batchResultsProcessingLambdaRole.iamRole,
         layers: [pandasLayer],
+        timeout: cdk.Duration.minutes(RESULTS_PROCESSING_TIMEOUT_MINUTES),
+        memorySize: RESULTS_PROCESSING_MEMORY_SIZE,
         environmentVariables: {
           OUTPUT_BUCKET_ARN: props.customerRequestsBucketArn,
           OUTPUT_FOLDER_NAME: CLASSIFICATIONS_OUTPUT_FOLDER,
           JOB_STATUS_TABLE: props.jobProcessingStatusTable,
           OUTPUT_FORMAT,
           INTERNAL_PROCESSED_FOLDER,
+          BEDROCK_MODEL_ID: BEDROCK_AGENT_MODEL,
+          DEDUP_FOLDER_NAME: DEDUP_FOLDER,
+          RESULT_CACHE_TABLE: props.resultCacheTable,
+          RESULT_CACHE_TTL_DAYS: `${RESULT_CACHE_TTL_DAYS}`,
+          INPUT_FOLDER_NAME: CLASSIFICATIONS_INPUT_FOLDER,
+          ERRORS_FOLDER_NAME: ERRORS_FOLDER,
+          RETRY_FOLDER_NAME: RETRY_FOLDER,
+          MINIMUM_RECORDS_PER_BATCH: `${MINIMUM_RECORDS_PER_BATCH}`,
+          MAX_RETRY_ROUNDS: `${MAX_RETRY_ROUNDS}`,
+          // a re-submission round claimed by an invocation that timed out can be taken over afterwards
+          RETRY_CLAIM_TIMEOUT_SECONDS: `${RESULTS_PROCESSING_TIMEOUT_MINUTES * 60}`,
+          COMPACTION_TARGET_SIZE_MB: `${COMPACTION_TARGET_SIZE_MB}`,
+          MERGE_OUTPUT_FILES: `${MERGE_OUTPUT_FILES}`,
+          RECORD_CONCURRENCY: `${RECORD_CONCURRENCY}`,
+          INTERNAL_COMPRESSION,
+          OUTPUT_EXTRACTION_MODE,
+          OUTPUT_EXTRA_FIELDS: OUTPUT_EXTRA_FIELDS.join(','),
         },
       }
     ).lambdaFunction;
 
     batchResultsProcessingFunction.addEventSource(
       new SqsEventSource(batchResultsProcessingQueue, {
-        batchSize: 1,
+        batchSize: SQS_BATCH_SIZE,
+        maxBatchingWindow: cdk.Duration.seconds(SQS_MAX_BATCHING_WINDOW_SECONDS),
         maxConcurrency: MAX_CONCURRENCY,
+        // only the failed messages of a batch are delivered again
+        reportBatchItemFailures: true,
       }),
     );
   }
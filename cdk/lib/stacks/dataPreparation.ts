@@ -6,7 +6,7 @@ import { Bucket, EventType } from 'aws-cdk-lib/aws-s3';
 import { SqsDestination } from 'aws-cdk-lib/aws-s3-notifications';
 import * as nag from 'cdk-nag';
 import { Construct } from 'constructs';
-import { BATCH_SIZE, CLASSIFICATIONS_INPUT_FOLDER, INPUT_MAPPING, MAX_CONCURRENCY, MINIMUM_RECORDS_PER_BATCH, PANDA_ACCOUNT, PROMPT } from '../constants';
+import { BATCH_MAX_BYTES, BATCH_MAX_RECORDS, BATCH_MAX_TOKENS, BATCH_SIZE, BATCHING_MODE, BEDROCK_AGENT_MODEL, CLASSIFICATIONS_INPUT_FOLDER, CLASSIFICATIONS_OUTPUT_FOLDER, DATA_PREPARATION_TIMEOUT_MINUTES, DEDUP_FOLDER, DEDUPLICATION_ENABLED, INPUT_MAPPING, INTERNAL_COMPRESSION, MAX_CONCURRENCY, MINIMUM_RECORDS_PER_BATCH, PANDA_ACCOUNT, PROMPT, REALTIME_MAX_CONCURRENCY, REALTIME_MAX_RETRIES, REALTIME_RECORD_THRESHOLD, REALTIME_REQUESTS_PER_SECOND, SHARD_SIZE_MB, UPLOAD_CONCURRENCY, XLSX_SHEET_CONCURRENCY } from '../constants';
 import { IamRoleResource } from '../constructs/iam';
 import { LambdaResource } from '../constructs/lambda';
 import { SqsResource } from '../constructs/sqs';
@@ -18,6 +18,7 @@ interface DataPreparationStackProps {
   readonly internalClassificationsBucketArn: string;
   readonly customerRequestsBucketArn: string;
   readonly jobProcessingStatusTable: string;
+  readonly resultCacheTable: string;
 }
 
 export class DataPreparationStack extends cdk.Stack { 
@@ -37,6 +38,8 @@ export class DataPreparationStack extends cdk.Stack {
       {
         name: `${prefix}-${customerRequestsQueueName}-${postfix}`,
         dlqName: `${prefix}-${customerRequestsDlqName}-${postfix}`,
+        // must not be shorter than the function timeout
+        visibilityTimeout: cdk.Duration.minutes(DATA_PREPARATION_TIMEOUT_MINUTES),
       }
     ).queue;
 
@@ -104,24 +107,57 @@ export class DataPreparationStack extends cdk.Stack {
                 's3:GetObject',
                 's3:PutObject',
                 's3:ListBucket',
-                's3:DeleteObject'
+                's3:DeleteObject',
+                's3:AbortMultipartUpload'
               ],
               sid: 'S3Access',
             }),
             new PolicyStatement({
               effect: Effect.ALLOW,
               resources: [
-                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}`
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}`,
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.jobProcessingStatusTable}/index/*`
               ],
               actions: [
                 'dynamodb:GetItem',
                 'dynamodb:PutItem',
                 'dynamodb:UpdateItem',
                 'dynamodb:Query',
-                'dynamodb:Scan'
+                'dynamodb:Scan',
+                'dynamodb:BatchWriteItem'
               ],
               sid: 'DynamoDBAccess',
             }),
+            new PolicyStatement({
+              effect: Effect.ALLOW,
+              resources: [
+                `arn:aws:dynamodb:${props.env.region}:${props.env.account}:table/${props.resultCacheTable}`
+              ],
+              actions: [
+                'dynamodb:BatchGetItem'
+              ],
+              sid: 'ResultCacheAccess',
+            }),
+            // Shards of large input files are sent back to the queue of the function
+            new PolicyStatement({
+              effect: Effect.ALLOW,
+              resources: [customerRequestsQueue.queueArn],
+              actions: [
+                'sqs:SendMessage'
+              ],
+              sid: 'ShardQueueAccess',
+            }),
+            // Small input files are classified right away instead of in a batch inference job
+            new PolicyStatement({
+              effect: Effect.ALLOW,
+              resources: [
+                `arn:aws:bedrock:${props.env.region}::foundation-model/${BEDROCK_AGENT_MODEL}`,
+              ],
+              actions: [
+                'bedrock:InvokeModel'
+              ],
+              sid: 'BedrockInvokeModelAccess',
+            }),
             new PolicyStatement({
               effect: Effect.ALLOW,
               resources: [
@@ -167,23 +203,44 @@ export class DataPreparationStack extends cdk.Stack {
         handler: 'dataPreparation.lambda_handler',
         lambdaRole: dataPreparationLambdaRole.iamRole,
         layers: [pandasLayer],
+        timeout: cdk.Duration.minutes(DATA_PREPARATION_TIMEOUT_MINUTES),
         environmentVariables: {
           OUTPUT_BUCKET_ARN: props.internalClassificationsBucketArn,
           OUTPUT_FOLDER_NAME: CLASSIFICATIONS_INPUT_FOLDER,
           INPUT_MAPPING_TEXT_FIELD: INPUT_MAPPING.record_text,
           INPUT_MAPPING_ID_FIELD: INPUT_MAPPING.record_id,
           BATCH_SIZE: `${BATCH_SIZE}`,
+          BATCHING_MODE,
+          BATCH_MAX_TOKENS: `${BATCH_MAX_TOKENS}`,
+          BATCH_MAX_BYTES: `${BATCH_MAX_BYTES}`,
+          BATCH_MAX_RECORDS: `${BATCH_MAX_RECORDS}`,
           MINIMUM_RECORDS_PER_BATCH: `${MINIMUM_RECORDS_PER_BATCH}`,
           JOB_STATUS_TABLE: props.jobProcessingStatusTable,
           PROMPT,
+          UPLOAD_CONCURRENCY: `${UPLOAD_CONCURRENCY}`,
+          XLSX_SHEET_CONCURRENCY: `${XLSX_SHEET_CONCURRENCY}`,
+          BEDROCK_MODEL_ID: BEDROCK_AGENT_MODEL,
+          DEDUPLICATION_ENABLED: `${DEDUPLICATION_ENABLED}`,
+          DEDUP_FOLDER_NAME: DEDUP_FOLDER,
+          RESULTS_FOLDER_NAME: CLASSIFICATIONS_OUTPUT_FOLDER,
+          RESULT_CACHE_TABLE: props.resultCacheTable,
+          SHARD_SIZE_MB: `${SHARD_SIZE_MB}`,
+          SHARD_QUEUE_URL: customerRequestsQueue.queueUrl,
+          INTERNAL_COMPRESSION,
+          REALTIME_RECORD_THRESHOLD: `${REALTIME_RECORD_THRESHOLD}`,
+          REALTIME_MAX_CONCURRENCY: `${REALTIME_MAX_CONCURRENCY}`,
+          REALTIME_REQUESTS_PER_SECOND: `${REALTIME_REQUESTS_PER_SECOND}`,
+          REALTIME_MAX_RETRIES: `${REALTIME_MAX_RETRIES}`,
         },
       }
     ).lambdaFunction;
 
     dataPreparationFunction.addEventSource(
       new SqsEventSource(customerRequestsQueue, {
+        // input files can be large, so every invocation prepares a single file or shard
         batchSize: 1,
         maxConcurrency: MAX_CONCURRENCY,
+        reportBatchItemFailures: true,
       }),
     );
   }
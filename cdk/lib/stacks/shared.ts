@@ -1,10 +1,11 @@
 import * as cdk from 'aws-cdk-lib';
 import { RemovalPolicy } from 'aws-cdk-lib';
-import { AttributeType, TableEncryption } from 'aws-cdk-lib/aws-dynamodb';
+import { AttributeType, ProjectionType, TableEncryption } from 'aws-cdk-lib/aws-dynamodb';
 import { AnyPrincipal, Effect, PolicyStatement, ServicePrincipal } from 'aws-cdk-lib/aws-iam';
 import { BlockPublicAccess, BucketPolicy } from 'aws-cdk-lib/aws-s3';
 import { Construct } from 'constructs';
-import { S3_ACCESS_LOGGING_BUCKET_RETENTON_DAYS, S3_CUSTOMER_BUCKET_RETENTON_DAYS, S3_INTERNAL_BUCKET_RETENTON_DAYS } from '../constants/mutable';
+import { JOB_STATUS_BEDROCK_JOB_INDEX, JOB_STATUS_INDEX, JOB_STATUS_PARENT_ID_INDEX } from '../constants/immutable';
+import { JOB_STATUS_INDEX_COUNT, S3_ACCESS_LOGGING_BUCKET_RETENTON_DAYS, S3_CUSTOMER_BUCKET_RETENTON_DAYS, S3_INTERNAL_BUCKET_RETENTON_DAYS } from '../constants/mutable';
 import { BucketResource } from '../constructs/bucket';
 import { DynamoDBResource } from '../constructs/dynamodb';
 
@@ -18,6 +19,7 @@ export class SharedStack extends cdk.Stack {
   public readonly internalClassificationsBucketArn: string; 
   public readonly customerRequestsBucketArn: string;
   public readonly jobProcessingStatusTable: string;
+  public readonly resultCacheTable: string;
   public readonly internalClassificationsBucketName: string;
   public readonly serverAccessLogsBucket: cdk.aws_s3.Bucket;
 
@@ -108,6 +110,9 @@ export class SharedStack extends cdk.Stack {
     ).bucket;
 
     const jobProcessingStatusName = 'batch-processing-status';
+    // DynamoDB creates one global secondary index per table update, so a table deployed
+    // without them is upgraded with -c jobStatusIndexCount=1, then 2, then 3
+    const jobStatusIndexCount = Number(this.node.tryGetContext('jobStatusIndexCount') ?? JOB_STATUS_INDEX_COUNT);
     const jobProcessingStatusTable = new DynamoDBResource(this, jobProcessingStatusName, {
       name: `${prefix}-${jobProcessingStatusName}-${postfix}`,
       partitionKey: {
@@ -116,11 +121,54 @@ export class SharedStack extends cdk.Stack {
       },
       encryption: TableEncryption.AWS_MANAGED,
       pointInTimeRecovery: true,
+      globalSecondaryIndexes: [
+        {
+          indexName: JOB_STATUS_PARENT_ID_INDEX,
+          partitionKey: {
+            name: 'parent_id',
+            type: AttributeType.STRING,
+          },
+          projectionType: ProjectionType.ALL,
+        },
+        {
+          indexName: JOB_STATUS_BEDROCK_JOB_INDEX,
+          partitionKey: {
+            name: 'bedrock_job_short_id',
+            type: AttributeType.STRING,
+          },
+          projectionType: ProjectionType.ALL,
+        },
+        {
+          indexName: JOB_STATUS_INDEX,
+          partitionKey: {
+            name: 'job_status',
+            type: AttributeType.STRING,
+          },
+          sortKey: {
+            name: 'created_date',
+            type: AttributeType.STRING,
+          },
+          projectionType: ProjectionType.ALL,
+        },
+      ].slice(0, jobStatusIndexCount),
+    }).table;
+
+    const resultCacheName = 'classification-cache';
+    const resultCacheTable = new DynamoDBResource(this, resultCacheName, {
+      name: `${prefix}-${resultCacheName}-${postfix}`,
+      partitionKey: {
+        name: 'content_hash',
+        type: AttributeType.STRING,
+      },
+      encryption: TableEncryption.AWS_MANAGED,
+      pointInTimeRecovery: true,
+      timeToLiveAttribute: 'ttl',
     }).table;
 
     this.internalClassificationsBucketArn = internalClassificationsBucket.bucketArn;
     this.internalClassificationsBucketName = internalClassificationsBucket.bucketName;
     this.customerRequestsBucketArn = customerRequestsBucket.bucketArn;
     this.jobProcessingStatusTable = jobProcessingStatusTable.tableName;
+    this.resultCacheTable = resultCacheTable.tableName;
   }
 }
\ No newline at end of file